@@ -3,9 +3,14 @@ import os
 import re
 from datetime import datetime, timezone
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from difflib import SequenceMatcher
 
 # --- Configuration ---
 NEW_DB_PATH = 'KpopDatabase_new.db' # Ensure this path is correct
+SCORING_CHUNK_SIZE = 200 # Performances per worker task when scoring candidates
+PARALLEL_SCORING_MIN_PERFORMANCES = 500 # Below this, scoring runs in-process (pool startup isn't worth it)
+MAX_RANKED_CANDIDATES = 10 # Ranked candidates kept per segment (perfect matches are always kept)
 
 # --- Normalization Fluff & Function (Use and extend this list for performances!) ---
 LITERAL_FLUFF_TERMS = [
@@ -76,6 +81,7 @@ def normalize_title_for_matching(title_str):
 # --- Global Cache for User Decisions ---
 # Key: (normalized_song_mention, primary_artist_id)
 # Value: list of song_ids (empty list means user explicitly skipped this mention for this artist)
+# Persisted in the linker_decisions table so re-runs don't ask the same questions again.
 user_decision_cache = {}
 
 # --- Database Interaction Functions ---
@@ -84,6 +90,40 @@ def get_db_connection(db_path):
     conn.row_factory = sqlite3.Row
     return conn
 
+def ensure_linker_decisions_table(conn):
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS linker_decisions (
+            normalized_mention TEXT NOT NULL,
+            artist_id INTEGER NOT NULL,
+            song_ids TEXT NOT NULL,  -- Comma-separated song_ids, empty string means skipped
+            decided_at TEXT,
+            PRIMARY KEY (normalized_mention, artist_id)
+        )
+    """)
+    conn.commit()
+
+def load_user_decisions(conn):
+    """Loads all stored linker decisions into a dict keyed like user_decision_cache."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT normalized_mention, artist_id, song_ids FROM linker_decisions")
+    decisions = {}
+    for row in cursor.fetchall():
+        song_ids = [int(x) for x in row['song_ids'].split(',') if x.strip()]
+        decisions[(row['normalized_mention'], row['artist_id'])] = song_ids
+    return decisions
+
+def save_user_decision(conn, cache_key, song_ids):
+    """Stores a decision in memory and in linker_decisions (committed with the performance)."""
+    user_decision_cache[cache_key] = song_ids
+    normalized_mention, artist_id = cache_key
+    cursor = conn.cursor()
+    timestamp = datetime.now(timezone.utc).isoformat()
+    cursor.execute("""
+        INSERT OR REPLACE INTO linker_decisions (normalized_mention, artist_id, song_ids, decided_at)
+        VALUES (?, ?, ?, ?)
+    """, (normalized_mention, artist_id, ",".join(str(sid) for sid in song_ids), timestamp))
+
 def get_primary_artist_for_performance(conn, performance_id_param):
     cursor = conn.cursor()
     cursor.execute("""
@@ -151,6 +191,84 @@ def update_performance_last_checked(conn, performance_id_param):
     timestamp = datetime.now(timezone.utc).isoformat()
     cursor.execute("UPDATE performances SET last_checked_at = ? WHERE performance_id = ?", (timestamp, performance_id_param))
 
+# --- Candidate Scoring (runs in worker processes) ---
+def split_title_into_mentions(title):
+    # A more sophisticated split might be needed if song titles themselves contain commas
+    # not intended as separators. For now, simple split by comma.
+    raw_song_mentions = [s.strip() for s in title.split(',') if s.strip()]
+    if not raw_song_mentions:
+        raw_song_mentions = [title.strip()] # If no commas, treat whole title as one mention
+    return raw_song_mentions
+
+def score_performance_chunk(chunk):
+    """
+    Scores the song mentions of a chunk of performances against their artist's songs.
+    chunk: (artist_songs, [(performance_id, title), ...]) - all performances share the primary artist.
+    Returns {performance_id: [{'raw_mention', 'normalized_mention', 'ranked_candidates'}, ...]}
+    where ranked_candidates is a list of (score, song_id), best first; score 1.0 is a perfect match.
+    """
+    artist_songs, performances = chunk
+    results = {}
+    for perf_id, title in performances:
+        segments = []
+        for raw_mention in split_title_into_mentions(title):
+            normalized_mention = normalize_title_for_matching(raw_mention)
+            ranked = []
+            if normalized_mention:
+                for song in artist_songs:
+                    if song['normalized_title'] == normalized_mention:
+                        score = 1.0
+                    else:
+                        score = SequenceMatcher(None, normalized_mention, song['normalized_title']).ratio()
+                    ranked.append((score, song['song_id']))
+                ranked.sort(key=lambda x: (-x[0], x[1]))
+                perfect_count = sum(1 for score, _ in ranked if score == 1.0)
+                ranked = ranked[:max(MAX_RANKED_CANDIDATES, perfect_count)]
+            segments.append({
+                'raw_mention': raw_mention,
+                'normalized_mention': normalized_mention,
+                'ranked_candidates': ranked
+            })
+        results[perf_id] = segments
+    return results
+
+def precompute_segment_candidates(conn, performances_to_process):
+    """
+    Scoring stage: builds per-artist chunks and scores them across all cores.
+    Returns ({performance_id: segments}, {performance_id: primary_artist_id}).
+    """
+    primary_artists = {}
+    performances_by_artist = OrderedDict()
+    for perf_row in performances_to_process:
+        title = perf_row['title']
+        if not title or not title.strip() or title.lower().startswith("multiple songs"):
+            continue  # The main loop skips these with its own message
+        artist_id = get_primary_artist_for_performance(conn, perf_row['performance_id'])
+        if not artist_id:
+            continue
+        primary_artists[perf_row['performance_id']] = artist_id
+        performances_by_artist.setdefault(artist_id, []).append((perf_row['performance_id'], title))
+
+    chunks = []
+    for artist_id, performances in performances_by_artist.items():
+        artist_songs = get_songs_for_artist(conn, artist_id)
+        if not artist_songs:
+            continue
+        for i in range(0, len(performances), SCORING_CHUNK_SIZE):
+            chunks.append((artist_songs, performances[i:i + SCORING_CHUNK_SIZE]))
+
+    scored_segments = {}
+    total = sum(len(chunk[1]) for chunk in chunks)
+    if total >= PARALLEL_SCORING_MIN_PERFORMANCES:
+        print(f"Scoring candidates for {total} performances on {os.cpu_count()} cores...")
+        with ProcessPoolExecutor() as executor:
+            for chunk_result in executor.map(score_performance_chunk, chunks):
+                scored_segments.update(chunk_result)
+    else:
+        for chunk in chunks:
+            scored_segments.update(score_performance_chunk(chunk))
+    return scored_segments, primary_artists
+
 # --- Main Processing Logic ---
 def process_performances():
     global user_decision_cache # Allow modification of global cache
@@ -158,6 +276,9 @@ def process_performances():
     try:
         conn = get_db_connection(NEW_DB_PATH)
         print("--- Performance to Song Linker ---")
+        ensure_linker_decisions_table(conn)
+        user_decision_cache.update(load_user_decisions(conn))
+        print(f"Loaded {len(user_decision_cache)} stored linker decision(s).")
         while True:
             mode = input("Choose mode: (U)pdate unchecked Performances, (R)echeck all Performances, (Q)uit: ").upper()
             if mode in ['U', 'R', 'Q']:
@@ -182,6 +303,7 @@ def process_performances():
             print("No performances to process in the selected mode.")
             return
         print(f"Found {len(performances_to_process)} performances to process.")
+        scored_segments, primary_artists = precompute_segment_candidates(conn, performances_to_process)
 
         for perf_row_idx, perf_row in enumerate(performances_to_process):
             perf_id = perf_row['performance_id']
@@ -197,7 +319,13 @@ def process_performances():
                 conn.commit()
                 continue
 
-            primary_artist_id = get_primary_artist_for_performance(conn, perf_id)
+            if not original_perf_title or not original_perf_title.strip():
+                print(f"  Performance has no title, so there is nothing to link. Skipping.")
+                update_performance_last_checked(conn, perf_id)
+                conn.commit()
+                continue
+
+            primary_artist_id = primary_artists.get(perf_id)
             if not primary_artist_id:
                 print(f"  Error: No primary artist (order=1) found for Performance ID {perf_id}. Skipping.")
                 update_performance_last_checked(conn, perf_id)
@@ -230,13 +358,6 @@ def process_performances():
                         conn.commit()
                         continue
             
-            # Split performance title into potential song mentions
-            # A more sophisticated split might be needed if song titles themselves contain commas
-            # not intended as separators. For now, simple split by comma.
-            raw_song_mentions = [s.strip() for s in original_perf_title.split(',') if s.strip()]
-            if not raw_song_mentions:
-                 raw_song_mentions = [original_perf_title.strip()] # If no commas, treat whole title as one mention
-
             all_linked_song_ids_for_this_perf = set()
             
             artist_songs = get_songs_for_artist(conn, primary_artist_id) # Fetch once for the artist
@@ -246,9 +367,12 @@ def process_performances():
                 conn.commit()
                 continue
 
-            for mention_idx, raw_mention in enumerate(raw_song_mentions):
-                print(f"  Segment {mention_idx + 1}/{len(raw_song_mentions)}: '{raw_mention}'")
-                normalized_mention = normalize_title_for_matching(raw_mention)
+            # Segments (title split into song mentions) were scored up front by the worker pool
+            segments = scored_segments[perf_id]
+            for mention_idx, segment in enumerate(segments):
+                raw_mention = segment['raw_mention']
+                normalized_mention = segment['normalized_mention']
+                print(f"  Segment {mention_idx + 1}/{len(segments)}: '{raw_mention}'")
 
                 if not normalized_mention:
                     print(f"    Segment normalized to empty string. Skipping this segment.")
@@ -269,17 +393,16 @@ def process_performances():
                     continue # Move to the next segment
 
                 # --- If not in cache, perform matching for this segment ---
-                perfect_matches_for_segment = []
-                for song in artist_songs: # Iterate over songs of the primary artist
-                    if song['normalized_title'] == normalized_mention:
-                        perfect_matches_for_segment.append(song)
+                candidate_rank = {song_id: rank for rank, (_, song_id) in enumerate(segment['ranked_candidates'])}
+                perfect_ids = {song_id for score, song_id in segment['ranked_candidates'] if score == 1.0}
+                perfect_matches_for_segment = [song for song in artist_songs if song['song_id'] in perfect_ids]
                 
                 if perfect_matches_for_segment:
                     print(f"    Perfect match(es) found for segment. Linking automatically:")
                     for song in perfect_matches_for_segment:
                         print(f"      - '{song['original_title']}' (ID: {song['song_id']})")
                         segment_song_ids.append(song['song_id'])
-                    user_decision_cache[cache_key] = segment_song_ids # Cache this auto-decision
+                    save_user_decision(conn, cache_key, segment_song_ids) # Cache this auto-decision
                 else:
                     # No perfect match for this segment, ask user
                     print(f"    No perfect match for segment. Please choose from songs by {artist_name} (or (S)kip segment):")
@@ -300,6 +423,8 @@ def process_performances():
                             'related_song_ids': sorted(list(set(data['song_ids']))),
                             'normalized_variants_display': ", ".join(sorted(list(data['normalized_titles_set'])))
                         })
+                    # Most likely candidates first; the rest keep their alphabetical order (stable sort)
+                    displayable_song_groups.sort(key=lambda g: min(candidate_rank.get(sid, len(candidate_rank)) for sid in g['related_song_ids']))
 
                     for i, group in enumerate(displayable_song_groups):
                         id_count_hint = f" (links {len(group['related_song_ids'])} song ID(s))" if len(group['related_song_ids']) > 1 else ""
@@ -310,7 +435,7 @@ def process_performances():
                         user_input = input(f"      Enter song numbers for this segment (comma-separated), or (S)kip segment: ").strip().lower()
                         if user_input == 's':
                             print(f"    User skipped segment '{raw_mention}'. Caching this decision.")
-                            user_decision_cache[cache_key] = [] # Cache skip decision (empty list)
+                            save_user_decision(conn, cache_key, []) # Cache skip decision (empty list)
                             break 
                         if not user_input:
                             print("      No selection made. Please enter numbers or 's'.")
@@ -329,7 +454,7 @@ def process_performances():
                             if valid_selection and temp_segment_ids:
                                 segment_song_ids.extend(list(set(temp_segment_ids))) # Add unique IDs
                                 print(f"    User selected Song IDs {segment_song_ids} for this segment. Caching.")
-                                user_decision_cache[cache_key] = segment_song_ids # Cache user's choice
+                                save_user_decision(conn, cache_key, segment_song_ids) # Cache user's choice
                                 break
                             elif not temp_segment_ids and valid_selection:
                                 print("      No songs selected. Please enter valid numbers or 's'.")
@@ -2,18 +2,19 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 import config
+import sync_jobs
 DB_FILE = config.DATABASE_FILE
 
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
 import sqlite3
 import time
-import json
 from datetime import datetime, timezone
 
 # --- Configuration ---
 CREDENTIALS_FILE_PATH = os.path.expanduser("~/.spotify_credentials")
-STATE_FILE_PATH = "spotify_album_sync_state.json" # Stores the last offset
+STATE_FILE_PATH = "spotify_album_sync_state.json" # Old JSON state, moved into sync_jobs on first run
+ALBUM_IMPORT_JOB = "spotify_album_import"  # sync_jobs job name; its cursor holds last_offset and watermark
 SPOTIPY_REDIRECT_URI = "http://127.0.0.1:8888/callback"
 API_SCOPE = "user-library-read"
 
@@ -45,26 +46,27 @@ def load_credentials(file_path):
         print(f"ERROR: Reading credentials file: {ve}")
         exit(1)
 
-def load_last_offset(state_file_path):
-    """Loads the last successfully processed offset from the state file."""
-    if os.path.exists(state_file_path):
-        try:
-            with open(state_file_path, 'r') as f:
-                state = json.load(f)
-                return state.get('last_offset', 0)
-        except json.JSONDecodeError:
-            print(f"Warning: State file {state_file_path} is corrupted. Starting from scratch.")
-            return 0
-    return 0
-
-def save_last_offset(state_file_path, offset):
-    """Saves the current offset to the state file."""
-    with open(state_file_path, 'w') as f:
-        json.dump({'last_offset': offset}, f)
+def load_last_offset(conn):
+    """
+    Loads (offset, watermark) from the job's sync_jobs cursor: the last successfully processed
+    offset and the newest spotify_added_at in the DB when that pass started (None if unknown).
+    """
+    state = sync_jobs.get_cursor(conn, ALBUM_IMPORT_JOB, legacy_state_file=STATE_FILE_PATH)
+    return state.get('last_offset', 0), state.get('watermark')
+
+def save_last_offset(conn, offset, watermark=None):
+    """Stores the offset (and the watermark of the pass in progress) in the current transaction; the caller commits."""
+    sync_jobs.set_cursor(conn, ALBUM_IMPORT_JOB, {'last_offset': offset, 'watermark': watermark})
+
+def get_last_known_added_at(cursor):
+    """Returns the newest spotify_added_at stored, or None if there are no albums yet."""
+    cursor.execute("SELECT MAX(spotify_added_at) FROM albums")
+    row = cursor.fetchone()
+    return row[0] if row and row[0] else None
 
 def get_db_connection(db_file):
     """Establishes and returns a database connection."""
-    conn = sqlite3.connect(db_file)
+    conn = sqlite3.connect(db_file, timeout=30)
     conn.row_factory = sqlite3.Row # Access columns by name
     # Enable foreign key support if not enabled by default (good practice)
     conn.execute("PRAGMA foreign_keys = ON")
@@ -188,8 +190,17 @@ def main():
     conn = get_db_connection(DB_FILE)
     cursor = conn.cursor()
 
-    current_offset = load_last_offset(STATE_FILE_PATH)
-    print(f"Starting album sync. Resuming from offset: {current_offset}")
+    sync_jobs.ensure_sync_jobs_table(conn)
+    current_offset, watermark = load_last_offset(conn)
+    # Saved albums come newest first, so a pass can stop at the first album older than the newest
+    # one already stored. The watermark is fixed when a pass starts, so resuming it can't skip albums.
+    # Pass --full to walk the whole library anyway.
+    full_walk = "--full" in sys.argv[1:]
+    if current_offset == 0:
+        watermark = None if full_walk else get_last_known_added_at(cursor)
+    print(f"Starting album sync. Resuming from offset: {current_offset}"
+          + (f", stopping at albums added before {watermark}" if watermark else " (full library walk)"))
+    reached_watermark = False
 
     total_albums_processed_this_session = 0
     total_new_albums_added = 0
@@ -225,6 +236,8 @@ def main():
 
         if not results['items']:
             print("No more albums found. Sync complete.")
+            save_last_offset(conn, 0)
+            conn.commit()
             break
 
         page_albums_added = 0
@@ -233,6 +246,10 @@ def main():
         for item in results['items']:
             api_album = item['album']
             spotify_added_at_ts = item['added_at'] # This is when user added album to library
+            if watermark and spotify_added_at_ts < watermark:
+                print(f"Reached albums added before {watermark}; the rest of the library is already stored.")
+                reached_watermark = True
+                break
 
             # Prepare album data for insertion
             album_data_to_insert = {
@@ -298,18 +315,25 @@ def main():
                     print(f"Failed to insert album '{album_data_to_insert['album_title']}' into DB. Skipping its artists.")
             total_albums_processed_this_session +=1
 
-        # Commit changes after processing the current page
+        # Commit the page together with the offset after it, so a restart resumes exactly here
+        pass_complete = reached_watermark or not results['next']
+        if pass_complete:
+            save_last_offset(conn, 0)  # The next pass starts from the newest album
+        else:
+            save_last_offset(conn, current_offset + len(results['items']), watermark)
         try:
             conn.commit()
             print(f"Committed {page_albums_added} new albums and {page_artists_added} new artists from this page.")
         except sqlite3.Error as e:
-            print(f"Database commit error: {e}. Some data for this page might not be saved.")
-            # Decide if to rollback or try to proceed carefully.
-            # For simplicity here, we log and continue. A more robust solution might try to rollback.
-            # conn.rollback() # Potentially
+            conn.rollback()
+            print(f"Database commit error: {e}. This page was not saved; it will be fetched again next run.")
+            conn.close()
+            exit(1)
+
+        if pass_complete:
+            break
 
         current_offset += len(results['items'])
-        save_last_offset(STATE_FILE_PATH, current_offset)
         print(f"Progress: Processed {total_albums_processed_this_session} albums this session. Next offset: {current_offset}")
         print(f"Total new albums added this session: {total_new_albums_added}")
         print(f"Total new artists added this session: {total_new_artists_added}")
@@ -0,0 +1,254 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+import config
+DB_FILE = config.DATABASE_FILE
+
+import spotipy
+from spotipy.oauth2 import SpotifyOAuth
+import sqlite3
+import time
+from datetime import datetime, timezone
+
+# Re-checks artists, albums and songs that are most likely to have changed on Spotify, using
+# their last_checked_at. Each row gets a staleness score: its age divided by the refresh interval
+# of its kind, weighted up by popularity (popular items change more and matter more) and for
+# recent releases. Rows are due once their score reaches 1; rows never checked come first.
+# Each cycle spends a fixed budget of API calls on the batches worth the most, then replans.
+# Run without arguments to keep refreshing as a daemon, or with --once for a single pass.
+
+# --- Configuration ---
+CREDENTIALS_FILE_PATH = os.path.expanduser("~/.spotify_credentials")
+SPOTIPY_REDIRECT_URI = "http://localhost:8888/callback"
+API_SCOPE = "user-library-read"
+
+# Base refresh interval per kind (before weighting) and how many ids one API call takes
+REFRESH_KINDS = {
+    "artists": {"interval_days": 7, "batch_size": 50},   # popularity and followers move weekly
+    "albums": {"interval_days": 30, "batch_size": 20},
+    "songs": {"interval_days": 90, "batch_size": 50},    # titles and durations rarely change
+}
+POPULARITY_WEIGHT = 50.0    # Popularity 100 makes a row come due 3x sooner; 0 leaves it at the base interval
+NEW_RELEASE_DAYS = 180      # Albums released this recently (and their songs) ...
+NEW_RELEASE_FACTOR = 3      # ... come due this many times sooner
+NEVER_CHECKED_SCORE = 1000  # Rows never checked (artists: never enriched) go before everything else
+
+# --- Rate limiting ---
+CALLS_PER_CYCLE = 20        # API budget of one planning cycle; scores are recomputed after each cycle
+SECONDS_BETWEEN_CALLS = 3   # About 20 calls a minute, well under Spotify's limits
+IDLE_SLEEP_SECONDS = 15 * 60  # How long the daemon waits when nothing is due
+RETRY_ATTEMPTS = 5
+RETRY_BASE_DELAY = 5  # Seconds
+
+# --- Helper Functions ---
+def get_current_utc_iso_timestamp():
+    return datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+def load_credentials(file_path):
+    try:
+        with open(file_path, 'r') as f:
+            client_id = f.readline().strip()
+            client_secret = f.readline().strip()
+        if not client_id or not client_secret:
+            raise ValueError("Client ID or Secret not found.")
+        return client_id, client_secret
+    except FileNotFoundError:
+        print(f"ERROR: Credentials file not found at {file_path}")
+        exit(1)
+    except ValueError as ve:
+        print(f"ERROR: Reading credentials: {ve}")
+        exit(1)
+
+def get_db_connection(db_file):
+    conn = sqlite3.connect(db_file, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+def fetch_with_retries(sp_function, *args, **kwargs):
+    """Generic wrapper for Spotipy calls with retry logic."""
+    for attempt in range(RETRY_ATTEMPTS):
+        try:
+            return sp_function(*args, **kwargs)
+        except spotipy.SpotifyException as e:
+            if e.http_status == 429: # Rate limit
+                retry_after = e.headers.get('Retry-After', RETRY_BASE_DELAY * (attempt + 1))
+                print(f"Rate limited. Retrying after {retry_after} seconds...")
+                time.sleep(int(retry_after) + 1)
+            elif e.http_status >= 500: # Server error
+                print(f"Spotify server error ({e.http_status}). Retrying in {RETRY_BASE_DELAY * (attempt + 1)}s...")
+                time.sleep(RETRY_BASE_DELAY * (attempt + 1))
+            else:
+                print(f"Unrecoverable Spotify API error: {e}")
+                raise
+        except Exception as e: # Other errors
+            print(f"Network or unexpected error: {e}. Retrying in {RETRY_BASE_DELAY * (attempt + 1)}s...")
+            time.sleep(RETRY_BASE_DELAY * (attempt + 1))
+    print(f"Failed to execute {sp_function.__name__} after {RETRY_ATTEMPTS} retries.")
+    return None
+
+# --- Planning ---
+def _candidates_sql(conn, kind):
+    """SELECT returning (spotify_id, score) for every row of one kind."""
+    age = "(julianday('now') - julianday({table}.last_checked_at))"
+    weight = f"(1 + COALESCE({{popularity}}, 0) / {POPULARITY_WEIGHT})"
+    new_release = f"(CASE WHEN {{release_date}} >= date('now', '-{NEW_RELEASE_DAYS} days') THEN {NEW_RELEASE_FACTOR} ELSE 1 END)"
+    interval = REFRESH_KINDS[kind]["interval_days"]
+    if kind == "artists":
+        return f"""
+            SELECT spotify_artist_id AS spotify_id,
+                   CASE WHEN last_checked_at IS NULL OR popularity IS NULL THEN {NEVER_CHECKED_SCORE}
+                        ELSE {age.format(table="artists")} / {interval} * {weight.format(popularity="popularity")} END AS score
+            FROM artists WHERE spotify_artist_id IS NOT NULL
+        """
+    if kind == "albums":
+        album_columns = {row[1] for row in conn.execute("PRAGMA table_info(albums)")}
+        still_saved = "WHERE spotify_removed_at IS NULL" if "spotify_removed_at" in album_columns else ""
+        return f"""
+            SELECT spotify_album_id AS spotify_id,
+                   CASE WHEN last_checked_at IS NULL THEN {NEVER_CHECKED_SCORE}
+                        ELSE {age.format(table="albums")} / {interval} * {weight.format(popularity="popularity")}
+                             * {new_release.format(release_date="release_date")} END AS score
+            FROM albums {still_saved}
+        """
+    # Songs have no popularity of their own: use their best album's
+    return f"""
+        SELECT spotify_song_id AS spotify_id,
+               CASE WHEN last_checked_at IS NULL THEN {NEVER_CHECKED_SCORE}
+                    ELSE {age.format(table="songs")} / {interval} * {weight.format(popularity="album_stats.popularity")}
+                         * {new_release.format(release_date="album_stats.release_date")} END AS score
+        FROM songs
+        LEFT JOIN (
+            SELECT l.song_id, MAX(a.popularity) AS popularity, MAX(a.release_date) AS release_date
+            FROM song_album_link l JOIN albums a ON a.album_id = l.album_id
+            GROUP BY l.song_id
+        ) album_stats ON album_stats.song_id = songs.song_id
+    """
+
+def plan_refreshes(conn, call_budget=CALLS_PER_CYCLE, kinds=tuple(REFRESH_KINDS)):
+    """
+    Returns up to call_budget batches [(kind, [spotify_id, ...], value), ...] of due rows, the
+    batches with the highest summed staleness score first. Each batch is one API call.
+    """
+    batches = []
+    for kind in kinds:
+        batch_size = REFRESH_KINDS[kind]["batch_size"]
+        rows = conn.execute(f"""
+            SELECT spotify_id, score FROM ({_candidates_sql(conn, kind)})
+            WHERE score >= 1 ORDER BY score DESC LIMIT ?
+        """, (call_budget * batch_size,)).fetchall()
+        for i in range(0, len(rows), batch_size):
+            chunk = rows[i:i + batch_size]
+            batches.append((kind, [row[0] for row in chunk], sum(row[1] for row in chunk)))
+    batches.sort(key=lambda batch: batch[2], reverse=True)
+    return batches[:call_budget]
+
+# --- Refreshing (one API call each) ---
+def refresh_artists(conn, sp, spotify_ids):
+    result = fetch_with_retries(sp.artists, artists=spotify_ids)
+    if result is None:
+        return None
+    now = get_current_utc_iso_timestamp()
+    found = [a for a in result['artists'] if a]
+    conn.executemany("""
+        UPDATE artists SET artist_image_url = ?, popularity = ?, followers_total = ?, last_checked_at = ?
+        WHERE spotify_artist_id = ?
+    """, [(a['images'][0]['url'] if a.get('images') else None, a.get('popularity'),
+           a['followers']['total'] if a.get('followers') else None, now, a['id']) for a in found])
+    return found
+
+def refresh_albums(conn, sp, spotify_ids):
+    result = fetch_with_retries(sp.albums, spotify_ids)
+    if result is None:
+        return None
+    now = get_current_utc_iso_timestamp()
+    found = [a for a in result['albums'] if a]
+    conn.executemany("""
+        UPDATE albums SET album_title = ?, total_tracks = ?, label = ?, popularity = ?, cover_image_url = ?, last_checked_at = ?
+        WHERE spotify_album_id = ?
+    """, [(a['name'], a['total_tracks'], a.get('label'), a.get('popularity'),
+           a['images'][0]['url'] if a.get('images') else None, now, a['id']) for a in found])
+    return found
+
+def refresh_songs(conn, sp, spotify_ids):
+    result = fetch_with_retries(sp.tracks, spotify_ids)
+    if result is None:
+        return None
+    now = get_current_utc_iso_timestamp()
+    found = [t for t in result['tracks'] if t]
+    conn.executemany("""
+        UPDATE songs SET song_title = ?, duration_ms = ?, spotify_track_uri = ?, last_checked_at = ?
+        WHERE spotify_song_id = ?
+    """, [(t['name'], t['duration_ms'], t['uri'], now, t['id']) for t in found])
+    return found
+
+REFRESHERS = {"artists": refresh_artists, "albums": refresh_albums, "songs": refresh_songs}
+ID_COLUMNS = {"artists": "spotify_artist_id", "albums": "spotify_album_id", "songs": "spotify_song_id"}
+
+def run_cycle(conn, sp, call_budget=CALLS_PER_CYCLE, kinds=tuple(REFRESH_KINDS), delay=SECONDS_BETWEEN_CALLS):
+    """
+    Plans one cycle and runs it, one commit per batch. Returns (API calls made, False if a call
+    failed and the cycle was cut short); no calls means nothing was due.
+    """
+    batches = plan_refreshes(conn, call_budget, kinds)
+    for calls, (kind, spotify_ids, value) in enumerate(batches):
+        if calls:
+            time.sleep(delay)
+        print(f"Refreshing {len(spotify_ids)} {kind} (staleness {value:.1f})...")
+        found = REFRESHERS[kind](conn, sp, spotify_ids)
+        if found is None:
+            print(f"  Failed to fetch {kind} after retries. They stay due for the next cycle.")
+            return calls + 1, False
+        # Ids Spotify no longer knows are stamped too, so they don't stay at the top of every plan
+        # (an artist without popularity would otherwise count as never enriched forever)
+        missing = set(spotify_ids) - {item['id'] for item in found}
+        if missing:
+            print(f"  Spotify returned nothing for {len(missing)} of them.")
+            extra = ", popularity = COALESCE(popularity, 0)" if kind == "artists" else ""
+            conn.executemany(f"UPDATE {kind} SET last_checked_at = ?{extra} WHERE {ID_COLUMNS[kind]} = ?",
+                             [(get_current_utc_iso_timestamp(), spotify_id) for spotify_id in missing])
+        conn.commit()
+    return len(batches), True
+
+# --- Main Script ---
+def main():
+    run_once = "--once" in sys.argv[1:]
+    client_id, client_secret = load_credentials(CREDENTIALS_FILE_PATH)
+    auth_manager = SpotifyOAuth(client_id=client_id, client_secret=client_secret,
+                                redirect_uri=SPOTIPY_REDIRECT_URI, scope=API_SCOPE)
+    sp = spotipy.Spotify(auth_manager=auth_manager)
+
+    try:
+        user = sp.current_user()
+        print(f"Authenticated with Spotify as: {user['display_name']} ({user['id']})")
+    except Exception as e:
+        print(f"Error during Spotify authentication: {e}")
+        exit(1)
+
+    conn = get_db_connection(DB_FILE)
+    total_calls = 0
+    try:
+        while True:
+            calls, completed = run_cycle(conn, sp)
+            total_calls += calls
+            if not completed:
+                if run_once:
+                    break
+                print(f"Spotify is not answering. Retrying in {IDLE_SLEEP_SECONDS // 60} minutes.")
+                time.sleep(IDLE_SLEEP_SECONDS)
+            elif calls:
+                time.sleep(SECONDS_BETWEEN_CALLS)
+            elif run_once:
+                print("Nothing left to refresh.")
+                break
+            else:
+                print(f"Nothing is due. Checking again in {IDLE_SLEEP_SECONDS // 60} minutes.")
+                time.sleep(IDLE_SLEEP_SECONDS)
+    except KeyboardInterrupt:
+        print("\nStopped.")
+    finally:
+        conn.close()
+        print(f"API calls made this session: {total_calls}")
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,30 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+import sync_jobs
+
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
 import sqlite3
-import os
 import time
-import json
 from datetime import datetime, timezone
 
 # --- Configuration ---
 DB_FILE = "spotify_data.db"
 CREDENTIALS_FILE_PATH = os.path.expanduser("~/.spotify_credentials")
-# New state file for song synchronization
+# Old JSON state; albums up to its last_processed_album_db_id are marked done in sync_jobs on first run
 SONG_SYNC_STATE_FILE_PATH = "spotify_song_sync_state.json"
+SONG_SYNC_JOB = "spotify_song_import"  # sync_jobs job name: one item per album (by album DB id)
 SPOTIPY_REDIRECT_URI = "http://localhost:8888/callback"
 # Scope user-library-read is usually enough, but some track details might benefit
 # from other scopes if you extend this later. For basic track info, it's fine.
 API_SCOPE = "user-library-read"
 
 # API call settings
-ITEMS_PER_PAGE_SONGS = 50  # Max for album_tracks
-DELAY_BETWEEN_ALBUM_PROCESSING = 1 # Seconds to wait after processing all songs for one album
-DELAY_BETWEEN_SONG_PAGES = 1   # Seconds to wait between fetching pages of songs for a single album
+ALBUMS_PER_REQUEST = 20  # Max for the several-albums endpoint; each album embeds its first 50 tracks
+DELAY_BETWEEN_ALBUM_BATCHES = 1 # Seconds to wait after processing one batch of albums
+DELAY_BETWEEN_SONG_PAGES = 1   # Seconds to wait between fetching further pages of songs for a long album
+SQL_VARIABLE_CHUNK = 500  # Ids per "IN (...)" lookup, below SQLite's bound-parameter limit
 RETRY_ATTEMPTS = 5
 RETRY_BASE_DELAY = 5  # Seconds
 
@@ -42,111 +47,94 @@ def load_credentials(file_path):
         print(f"ERROR: Reading credentials: {ve}")
         exit(1)
 
-def load_last_processed_album_id(state_file_path):
-    if os.path.exists(state_file_path):
-        try:
-            with open(state_file_path, 'r') as f:
-                state = json.load(f)
-                return state.get('last_processed_album_db_id', 0) # Default to 0 if key missing
-        except json.JSONDecodeError:
-            print(f"Warning: State file {state_file_path} corrupted. Starting from scratch.")
-            return 0
-    return 0 # No state file, start from the beginning
-
-def save_last_processed_album_id(state_file_path, album_db_id):
-    with open(state_file_path, 'w') as f:
-        json.dump({'last_processed_album_db_id': album_db_id}, f)
+def queue_new_albums(conn):
+    """
+    Adds the albums that have no song-import item yet, and those whose item has failed, to the queue
+    and commits. Returns how many were queued.
+    """
+    legacy_last_done = sync_jobs.get_cursor(conn, SONG_SYNC_JOB, legacy_state_file=SONG_SYNC_STATE_FILE_PATH).get('last_processed_album_db_id', 0)
+    cursor = conn.execute("""
+        SELECT album_id, spotify_album_id, album_title FROM albums
+        WHERE CAST(album_id AS TEXT) NOT IN (SELECT item_key FROM sync_jobs WHERE job = ? AND status != 'failed')
+        ORDER BY album_id ASC
+    """, (SONG_SYNC_JOB,))
+    new_albums = cursor.fetchall()
+    failed_keys = {row[0] for row in conn.execute("SELECT item_key FROM sync_jobs WHERE job = ? AND status = 'failed'", (SONG_SYNC_JOB,))}
+    sync_jobs.enqueue(conn, SONG_SYNC_JOB, [(a['album_id'], {'spotify_album_id': a['spotify_album_id'], 'album_title': a['album_title']})
+                                           for a in new_albums])
+    # Albums the old JSON state had already covered (failed ones are past the migration, so they are retried)
+    legacy_done = [a['album_id'] for a in new_albums if a['album_id'] <= legacy_last_done and str(a['album_id']) not in failed_keys]
+    sync_jobs.mark_done(conn, SONG_SYNC_JOB, legacy_done)
+    conn.commit()
+    return len(new_albums) - len(legacy_done)
 
 def get_db_connection(db_file):
-    conn = sqlite3.connect(db_file)
+    conn = sqlite3.connect(db_file, timeout=30)  # Other workers may hold the write lock briefly
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA foreign_keys = ON")
     return conn
 
 # --- Database Interaction Functions ---
-
-# Artist functions (can be reused or slightly adapted if needed)
-def get_artist_db_id_by_spotify_id(cursor, spotify_artist_id):
-    cursor.execute("SELECT artist_id FROM artists WHERE spotify_artist_id = ?", (spotify_artist_id,))
-    row = cursor.fetchone()
-    return row['artist_id'] if row else None
-
-def insert_artist(cursor, artist_details):
-    sql = """
-        INSERT INTO artists (
-            artist_name, spotify_artist_id, spotify_artist_uri, last_checked_at
-        ) VALUES (?, ?, ?, ?)
+def get_db_ids_by_spotify_ids(cursor, table, id_column, spotify_column, spotify_ids):
+    """Returns {spotify_id: db_id} for the spotify_ids already in table, looked up in chunks."""
+    spotify_ids = list(spotify_ids)
+    found = {}
+    for i in range(0, len(spotify_ids), SQL_VARIABLE_CHUNK):
+        chunk = spotify_ids[i:i + SQL_VARIABLE_CHUNK]
+        cursor.execute(f"SELECT {spotify_column}, {id_column} FROM {table} WHERE {spotify_column} IN ({','.join('?' * len(chunk))})", chunk)
+        found.update((row[0], row[1]) for row in cursor.fetchall())
+    return found
+
+def write_album_batch(cursor, album_tracks):
     """
-    try:
-        current_time = get_current_utc_iso_timestamp()
-        cursor.execute(sql, (
-            artist_details['artist_name'],
-            artist_details['spotify_artist_id'],
-            artist_details['spotify_artist_uri'],
-            current_time
-        ))
-        return cursor.lastrowid
-    except sqlite3.IntegrityError as e:
-        print(f"Error inserting artist {artist_details['spotify_artist_id']} ({artist_details['artist_name']}): {e}. Likely exists or name conflict.")
-        # Attempt to refetch, in case it was a name conflict but spotify_id already exists
-        existing_id = get_artist_db_id_by_spotify_id(cursor, artist_details['spotify_artist_id'])
-        if existing_id:
-            print(f"  Found existing artist ID {existing_id} for spotify_artist_id {artist_details['spotify_artist_id']} after insert error.")
-            return existing_id
-        return None
-
-
-# Song functions
-def get_song_db_id_by_spotify_id(cursor, spotify_song_id):
-    cursor.execute("SELECT song_id FROM songs WHERE spotify_song_id = ?", (spotify_song_id,))
-    row = cursor.fetchone()
-    return row['song_id'] if row else None
-
-def insert_song(cursor, song_details):
-    sql = """
-        INSERT INTO songs (
-            song_title, spotify_song_id, duration_ms, is_explicit,
-            spotify_track_uri, last_checked_at
-        ) VALUES (?, ?, ?, ?, ?, ?)
+    Writes the songs, artists and links of a batch of albums with one executemany per table.
+    album_tracks: [(album_db_id, [simplified track objects]), ...]. Returns (new_songs, new_artists).
     """
-    try:
-        cursor.execute(sql, (
-            song_details['song_title'],
-            song_details['spotify_song_id'],
-            song_details['duration_ms'],
-            song_details['is_explicit'],
-            song_details['spotify_track_uri'],
-            song_details['last_checked_at']
-        ))
-        return cursor.lastrowid
-    except sqlite3.IntegrityError as e:
-        print(f"Error inserting song {song_details['spotify_song_id']}: {e}")
-        return None
-
-# Link table functions
-def insert_song_album_link(cursor, song_db_id, album_db_id, track_number, disc_number):
-    sql = """
-        INSERT OR IGNORE INTO song_album_link (
-            song_id, album_id, track_number, disc_number
-        ) VALUES (?, ?, ?, ?)
-    """
-    try:
-        cursor.execute(sql, (song_db_id, album_db_id, track_number, disc_number))
-    except sqlite3.IntegrityError as e:
-        # This shouldn't happen with INSERT OR IGNORE if PK is (song_id, album_id)
-        print(f"Error inserting song-album link for song_id {song_db_id}, album_id {album_db_id}: {e}")
-
-def insert_song_artist_link(cursor, song_db_id, artist_db_id, artist_order):
-    sql = """
-        INSERT OR IGNORE INTO song_artist_link (
-            song_id, artist_id, artist_order
-        ) VALUES (?, ?, ?)
-    """
-    try:
-        cursor.execute(sql, (song_db_id, artist_db_id, artist_order))
-    except sqlite3.IntegrityError as e:
-        # This shouldn't happen with INSERT OR IGNORE if PK is (song_id, artist_id)
-        print(f"Error inserting song-artist link for song_id {song_db_id}, artist_id {artist_db_id}: {e}")
+    now = get_current_utc_iso_timestamp()
+    tracks = {t['id']: t for _, album_items in album_tracks for t in album_items}
+    artists = {a['id']: a for _, album_items in album_tracks for t in album_items for a in t['artists'] if a.get('id')}
+
+    # Artists first (songs link to them); artists already stored keep their data
+    artist_ids = get_db_ids_by_spotify_ids(cursor, "artists", "artist_id", "spotify_artist_id", artists)
+    new_artists = [a for a in artists.values() if a['id'] not in artist_ids]
+    cursor.executemany("""
+        INSERT OR IGNORE INTO artists (artist_name, spotify_artist_id, spotify_artist_uri, last_checked_at)
+        VALUES (?, ?, ?, ?)
+    """, [(a['name'], a['id'], a['uri'], now) for a in new_artists])
+    artist_ids.update(get_db_ids_by_spotify_ids(cursor, "artists", "artist_id", "spotify_artist_id", [a['id'] for a in new_artists]))
+    for a in new_artists:
+        if a['id'] in artist_ids:
+            print(f"      Added artist (from song): '{a['name']}' (Spotify ID: {a['id']}) to DB (New ID: {artist_ids[a['id']]}).")
+        else:  # Ignored: another artist already has this name
+            print(f"      Failed to insert artist '{a['name']}' ({a['id']}); the name is taken. Skipping its links.")
+
+    song_ids = get_db_ids_by_spotify_ids(cursor, "songs", "song_id", "spotify_song_id", tracks)
+    new_songs = [t for t in tracks.values() if t['id'] not in song_ids]
+    cursor.executemany("""
+        INSERT OR IGNORE INTO songs (song_title, spotify_song_id, duration_ms, is_explicit, spotify_track_uri, last_checked_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, [(t['name'], t['id'], t['duration_ms'], 1 if t.get('explicit') else 0, t['uri'], now) for t in new_songs])
+    song_ids.update(get_db_ids_by_spotify_ids(cursor, "songs", "song_id", "spotify_song_id", [t['id'] for t in new_songs]))
+    for t in new_songs:
+        if t['id'] in song_ids:
+            print(f"    Added song: '{t['name']}' (Spotify ID: {t['id']}) to DB (New ID: {song_ids[t['id']]}).")
+
+    album_links, artist_links = [], []
+    for album_db_id, album_items in album_tracks:
+        for t in album_items:
+            song_db_id = song_ids.get(t['id'])
+            if not song_db_id:
+                continue
+            album_links.append((song_db_id, album_db_id, t['track_number'], t.get('disc_number', 1)))
+            artist_links.extend((song_db_id, artist_ids[a['id']], order + 1)
+                                for order, a in enumerate(t['artists']) if a.get('id') in artist_ids)
+    cursor.executemany("""
+        INSERT OR IGNORE INTO song_album_link (song_id, album_id, track_number, disc_number) VALUES (?, ?, ?, ?)
+    """, album_links)
+    cursor.executemany("""
+        INSERT OR IGNORE INTO song_artist_link (song_id, artist_id, artist_order) VALUES (?, ?, ?)
+    """, artist_links)
+    return sum(1 for t in new_songs if t['id'] in song_ids), sum(1 for a in new_artists if a['id'] in artist_ids)
 
 
 def fetch_with_retries(sp_function, *args, **kwargs):
@@ -188,146 +176,76 @@ def main():
     conn = get_db_connection(DB_FILE)
     cursor = conn.cursor()
 
-    last_processed_album_db_id = load_last_processed_album_id(SONG_SYNC_STATE_FILE_PATH)
-    print(f"Starting song sync. Resuming after album DB ID: {last_processed_album_db_id}")
-
-    # Get albums from DB that haven't been processed yet for songs
-    # Order by album_id to ensure consistent processing order for resumability
-    cursor.execute("""
-        SELECT album_id, spotify_album_id, album_title FROM albums
-        WHERE album_id > ?
-        ORDER BY album_id ASC
-    """, (last_processed_album_db_id,))
-    
-    albums_to_process = cursor.fetchall()
-
-    if not albums_to_process:
-        print("No new albums found to process for songs.")
-        conn.close()
-        return
-
-    print(f"Found {len(albums_to_process)} albums to process for songs.")
+    sync_jobs.ensure_sync_jobs_table(conn)
+    print(f"Starting song sync. Queued {queue_new_albums(conn)} new or failed albums.")
+    worker = sync_jobs.worker_id()
 
     total_songs_added_session = 0
     total_artists_added_session = 0 # Artists added via songs
 
-    for db_album in albums_to_process:
-        album_db_id = db_album['album_id']
-        album_spotify_id = db_album['spotify_album_id']
-        album_title = db_album['album_title']
-        print(f"\nProcessing album: '{album_title}' (DB ID: {album_db_id}, Spotify ID: {album_spotify_id})")
-
-        current_song_offset = 0
-        album_songs_processed_count = 0
-        album_new_songs_added = 0
-        album_new_artists_added = 0
-
-        while True:
-            print(f"  Fetching songs for album '{album_title}', page offset: {current_song_offset}")
-            
-            api_album_tracks = fetch_with_retries(
-                sp.album_tracks,
-                album_id=album_spotify_id,
-                limit=ITEMS_PER_PAGE_SONGS,
-                offset=current_song_offset
-            )
-
-            if api_album_tracks is None:
-                print(f"  Failed to fetch tracks for album '{album_title}' after retries. Skipping this album.")
-                # This album will be retried next time the script runs due to state saving.
-                # Or, you could implement a more sophisticated error state for specific albums.
-                conn.close() # Close connection before exiting if fatal error
-                exit(1) # Or `break` to try next album if that's preferred for non-fatal.
-
-            if not api_album_tracks['items']:
-                print(f"  No more songs found for album '{album_title}'.")
-                break # Finished with this album's songs
-
-            for api_song_simple in api_album_tracks['items']:
-                if api_song_simple is None or api_song_simple['id'] is None: # Skip if track is unavailable (e.g. local file or removed)
-                    print(f"  Skipping an unavailable track in album '{album_title}'.")
-                    album_songs_processed_count += 1
-                    continue
-
-                song_spotify_id = api_song_simple['id']
-                
-                # Check if song already exists
-                song_db_id = get_song_db_id_by_spotify_id(cursor, song_spotify_id)
-
-                if not song_db_id:
-                    song_data_to_insert = {
-                        'song_title': api_song_simple['name'],
-                        'spotify_song_id': song_spotify_id,
-                        'duration_ms': api_song_simple['duration_ms'],
-                        'is_explicit': 1 if api_song_simple['explicit'] else 0,
-                        'spotify_track_uri': api_song_simple['uri'],
-                        'last_checked_at': get_current_utc_iso_timestamp()
-                    }
-                    song_db_id = insert_song(cursor, song_data_to_insert)
-                    if song_db_id:
-                        print(f"    Added song: '{song_data_to_insert['song_title']}' (Spotify ID: {song_spotify_id}) to DB (New ID: {song_db_id}).")
-                        total_songs_added_session += 1
-                        album_new_songs_added += 1
-                    else:
-                        print(f"    Failed to insert song '{api_song_simple['name']}'. Skipping links for this song.")
-                        album_songs_processed_count += 1
-                        continue # Skip artists and album link if song insertion failed
-                # else:
-                    # print(f"    Song '{api_song_simple['name']}' (Spotify ID: {song_spotify_id}) already in DB (ID: {song_db_id}).")
-                    # Optionally update last_checked_at for existing song here
-
-                # Link song to album
-                insert_song_album_link(cursor, song_db_id, album_db_id,
-                                       api_song_simple['track_number'],
-                                       api_song_simple.get('disc_number', 1)) # API usually provides disc_number
-
-                # Process song artists
-                for order_idx, api_artist_summary in enumerate(api_song_simple['artists']):
-                    artist_order = order_idx + 1
-                    artist_spotify_id = api_artist_summary['id']
-                    
-                    artist_db_id = get_artist_db_id_by_spotify_id(cursor, artist_spotify_id)
-                    
-                    if not artist_db_id:
-                        artist_data_to_insert = {
-                            'artist_name': api_artist_summary['name'],
-                            'spotify_artist_id': artist_spotify_id,
-                            'spotify_artist_uri': api_artist_summary['uri']
-                        }
-                        artist_db_id = insert_artist(cursor, artist_data_to_insert)
-                        if artist_db_id:
-                            print(f"      Added artist (from song): '{artist_data_to_insert['artist_name']}' (Spotify ID: {artist_spotify_id}) to DB (New ID: {artist_db_id}).")
-                            total_artists_added_session += 1
-                            album_new_artists_added +=1
-                        else:
-                            print(f"      Failed to insert artist '{api_artist_summary['name']}' from song. Skipping link.")
-                            continue # Skip linking this artist for this song
-                    
-                    if artist_db_id: # Ensure artist_db_id is valid
-                        insert_song_artist_link(cursor, song_db_id, artist_db_id, artist_order)
-                
-                album_songs_processed_count += 1
-
-            current_song_offset += len(api_album_tracks['items'])
-            if api_album_tracks['next']: # If there are more pages for this album's songs
-                print(f"  Waiting {DELAY_BETWEEN_SONG_PAGES}s before next song page...")
+    # Albums are claimed in sync_jobs, so several copies of this script can share the work
+    while True:
+        claimed = sync_jobs.claim(conn, SONG_SYNC_JOB, worker, ALBUMS_PER_REQUEST)
+        if not claimed:
+            print("No more queued albums to process for songs.")
+            break
+        batch = [dict(payload, album_id=int(album_id)) for album_id, payload in claimed]
+        print(f"\nFetching {len(batch)} albums (DB IDs {', '.join(str(a['album_id']) for a in batch)})...")
+        api_albums = fetch_with_retries(sp.albums, [db_album['spotify_album_id'] for db_album in batch])
+        if api_albums is None:
+            print("  Failed to fetch albums after retries. Stopping; this batch will be retried next run.")
+            # The request failed, not these albums: return them to the queue without using up an attempt
+            sync_jobs.release(conn, SONG_SYNC_JOB, [db_album['album_id'] for db_album in batch])
+            conn.close()
+            exit(1)
+
+        album_tracks = []
+        failed_albums = []
+        for db_album, api_album in zip(batch, api_albums['albums']):
+            album_title = db_album['album_title']
+            if api_album is None:
+                print(f"  Album '{album_title}' (Spotify ID: {db_album['spotify_album_id']}) is no longer available. Skipping.")
+                continue
+            tracks_page = api_album['tracks']
+            items = list(tracks_page['items'])
+            # Only long albums need more calls: the first 50 tracks came with the album
+            while tracks_page and tracks_page['next']:
+                print(f"  Fetching more songs for album '{album_title}', offset: {len(items)}")
                 time.sleep(DELAY_BETWEEN_SONG_PAGES)
-            else: # No more pages for this album
-                break 
-        
-        # After processing all songs for an album
+                tracks_page = fetch_with_retries(sp.next, tracks_page)
+                if tracks_page is None:
+                    print(f"  Failed to fetch all tracks for album '{album_title}' after retries. It will be retried later.")
+                    failed_albums.append(db_album['album_id'])
+                    break
+                items.extend(tracks_page['items'])
+            if tracks_page is None:
+                continue
+            available = [t for t in items if t is not None and t['id'] is not None]  # Skip unavailable tracks (e.g. local files or removed)
+            if len(available) < len(items):
+                print(f"  Skipping {len(items) - len(available)} unavailable track(s) in album '{album_title}'.")
+            print(f"  Album '{album_title}' (DB ID: {db_album['album_id']}): {len(available)} songs.")
+            album_tracks.append((db_album['album_id'], available))
+
         try:
+            new_songs, new_artists = write_album_batch(cursor, album_tracks)
+            # Same transaction as the songs: the albums are done exactly when their songs are stored
+            sync_jobs.mark_done(conn, SONG_SYNC_JOB, [a['album_id'] for a in batch if a['album_id'] not in failed_albums])
             conn.commit()
-            print(f"  Finished processing album '{album_title}'. {album_songs_processed_count} songs checked/processed.")
-            print(f"  Added {album_new_songs_added} new songs and {album_new_artists_added} new artists from this album.")
-            save_last_processed_album_id(SONG_SYNC_STATE_FILE_PATH, album_db_id)
+            total_songs_added_session += new_songs
+            total_artists_added_session += new_artists
+            print(f"  Added {new_songs} new songs and {new_artists} new artists from this batch.")
         except sqlite3.Error as e:
-            print(f"Database commit error after album '{album_title}': {e}. State not saved for this album.")
-            # This means this album might be reprocessed. Consider rollback or more robust error logging.
-            # conn.rollback() # Potentially
-
-        print(f"Waiting {DELAY_BETWEEN_ALBUM_PROCESSING}s before processing next album...")
-        time.sleep(DELAY_BETWEEN_ALBUM_PROCESSING)
+            conn.rollback()
+            print(f"Database error writing the batch: {e}. Its albums will be retried.")
+            for db_album in batch:
+                sync_jobs.mark_failed(conn, SONG_SYNC_JOB, db_album['album_id'], e)
+            conn.close()
+            exit(1)
+        for album_id in failed_albums:
+            sync_jobs.mark_failed(conn, SONG_SYNC_JOB, album_id, "could not fetch all tracks")
+
+        print(f"Waiting {DELAY_BETWEEN_ALBUM_BATCHES}s before processing next batch...")
+        time.sleep(DELAY_BETWEEN_ALBUM_BATCHES)
 
     conn.close()
     print("\n--- Song Sync Session Complete ---")
@@ -335,4 +253,4 @@ def main():
     print(f"Total new artists (from songs) added to DB this session: {total_artists_added_session}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
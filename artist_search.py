@@ -0,0 +1,137 @@
+# artist_search.py
+# Shared artist search for the browser's artist filter and the entry/modify dialogs.
+# Names are normalized (case-folded, letters and digits only, so "gidle" finds "(G)I-DLE") and
+# kept in sorted arrays of whole names and of single words, so prefix lookups are a bisect;
+# substring matches fall back to one pass over the normalized names. Results are ranked by
+# match kind, then by Spotify popularity and how recently the artist appeared in the catalog.
+# The index is built once and reused until the artists table changes.
+import bisect
+import datetime
+import math
+import re
+import time
+
+import db_operations
+
+MATCH_EXACT, MATCH_PREFIX, MATCH_WORD_PREFIX, MATCH_SUBSTRING = range(4)
+RECENCY_WEIGHT = 0.5  # A just-active artist ranks like one 50 popularity points higher...
+RECENCY_HALF_LIFE_DAYS = 365.0  # ...and the bonus halves every year
+TYPE_AHEAD_RESET_SECONDS = 1.0
+
+_WORD_SPLIT_RE = re.compile(r"[\W_]+")
+_MAX_CHAR = "\U0010ffff"
+
+
+def normalize(text):
+    return "".join(ch for ch in (text or "").casefold() if ch.isalnum())
+
+
+def _rank_weight(popularity, last_date, today):
+    weight = (popularity or 0) / 100.0
+    if last_date:
+        try:
+            days = (today - datetime.date.fromisoformat(last_date[:10])).days
+            weight += RECENCY_WEIGHT * math.exp(-math.log(2) * max(days, 0) / RECENCY_HALF_LIFE_DAYS)
+        except ValueError:
+            pass  # Partial dates ("2019", "2019-05") carry no recency bonus
+    return weight
+
+
+class ArtistIndex:
+    """Search index over a list of artist dicts ({'id', 'name'}); .artists and .names are in display (A-Z) order."""
+    def __init__(self, artists, stats=None):
+        stats = stats or {}
+        today = datetime.date.today()
+        self.artists = sorted(artists, key=lambda a: a['name'].lower())
+        self.names = [a['name'] for a in self.artists]
+        self.positions = {name: i for i, name in enumerate(self.names)}
+        self._keys = [normalize(name) for name in self.names]
+        self._weights = [_rank_weight(*stats.get(a['id'], (None, None)), today) for a in self.artists]
+        by_key = sorted((key, i) for i, key in enumerate(self._keys))
+        self._sorted_keys = [key for key, _ in by_key]
+        self._sorted_key_ids = [i for _, i in by_key]
+        by_word = sorted((normalize(word), i) for i, name in enumerate(self.names)
+                         for word in _WORD_SPLIT_RE.split(name.casefold()) if normalize(word))
+        self._sorted_words = [word for word, _ in by_word]
+        self._sorted_word_ids = [i for _, i in by_word]
+
+    def __len__(self):
+        return len(self.artists)
+
+    @staticmethod
+    def _prefix_slice(sorted_keys, prefix):
+        return bisect.bisect_left(sorted_keys, prefix), bisect.bisect_left(sorted_keys, prefix + _MAX_CHAR)
+
+    def search(self, query, limit=50):
+        """Returns up to limit artist dicts matching query (all of them if limit is None), best first."""
+        q = normalize(query)
+        if not q:
+            return self.artists[:limit]
+        kinds = {}
+        lo, hi = self._prefix_slice(self._sorted_keys, q)
+        for pos in range(lo, hi):
+            i = self._sorted_key_ids[pos]
+            kinds[i] = MATCH_EXACT if self._sorted_keys[pos] == q else MATCH_PREFIX
+        lo, hi = self._prefix_slice(self._sorted_words, q)
+        for pos in range(lo, hi):
+            kinds.setdefault(self._sorted_word_ids[pos], MATCH_WORD_PREFIX)
+        if limit is None or len(kinds) < limit:
+            for i, key in enumerate(self._keys):
+                if i not in kinds and q in key:
+                    kinds[i] = MATCH_SUBSTRING
+        ranked = sorted(kinds, key=lambda i: (kinds[i], -self._weights[i], i))
+        return [self.artists[i] for i in ranked[:limit]]
+
+
+class TypeAhead:
+    """
+    Turns keystrokes typed in quick succession into a search (like type-to-select in a file
+    manager). Repeating one letter cycles through that letter's matches instead.
+    """
+    def __init__(self, index):
+        self.index = index
+        self._buffer = ""
+        self._last_key_at = 0.0
+
+    def feed(self, char, current_name=None):
+        """Returns the artist name to jump to after typing char, or None if nothing matches."""
+        now = time.monotonic()
+        if now - self._last_key_at > TYPE_AHEAD_RESET_SECONDS:
+            self._buffer = ""
+        self._last_key_at = now
+        char = char.lower()
+        if self._buffer and set(self._buffer) == {char}:
+            self._buffer = char
+            matches = [a['name'] for a in self.index.search(char, limit=None)]
+            if not matches:
+                return None
+            try:
+                return matches[(matches.index(current_name) + 1) % len(matches)]
+            except ValueError:
+                return matches[0]
+        self._buffer += char
+        best = self.index.search(self._buffer, limit=1)
+        return best[0]['name'] if best else None
+
+
+_index = None
+_index_version = None
+
+
+def get_artist_index():
+    """Returns the shared index, rebuilding it if the artists table changed since it was built."""
+    global _index, _index_version
+    version = db_operations.get_artists_version()
+    if _index is None or version != _index_version:
+        _index = ArtistIndex(db_operations.get_all_artists(), db_operations.get_artist_search_stats())
+        _index_version = version
+    return _index
+
+
+def invalidate_artist_index():
+    """
+    Forces the next get_artist_index() to rebuild. Call it after adding, deleting or renaming
+    artists in this process: get_artists_version only notices new artist ids.
+    """
+    global _index
+    _index = None
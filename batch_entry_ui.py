@@ -0,0 +1,450 @@
+# batch_entry_ui.py
+# Batch entry of local files: pick a folder or several files, let background workers run the
+# same auto-detection as the single-file form (date, artist, songs, resolution) on each of them,
+# correct the results in an editable grid and save them all in one transaction.
+# The main list is then updated once with just the new records.
+import os
+import sqlite3
+import datetime
+import tkinter as tk
+from tkinter import ttk, messagebox, filedialog
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+import db_operations
+import media_probe
+import song_cache
+import utils
+
+# UI theme constants
+DARK_BG = "#222222"
+BRIGHT_FG = "#f8f8f2"
+ACCENT = "#44475a"
+FONT_MAIN = ("Courier New", 13)
+FONT_HEADER = ("Courier New", 13, "bold")
+
+MEDIA_EXTENSIONS = ('.mp4', '.mkv', '.avi', '.mov', '.webm', '.flv', '.wmv', '.ts', '.tp',
+                    '.mp3', '.wav', '.flac', '.aac', '.ogg')
+MAX_DETECT_WORKERS = 4  # Filename matching is cheap; the workers mostly wait on probing the drives
+
+COLUMNS = (
+    # (key, heading, width)
+    ("file", "File", 260),
+    ("artist", "Artist", 150),
+    ("date", "Date (YYMMDD)", 110),
+    ("title", "Title", 200),
+    ("songs", "Songs", 200),
+    ("show_type", "Show Type", 120),
+    ("resolution", "Resolution", 100),
+    ("status", "Status", 140),
+)
+
+STATUS_DETECTING = "detecting..."
+STATUS_READY = "ready"
+STATUS_INCOMPLETE = "needs details"
+STATUS_IN_DB = "already in DB"
+STATUS_SAVED = "saved"
+
+
+def list_media_files(folder):
+    """Returns the media files directly inside folder, sorted by name."""
+    try:
+        names = sorted(os.listdir(folder), key=str.lower)
+    except OSError as e:
+        print(f"Batch entry: could not list {folder}: {e}")
+        return []
+    return [os.path.join(folder, name) for name in names
+            if name.lower().endswith(MEDIA_EXTENSIONS) and os.path.isfile(os.path.join(folder, name))]
+
+
+def detect_file(path, artists, db_file=None):
+    """
+    Runs the single-file form's auto-detection on path, with its own connection (for worker threads).
+    Returns {'date', 'artist', 'songs', 'height'}; fields that could not be detected are empty.
+    """
+    result = {'date': utils.extract_date_from_filepath(path) or '', 'artist': '', 'songs': [], 'height': None}
+    result['artist'] = utils.detect_artist_in_filename(path, artists) or ''
+    conn = sqlite3.connect(db_file or config.DATABASE_FILE, timeout=30)
+    try:
+        if result['artist']:
+            artist_ids = [a['id'] for a in artists if a['name'] == result['artist']]
+            songs = song_cache.get_song_cache().get_songs(artist_ids, conn=conn)
+            # Decisions already made in the song linker take precedence over fuzzy matching
+            matches = (utils.match_linker_decisions(path, db_operations.get_linker_decisions_for_artists(artist_ids, conn=conn), songs)
+                       + (utils.find_song_in_filename(path, songs, detailed=True) or []))
+            result['songs'] = [title for _, title in utils.select_detected_songs(matches)]
+        media_probe.ensure_media_probe_table(conn)
+        info = media_probe.get_cached_probe(conn, path)
+        if info is None:
+            _, info = media_probe.probe_file(path)
+            media_probe.store_probe(conn, path, info)
+            conn.commit()
+        result['height'] = (info or {}).get('height')
+    except sqlite3.Error as e:
+        print(f"Batch entry: database error while detecting {path}: {e}")
+    finally:
+        conn.close()
+    return result
+
+
+class BatchEntryWindow(tk.Toplevel):
+    """
+    Grid of local files to add as entries of one type. Double-click a cell to edit it; an edit
+    made on one of several selected rows is applied to all of them (e.g. one show type for a
+    whole folder). on_saved(performance_ids=..., mv_ids=...) is called after a successful save.
+    """
+    def __init__(self, master, db_ops, entry_type, artist_index, show_type_choices, resolution_choices, on_saved=None):
+        super().__init__(master)
+        self.db_ops = db_ops
+        self.entry_type = entry_type
+        self.artist_index = artist_index
+        self.show_type_choices = list(show_type_choices)
+        self.resolution_choices = list(resolution_choices)
+        self.on_saved = on_saved
+        self.rows = {}  # iid -> {'path', 'artist', 'date', 'title', 'songs', 'show_type', 'resolution', 'status', 'auto_title'}
+        self._executor = ThreadPoolExecutor(max_workers=MAX_DETECT_WORKERS, thread_name_prefix="BatchDetect")
+        self._editor = None
+        self._pending = 0
+
+        label = "Performances" if entry_type == "performance" else "Music Videos"
+        self.title(f"Batch Add {label}")
+        self.geometry("1400x700")
+        self.configure(bg=DARK_BG)
+        self.transient(master)
+        self.grab_set()
+
+        style = ttk.Style(self)
+        style.configure("Batch.Treeview", background=DARK_BG, fieldbackground=DARK_BG, foreground=BRIGHT_FG,
+                        font=FONT_MAIN, rowheight=26)
+        style.configure("Batch.Treeview.Heading", background=ACCENT, foreground=BRIGHT_FG, font=FONT_HEADER)
+        style.map("Batch.Treeview", background=[('selected', "#6272a4")])
+
+        main_frame = ttk.Frame(self, padding=10, style="DataEntry.TFrame")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+
+        button_row = ttk.Frame(main_frame, style="DataEntry.TFrame")
+        button_row.pack(fill="x", pady=(0, 8))
+        ttk.Button(button_row, text="Add Files...", command=self.add_files, style="DataEntry.TButton").pack(side=tk.LEFT, padx=2)
+        ttk.Button(button_row, text="Add Folder...", command=self.add_folder, style="DataEntry.TButton").pack(side=tk.LEFT, padx=2)
+        ttk.Button(button_row, text="Remove Selected", command=self.remove_selected, style="DataEntry.TButton").pack(side=tk.LEFT, padx=(16, 2))
+
+        columns = [key for key, _, _ in COLUMNS if not (key == "show_type" and entry_type != "performance")]
+        tree_frame = ttk.Frame(main_frame, style="DataEntry.TFrame")
+        tree_frame.pack(fill=tk.BOTH, expand=True)
+        self.tree = ttk.Treeview(tree_frame, columns=columns, show="headings", selectmode="extended", style="Batch.Treeview")
+        for key, heading, width in COLUMNS:
+            if key in columns:
+                self.tree.heading(key, text=heading)
+                self.tree.column(key, width=width, stretch=key in ("file", "title"))
+        scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill="y")
+        self.tree.tag_configure("incomplete", foreground="#f1fa8c")
+        self.tree.tag_configure("blocked", foreground="#ff5555")
+        self.tree.tag_configure("saved", foreground="#6272a4")
+        self.tree.bind("<Double-1>", self._begin_edit)
+        self.tree.bind("<Delete>", lambda e: self.remove_selected())
+
+        self.status_var = tk.StringVar(value="Add files or a folder to start.")
+        ttk.Label(main_frame, textvariable=self.status_var, style="DataEntry.TLabel").pack(anchor="w", pady=(6, 0))
+
+        bottom_row = ttk.Frame(main_frame, style="DataEntry.TFrame")
+        bottom_row.pack(fill="x", pady=(8, 0))
+        self.save_button = ttk.Button(bottom_row, text="Save All", command=self.save_all, style="DataEntry.TButton")
+        self.save_button.pack(side=tk.RIGHT, padx=2)
+        ttk.Button(bottom_row, text="Close", command=self.close_window, style="DataEntry.TButton").pack(side=tk.RIGHT, padx=2)
+
+        self.protocol("WM_DELETE_WINDOW", self.close_window)
+
+    # --- Adding files ---
+
+    def add_files(self):
+        paths = filedialog.askopenfilenames(
+            title="Select Local Media Files", parent=self,
+            filetypes=(('Media files', ' '.join(f'*{ext}' for ext in MEDIA_EXTENSIONS)), ('All files', '*.*')))
+        self.add_paths(paths)
+
+    def add_folder(self):
+        folder = filedialog.askdirectory(title="Select Folder", parent=self, mustexist=True)
+        if folder:
+            self.add_paths(list_media_files(folder))
+
+    def add_paths(self, paths):
+        """Adds a row per new path and queues its detection in the background."""
+        known = {row['path'] for row in self.rows.values()}
+        used_paths = self.db_ops.get_used_file_paths()
+        artists = self.artist_index.artists
+        added = 0
+        for path in paths:
+            if path in known:
+                continue
+            known.add(path)
+            iid = self.tree.insert("", tk.END)
+            in_db = path in used_paths
+            self.rows[iid] = {'path': path, 'artist': '', 'date': '', 'title': '', 'songs': [], 'show_type': '',
+                              'resolution': '', 'auto_title': True,
+                              'status': STATUS_IN_DB if in_db else STATUS_DETECTING}
+            self._render_row(iid)
+            added += 1
+            if in_db:
+                continue
+            self._pending += 1
+            future = self._executor.submit(detect_file, path, artists)
+            future.add_done_callback(lambda f, iid=iid: self._on_detected_threadsafe(iid, f))
+        if added:
+            self._update_status()
+
+    def _on_detected_threadsafe(self, iid, future):
+        """Runs on a worker thread: hands the result to the Tk thread."""
+        try:
+            result = future.result()
+        except Exception as e:  # A bad file must not stall the rest of the batch
+            print(f"Batch entry: detection failed: {e}")
+            result = None
+        try:
+            self.after(0, lambda: self._apply_detection(iid, result))
+        except (RuntimeError, tk.TclError):
+            pass  # Window closed meanwhile
+
+    def _apply_detection(self, iid, result):
+        if not self.winfo_exists():
+            return
+        self._pending -= 1
+        row = self.rows.get(iid)
+        if row is None:
+            self._update_status()
+            return  # Removed while it was being detected
+        if result:
+            # Fields the user already filled in win over detection
+            row['date'] = row['date'] or result['date']
+            row['artist'] = row['artist'] or result['artist']
+            if not row['songs'] and result['songs']:
+                row['songs'] = result['songs']
+                if row['auto_title']:
+                    row['title'] = ", ".join(row['songs'])
+            if not row['resolution'] and result['height']:
+                label = media_probe.resolution_label(result['height'])
+                # Prefer the spelling already used in the database (e.g. "4k" vs "4K")
+                row['resolution'] = next((c for c in self.resolution_choices if c.lower() == label.lower()), label)
+        self._refresh_status(row)
+        self._render_row(iid)
+        self._update_status()
+
+    # --- Grid ---
+
+    def _missing_fields(self, row):
+        missing = []
+        if not row['artist']: missing.append("artist")
+        if not row['title']: missing.append("title")
+        if not (row['date'].isdigit() and len(row['date']) == 6 and self._convert_date(row['date'])): missing.append("date")
+        if self.entry_type == "performance":
+            if not row['show_type']: missing.append("show type")
+            if not row['resolution']: missing.append("resolution")
+        return missing
+
+    def _refresh_status(self, row):
+        if row['status'] in (STATUS_IN_DB, STATUS_SAVED):
+            return
+        row['status'] = STATUS_INCOMPLETE if self._missing_fields(row) else STATUS_READY
+
+    def _render_row(self, iid):
+        row = self.rows[iid]
+        values = {'file': os.path.basename(row['path']), 'songs': ", ".join(row['songs'])}
+        for key in ("artist", "date", "title", "show_type", "resolution", "status"):
+            values[key] = row[key]
+        tag = {STATUS_INCOMPLETE: "incomplete", STATUS_IN_DB: "blocked", STATUS_SAVED: "saved"}.get(row['status'], "")
+        self.tree.item(iid, values=[values[c] for c in self.tree["columns"]], tags=(tag,) if tag else ())
+
+    def _update_status(self):
+        counts = {}
+        for row in self.rows.values():
+            counts[row['status']] = counts.get(row['status'], 0) + 1
+        parts = [f"{len(self.rows)} file(s)"]
+        parts += [f"{count} {status}" for status, count in counts.items()]
+        self.status_var.set(", ".join(parts))
+
+    def remove_selected(self):
+        for iid in self.tree.selection():
+            self.tree.delete(iid)
+            self.rows.pop(iid, None)
+        self._update_status()
+
+    # --- Cell editing ---
+
+    def _begin_edit(self, event):
+        iid = self.tree.identify_row(event.y)
+        column_id = self.tree.identify_column(event.x)
+        if not iid or not column_id:
+            return
+        column = self.tree["columns"][int(column_id[1:]) - 1]
+        row = self.rows[iid]
+        if column in ("file", "status") or row['status'] in (STATUS_IN_DB, STATUS_SAVED):
+            return
+        # An edit on one of several selected rows applies to all of them
+        selection = self.tree.selection()
+        targets = [i for i in selection if self.rows[i]['status'] not in (STATUS_IN_DB, STATUS_SAVED)] if iid in selection else [iid]
+        if column == "songs":
+            self._edit_songs(targets)
+            return
+        bbox = self.tree.bbox(iid, column_id)
+        if not bbox:
+            return
+        self._cancel_edit()
+        var = tk.StringVar(value=row[column])
+        if column in ("artist", "show_type", "resolution"):
+            values = {"artist": self.artist_index.names, "show_type": self.show_type_choices,
+                      "resolution": self.resolution_choices}[column]
+            editor = ttk.Combobox(self.tree, textvariable=var, values=values, font=FONT_MAIN, style="DataEntry.TCombobox")
+            editor.bind("<<ComboboxSelected>>", lambda e: self._commit_edit(targets, column, var.get()))
+        else:
+            editor = ttk.Entry(self.tree, textvariable=var, font=FONT_MAIN, style="DataEntry.TEntry")
+        x, y, width, height = bbox
+        editor.place(x=x, y=y, width=max(width, 150), height=height)
+        editor.focus_set()
+        editor.bind("<Return>", lambda e: self._commit_edit(targets, column, var.get()))
+        editor.bind("<Escape>", lambda e: self._cancel_edit())
+        editor.bind("<FocusOut>", lambda e: self._commit_edit(targets, column, var.get()) if self._editor is editor else None)
+        self._editor = editor
+
+    def _cancel_edit(self):
+        if self._editor is not None:
+            editor, self._editor = self._editor, None
+            editor.destroy()
+
+    def _commit_edit(self, iids, column, value):
+        self._cancel_edit()
+        value = value.strip()
+        if column == "artist" and value and value not in self.artist_index.positions:
+            matches = self.artist_index.search(value, limit=1)
+            if not matches:
+                messagebox.showwarning("Unknown Artist", f"No artist named '{value}' in the database.", parent=self)
+                return
+            value = matches[0]['name']
+        if column == "artist" and value:
+            song_cache.get_song_cache().preload_async([self.artist_index.artists[self.artist_index.positions[value]]['id']])
+        for iid in iids:
+            row = self.rows.get(iid)
+            if row is None:
+                continue
+            if column == "artist" and value != row['artist']:
+                row['songs'] = []  # The songs belonged to the previous artist
+                if row['auto_title']:
+                    row['title'] = ""
+            if column == "title":
+                row['auto_title'] = False
+            row[column] = value
+            self._refresh_status(row)
+            self._render_row(iid)
+        self._update_status()
+
+    def _edit_songs(self, iids):
+        """Multi-select list of the (first) row's artist's songs; the choice is applied to every row in iids."""
+        row = self.rows[iids[0]]
+        artist = next((a for a in self.artist_index.artists if a['name'] == row['artist']), None)
+        songs = song_cache.get_song_cache().get_songs([artist['id']]) if artist else []
+        if not songs:
+            messagebox.showinfo("No Songs", "Set an artist with songs in the database first.", parent=self)
+            return
+        popup = tk.Toplevel(self)
+        popup.title(f"Songs - {row['artist']}")
+        popup.configure(bg=DARK_BG)
+        popup.transient(self)
+        popup.grab_set()
+        listbox = tk.Listbox(popup, selectmode=tk.MULTIPLE, width=50, height=20, font=FONT_MAIN,
+                             bg=DARK_BG, fg=BRIGHT_FG, selectbackground=ACCENT, selectforeground="#f1fa8c",
+                             exportselection=False)
+        listbox.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        titles = [title for _, title in songs]
+        listbox.insert(tk.END, *titles)
+        for idx, title in enumerate(titles):
+            if title in row['songs']:
+                listbox.selection_set(idx)
+
+        def on_ok():
+            chosen = [titles[i] for i in listbox.curselection()]
+            popup.grab_release()
+            popup.destroy()
+            self.grab_set()
+            for iid in iids:
+                target = self.rows.get(iid)
+                if target is None or target['artist'] != row['artist']:
+                    continue  # Songs only make sense for rows of the same artist
+                target['songs'] = chosen
+                if target['auto_title']:
+                    target['title'] = ", ".join(chosen)
+                self._refresh_status(target)
+                self._render_row(iid)
+            self._update_status()
+
+        ttk.Button(popup, text="OK", command=on_ok, style="DataEntry.TButton").pack(pady=(0, 10))
+        listbox.bind("<Double-1>", lambda e: on_ok())
+
+    # --- Saving ---
+
+    @staticmethod
+    def _convert_date(yymmdd):
+        """Convert YYMMDD string to YYYY-MM-DD or return None if invalid."""
+        try:
+            return datetime.datetime.strptime(yymmdd, "%y%m%d").strftime("%Y-%m-%d")
+        except ValueError:
+            return None
+
+    def save_all(self):
+        """Validates every row, then inserts all ready rows in one transaction."""
+        self._cancel_edit()
+        if self._pending:
+            messagebox.showinfo("Please Wait", f"Still detecting {self._pending} file(s).", parent=self)
+            return
+        to_save, problems, batch_keys = [], [], set()
+        for iid, row in self.rows.items():
+            if row['status'] in (STATUS_IN_DB, STATUS_SAVED):
+                continue
+            missing = self._missing_fields(row)
+            if missing:
+                problems.append(f"{os.path.basename(row['path'])}: missing {', '.join(missing)}")
+                continue
+            entry = {'entry_type': self.entry_type, 'title': row['title'], 'date': self._convert_date(row['date']),
+                     'show_type': row['show_type'], 'resolution': row['resolution'], 'file_path1': row['path'],
+                     'file_url': None, 'artist_names': [row['artist']], 'song_titles': row['songs']}
+            checks = self.db_ops.check_duplicates({'entry_type': self.entry_type, 'file_path1': row['path'],
+                                                   'title': row['title'], 'artist_name': row['artist'],
+                                                   'date': entry['date']})
+            if checks['file_exists']:
+                row['status'] = STATUS_IN_DB
+                self._render_row(iid)
+                continue
+            key = (row['artist'], row['title'], entry['date'] if self.entry_type == "performance" else None)
+            if checks['title_exists'] or key in batch_keys:
+                problems.append(f"{os.path.basename(row['path'])}: an entry with the same artist and title already exists")
+                continue
+            batch_keys.add(key)
+            to_save.append((iid, entry))
+        if problems:
+            self._update_status()
+            shown = "\n".join(problems[:15]) + (f"\n... and {len(problems) - 15} more" if len(problems) > 15 else "")
+            messagebox.showerror("Cannot Save", f"Please fix these rows first (nothing was saved):\n\n{shown}", parent=self)
+            return
+        if not to_save:
+            messagebox.showinfo("Nothing to Save", "There are no new rows to save.", parent=self)
+            return
+        try:
+            performance_ids, mv_ids = self.db_ops.insert_entries_batch([entry for _, entry in to_save])
+        except sqlite3.Error as e:
+            messagebox.showerror("Database Error", f"Failed to save the batch (nothing was saved): {e}", parent=self)
+            return
+        for iid, _ in to_save:
+            self.rows[iid]['status'] = STATUS_SAVED
+            self._render_row(iid)
+        self._update_status()
+        if self.on_saved:
+            self.on_saved(performance_ids=performance_ids, mv_ids=mv_ids)
+        messagebox.showinfo("Saved", f"{len(to_save)} entries saved.", parent=self)
+
+    def close_window(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.grab_release()
+        master = self.master
+        self.destroy()
+        if master.winfo_exists():
+            master.grab_set()  # Hand the grab back to the entry window
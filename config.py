@@ -1,4 +1,14 @@
 # config.py
+import os
+
 DATABASE_FILE = "kpop_database.db" # CORRECTED
 APP_NAME = "K-Pop Database Browser"
-MPV_PLAYER_PATH = "mpv" # or "C:\\Program Files\\mpv\\mpv.exe" etc.
\ No newline at end of file
+MPV_PLAYER_PATH = "mpv" # or "C:\\Program Files\\mpv\\mpv.exe" etc.
+
+# Mount points of the external drives (see mount_kpop_drives.sh), indexed by library_watcher.py
+LIBRARY_ROOTS = [
+    os.path.expanduser("~/windows_f_drive"),
+    os.path.expanduser("~/windows_g_drive"),
+    os.path.expanduser("~/windows_h_drive"),
+]
+MEDIA_FILE_EXTENSIONS = ('.mp4', '.mkv', '.avi', '.mov', '.webm', '.flv', '.wmv', '.ts', '.tp')
@@ -6,6 +6,7 @@ import sys
 import os # Added os for os.path.basename
 import webbrowser
 import datetime
+import threading
 import config  # For MPV_PLAYER_PATH
 try:
     from tkcalendar import DateEntry
@@ -16,6 +17,10 @@ except ImportError:
 # Modularized imports (will be needed later if not already passed, e.g. config)
 # import config
 import utils  # For extract_date_from_filepath
+import media_probe  # For prefilling the resolution of local files
+import artist_search  # Shared artist type-ahead index
+import batch_entry_ui  # Multi-file batch entry
+import song_cache  # Per-artist song lists, preloaded in the background
 # db_operations will be passed in constructor
 
 # Constants
@@ -26,6 +31,7 @@ FONT_MAIN = ("Courier New", 15)
 FONT_HEADER = ("Courier New", 15, "bold")
 FONT_BUTTON = ("Arial", 15, "bold")
 FONT_ENTRY_DATA_UI = ("Courier New", 15)
+VALIDATION_DEBOUNCE_MS = 300  # Duplicate checks run once typing pauses this long
 
 
 class DataEntryWindow(tk.Toplevel):
@@ -178,7 +184,13 @@ class DataEntryWindow(tk.Toplevel):
         self.load_initial_data() 
         self.focus_set()
 
+        self._duplicate_check_cache = {}  # check_duplicates results for this form; cleared on reset
+        self._validation_after_id = None
         self.url_entry_var.trace_add("write", self.on_url_change)
+        # Load the chosen artists' songs in the background, before the song popup or detection needs them
+        self.song_cache = song_cache.get_song_cache()
+        self.primary_artist_var.trace_add("write", self._preload_artist_songs)
+        self.secondary_artist_var.trace_add("write", self._preload_artist_songs)
 
         # New variables for show type and resolution choices
         self.show_type_choices = []
@@ -243,12 +255,14 @@ class DataEntryWindow(tk.Toplevel):
         return unchecked_img, checked_img
 
     def load_initial_data(self):
-        self.all_artists_list = self.db_ops.get_all_artists()
-        # Sort the list of dicts by 'name', case-insensitive
-        self.all_artists_list = sorted(self.all_artists_list, key=lambda a: a['name'].lower())
+        # Shared search index (rebuilt only when the artists table changed); its list is sorted by name, case-insensitive
+        self.artist_index = artist_search.get_artist_index()
+        self.artist_type_ahead = artist_search.TypeAhead(self.artist_index)
+        self.all_artists_list = self.artist_index.artists
 
     def reset_form_fields(self):
         """Reset all form fields to prepare for a new entry"""
+        self._duplicate_check_cache = {}  # The entry just saved is a duplicate now
         # Clear all primary form variables
         self.url_entry_var.set("")
         self.primary_artist_var.set("")
@@ -288,24 +302,8 @@ class DataEntryWindow(tk.Toplevel):
         self.cancel_button.pack(side=tk.RIGHT, padx=5)
 
     def _load_showtype_and_resolution_choices(self):
-        # Query the DB for all unique show_type and resolution values
-        try:
-            conn = self.db_ops.get_db_connection()
-            cur = conn.cursor()
-            cur.execute("SELECT DISTINCT show_type FROM performances WHERE show_type IS NOT NULL AND TRIM(show_type) != '' ORDER BY show_type;")
-            self.show_type_choices = [row[0] for row in cur.fetchall() if row[0]]
-            
-            # Load resolution choices from both performances and music_videos tables
-            resolution_set = set()
-            cur.execute("SELECT DISTINCT resolution FROM performances WHERE resolution IS NOT NULL AND TRIM(resolution) != '' ORDER BY resolution;")
-            resolution_set.update(row[0] for row in cur.fetchall() if row[0])
-            cur.execute("SELECT DISTINCT resolution FROM music_videos WHERE resolution IS NOT NULL AND TRIM(resolution) != '' ORDER BY resolution;")
-            resolution_set.update(row[0] for row in cur.fetchall() if row[0])
-            
-            self.resolution_choices = sorted(list(resolution_set), key=lambda s: s.lower())
-        except Exception as e:
-            self.show_type_choices = []
-            self.resolution_choices = []
+        # Unique show_type and resolution values (performances and music videos) from the shared reference cache
+        self.show_type_choices, self.resolution_choices = self.db_ops.get_reference_choices()
 
     def reset_content_on_selection_change(self):
         for widget in self.content_area_frame.winfo_children():
@@ -387,29 +385,19 @@ class DataEntryWindow(tk.Toplevel):
                 confirm_btn.config(state="disabled")
                 validation_label.config(text="URL, artist, title, and date are required.")
                 return
-            conn = self.db_ops.get_db_connection()
-            cursor = conn.cursor()
+            checks = self._check_duplicates({'entry_type': 'music_video', 'file_url': url, 'title': title, 'artist_name': artist_name})
             # 1. URL must not already exist in file_url
-            cursor.execute("SELECT 1 FROM music_videos WHERE file_url = ?", (url,)) # Changed file_path1 to file_url
-            if cursor.fetchone():
+            if checks['url_exists']:
                 confirm_btn.config(state="disabled")
                 validation_label.config(text="A music video with this URL already exists.") # Updated message
                 return
             # 2. Primary artist must exist
-            cursor.execute("SELECT artist_id FROM artists WHERE artist_name = ?", (artist_name,))
-            row = cursor.fetchone()
-            if not row:
+            if checks['artist_id'] is None:
                 confirm_btn.config(state="disabled")
                 validation_label.config(text="Primary artist not found in database.")
                 return
             # 3. No previous record with same artist and title
-            cursor.execute("""
-                SELECT 1 FROM music_videos mv
-                JOIN music_video_artist_link mval ON mv.mv_id = mval.mv_id
-                JOIN artists a ON mval.artist_id = a.artist_id
-                WHERE mv.title = ? AND a.artist_name = ?
-            """, (title, artist_name))
-            if cursor.fetchone():
+            if checks['title_exists']:
                 confirm_btn.config(state="disabled")
                 validation_label.config(text="A music video with this artist and title already exists.")
                 return
@@ -469,29 +457,20 @@ class DataEntryWindow(tk.Toplevel):
                 confirm_btn.config(state="disabled")
                 validation_label.config(text="All fields (URL, artist, title, date, show type, resolution) are required.")
                 return
-            conn = self.db_ops.get_db_connection()
-            cursor = conn.cursor()
+            checks = self._check_duplicates({'entry_type': 'performance', 'file_url': url, 'title': title,
+                                             'date': date, 'artist_name': artist_name})
             # 1. URL must not exist in file_url
-            cursor.execute("SELECT 1 FROM performances WHERE file_url = ?", (url,)) # Changed file_path1 to file_url
-            if cursor.fetchone():
+            if checks['url_exists']:
                 confirm_btn.config(state="disabled")
                 validation_label.config(text="A performance with this URL already exists.") # Updated message
                 return
             # 2. Primary artist must exist
-            cursor.execute("SELECT artist_id FROM artists WHERE artist_name = ?", (artist_name,))
-            row = cursor.fetchone()
-            if not row:
+            if checks['artist_id'] is None:
                 confirm_btn.config(state="disabled")
                 validation_label.config(text="Primary artist not found in database.")
                 return
             # 3. No previous record with same artist, title, and date
-            cursor.execute("""
-                SELECT 1 FROM performances p
-                JOIN performance_artist_link pal ON p.performance_id = pal.performance_id
-                JOIN artists a ON pal.artist_id = a.artist_id
-                WHERE p.title = ? AND p.performance_date = ? AND a.artist_name = ?
-            """, (title, date, artist_name))
-            if cursor.fetchone():
+            if checks['title_exists']:
                 confirm_btn.config(state="disabled")
                 validation_label.config(text="A performance with this artist, title, and date already exists.")
                 return
@@ -686,36 +665,14 @@ class DataEntryWindow(tk.Toplevel):
                       style="DataEntry.TLabel", justify=tk.LEFT).pack(padx=10, pady=20, anchor="w")
 
     def handle_artist_combo_keypress(self, event):
-        # print(f"DEBUG: Artist combo KeyPress: {event.keysym}, char: '{event.char}'")
-        
         if event.char and event.char.isalnum(): 
-            typed_char = event.char.lower()
-            
-            current_selection_text = self.primary_artist_var.get()
             # Ensure self.primary_artist_combo exists before trying to access its values
             if not hasattr(self, 'primary_artist_combo') or not self.primary_artist_combo.winfo_exists():
                 return
-            values = self.primary_artist_combo.cget("values")
-            
-            if not values or values[0] == "No artists in DB": # No actual artists to search
-                return
-
-            start_index = 0
-            if current_selection_text in values:
-                try:
-                    current_idx = values.index(current_selection_text)
-                    start_index = (current_idx + 1) % len(values) 
-                except ValueError:
-                    pass 
-            
-            search_order_indices = list(range(start_index, len(values))) + list(range(0, start_index))
-
-            for i in search_order_indices:
-                if values[i].lower().startswith(typed_char):
-                    self.primary_artist_var.set(values[i])
-                    self.primary_artist_combo.icursor(tk.END) 
-                    # print(f"DEBUG: Jumped to {values[i]}")
-                    return 
+            name = self.artist_type_ahead.feed(event.char, self.primary_artist_var.get())
+            if name:
+                self.primary_artist_var.set(name)
+                self.primary_artist_combo.icursor(tk.END) 
 
     def _add_right_click_paste(self, entry_widget):
         """Attach a right-click context menu with Paste to the given Entry widget."""
@@ -752,6 +709,10 @@ class DataEntryWindow(tk.Toplevel):
         self._add_right_click_paste(url_entry)
         self.after(100, lambda: url_entry.focus_set()) # Focus URL entry
 
+        self.url_status_label = ttk.Label(url_frame, text="", foreground="red", style="DataEntry.TLabel")
+        self.url_status_label.pack(anchor="w")
+        self._validate_url_entry()
+
         go_button = ttk.Button(url_frame, text="GO", command=self.open_url_in_browser, style="DataEntry.TButton")
         go_button.pack(anchor="e", pady=2)
 
@@ -784,6 +745,8 @@ class DataEntryWindow(tk.Toplevel):
         button_row.pack(fill="x", pady=(0, 0))
         browse_button = ttk.Button(button_row, text="Browse File", command=self.browse_local_files, style="DataEntry.TButton")
         browse_button.pack(side=tk.LEFT, pady=(0,2), padx=(2, 2))
+        batch_button = ttk.Button(button_row, text="Batch Add...", command=self.open_batch_entry, style="DataEntry.TButton")
+        batch_button.pack(side=tk.LEFT, pady=(0,2), padx=(8, 2))
         self.play_button = ttk.Button(button_row, text="Play File", command=self.play_selected_file, style="DataEntry.TButton", state=tk.DISABLED)
         self.play_button.pack(side=tk.LEFT, padx=(8,2), pady=(0,2))
 
@@ -869,34 +832,86 @@ class DataEntryWindow(tk.Toplevel):
             if entry_type == "performance":
                 show_type = self.show_type_var.get().strip()
                 resolution = self.resolution_var.get().strip()
-                self.db_ops.insert_performance(title=self.title_var.get().strip(), performance_date=perf_date,
+                new_id = self.db_ops.insert_performance(title=self.title_var.get().strip(), performance_date=perf_date,
                                                show_type=show_type, resolution=resolution,
                                                file_path1=self.selected_local_files[0], file_url=None,
                                                score=0, artist_names=artist_names,
                                                song_titles=song_titles)
                 messagebox.showinfo("Saved", f"Performance '{self.title_var.get().strip()}' saved successfully.", parent=self)
                 # Refresh main window list
-                self.master_app.load_performances()
-                self.master_app.update_list()
+                self._refresh_main_list(new_id, entry_type)
                 # Reset form for next entry instead of closing window
                 self.reset_form_fields()
                 return
             else:
                 resolution = self.resolution_var.get().strip() if hasattr(self, 'resolution_var') else ''
-                self.db_ops.insert_music_video(title=self.title_var.get().strip(), release_date=perf_date,
+                new_id = self.db_ops.insert_music_video(title=self.title_var.get().strip(), release_date=perf_date,
                                                resolution=resolution if resolution else None, file_path1=self.selected_local_files[0], file_url=None,
                                                score=0, artist_names=artist_names,
                                                song_titles=song_titles)
                 messagebox.showinfo("Saved", f"Music Video '{self.title_var.get().strip()}' saved successfully.", parent=self)
                 # Refresh main window list
-                self.master_app.load_performances()
-                self.master_app.update_list()
+                self._refresh_main_list(new_id, entry_type)
                 # Reset form for next entry instead of closing window
                 self.reset_form_fields()
                 return
 
         # If validation fails, the message is already set by _validate_local_file_data
 
+    def _refresh_main_list(self, new_id, entry_type):
+        """Adds the record just saved to the main window's list (no full catalog reload)."""
+        if entry_type == "performance":
+            self.master_app.add_new_records(performance_ids=[new_id])
+        else:
+            self.master_app.add_new_records(mv_ids=[new_id])
+
+    def open_batch_entry(self):
+        """Opens the batch window for adding many local files (of the selected entry type) at once."""
+        if getattr(self, 'batch_window', None) and self.batch_window.winfo_exists():
+            self.batch_window.lift()
+            return
+        self.batch_window = batch_entry_ui.BatchEntryWindow(
+            self, self.db_ops, self.entry_type_var.get(), self.artist_index,
+            self.show_type_choices, self.resolution_choices, on_saved=self.master_app.add_new_records)
+
+    def _prefill_resolution_from_probe(self, filename):
+        """Fills an empty resolution field from the media_probe cache, probing the file in the background on a miss."""
+        if not hasattr(self, 'resolution_var') or self.resolution_var.get().strip():
+            return
+        conn = self.db_ops.get_db_connection()
+
+        def apply(info):
+            if not info or not info.get("height") or not self.winfo_exists():
+                return
+            if self.resolution_var.get().strip() or self.selected_local_files != [filename]:
+                return  # The user already chose something, or picked another file meanwhile
+            label = media_probe.resolution_label(info["height"])
+            # Prefer the spelling already used in the database (e.g. "4k" vs "4K")
+            existing = next((c for c in self.resolution_choices if c.lower() == label.lower()), label)
+            self.resolution_var.set(existing)
+
+        try:
+            media_probe.ensure_media_probe_table(conn)
+            cached = media_probe.get_cached_probe(conn, filename)
+        except Exception as e:
+            print(f"Error reading media probe cache: {e}")
+            return
+        if cached:
+            apply(cached)
+            return
+
+        def worker():
+            _, info = media_probe.probe_file(filename)
+            def store_and_apply():
+                try:
+                    media_probe.store_probe(conn, filename, info)
+                    conn.commit()
+                except Exception as e:
+                    print(f"Error storing media probe result: {e}")
+                apply(info)
+            if self.winfo_exists(): self.after(0, store_and_apply)
+        threading.Thread(target=worker, daemon=True).start()
+
     def browse_local_files(self):
         """Opens a file dialog to select local media files and updates the display."""
         filetypes = (
@@ -937,6 +952,7 @@ class DataEntryWindow(tk.Toplevel):
                 
             self.selected_local_files = [filename]
             self.local_files_display_var.set(f"Selected: {filename}")
+            self._prefill_resolution_from_probe(filename)
             
             # Try to extract date from filename and prefill the date box
             date_from_filename = utils.extract_date_from_filepath(filename)
@@ -945,40 +961,11 @@ class DataEntryWindow(tk.Toplevel):
             
             # Try to find artist name in the filename and prefill the primary artist field
             if self.all_artists_list:
-                # Use the enhanced artist detection function with detailed results
-                result = utils.find_artist_in_filename(filename, self.all_artists_list, detailed=True)
-                
-                if result:
-                    best_artist_match, score, match_type = result
-                    
-                    # Use the best match if it meets our confidence threshold
-                    if score >= 60:  # High confidence match
-                        self.primary_artist_var.set(best_artist_match['name'])
-                        
-                        # After setting the artist, try to detect and select songs
-                        self.detect_and_prefill_songs_from_filename(filename)
-                    else:
-                        # Fall back to the simple string matching function for low confidence matches
-                        artist_names = [artist['name'] for artist in self.all_artists_list]
-                        found_artists = utils.find_string_in_filename(filename, artist_names)
-                        
-                        # If we found any artists, use the first one (highest confidence match)
-                        if found_artists:
-                            self.primary_artist_var.set(found_artists[0])
-                            
-                            # After setting the artist, try to detect and select songs
-                            self.detect_and_prefill_songs_from_filename(filename)
-                            
-                            # If we found multiple artists, show a message about other potential matches
-                            if len(found_artists) > 1:
-                                other_artists = ", ".join(found_artists[1:3])  # Show up to 2 additional matches
-                                additional = len(found_artists) - 3
-                                if additional > 0:
-                                    other_artists += f" and {additional} more"
-                                print(f"Multiple artists matched: Selected {found_artists[0]}. Other potential matches: {other_artists}")
-                else:
-                    # No artists detected in filename
-                    pass
+                artist_name = utils.detect_artist_in_filename(filename, self.all_artists_list)
+                if artist_name:
+                    self.primary_artist_var.set(artist_name)
+                    # After setting the artist, try to detect and select songs
+                    self.detect_and_prefill_songs_from_filename(filename)
                 
             # Enable play button when a file is selected
             if hasattr(self, 'play_button'):
@@ -1010,7 +997,7 @@ class DataEntryWindow(tk.Toplevel):
             try:
                 if entry_type == "music_video":
                     # Insert Music Video record
-                    self.db_ops.insert_music_video(
+                    new_id = self.db_ops.insert_music_video(
                         resolution=None,
                         title=title,
                         release_date=perf_date,
@@ -1025,7 +1012,7 @@ class DataEntryWindow(tk.Toplevel):
                     # Insert Performance record
                     show_type = self.show_type_var.get().strip() if hasattr(self, 'show_type_var') else ''
                     resolution = self.resolution_var.get().strip() if hasattr(self, 'resolution_var') else ''
-                    self.db_ops.insert_performance(
+                    new_id = self.db_ops.insert_performance(
                         title=title,
                         performance_date=perf_date,
                         show_type=show_type,
@@ -1038,8 +1025,7 @@ class DataEntryWindow(tk.Toplevel):
                     )
                     messagebox.showinfo("Saved", f"Performance '{title}' saved successfully.", parent=self)
                 # Refresh main window data and reset form
-                self.master_app.load_performances()
-                self.master_app.update_list()
+                self._refresh_main_list(new_id, entry_type)
                 self.reset_form_fields()
             except Exception as e:
                 messagebox.showerror("Database Error", f"Failed to save entry: {e}", parent=self)
@@ -1054,39 +1040,19 @@ class DataEntryWindow(tk.Toplevel):
             # Only support one selected file
             file_path1 = self.selected_local_files[0] if self.selected_local_files else None
 
-            # --- DB-duplication checks ---
-            conn = self.db_ops.get_db_connection()
-            cursor = conn.cursor()
+            # --- DB-duplication checks (one query) ---
+            checks = self._check_duplicates({
+                'entry_type': 'performance' if entry_type == 'performance' else 'music_video',
+                'file_path1': file_path1, 'title': title, 'artist_name': primary_artist,
+                'date': self._convert_yymmdd_to_yyyy_mm_dd(date_yyyymmdd) or date_yyyymmdd})
             #  1. Ensure selected file is not already in DB
-            if file_path1:
-                table = 'performances' if entry_type == 'performance' else 'music_videos'
-                query = f"SELECT 1 FROM {table} WHERE file_path1 = ?"
-                cursor.execute(query, (file_path1,))
-                if cursor.fetchone():
-                    messagebox.showerror("Duplicate File", f"The file '{file_path1}' is already in the database.", parent=self)
-                    return
+            if file_path1 and checks['file_exists']:
+                messagebox.showerror("Duplicate File", f"The file '{file_path1}' is already in the database.", parent=self)
+                return
             # 2. Ensure no existing entry with same artist+title(+date)
-            if entry_type == 'performance':
-                cursor.execute(
-                    """
-                    SELECT 1 FROM performances p
-                    JOIN performance_artist_link pal ON p.performance_id = pal.performance_id
-                    JOIN artists a ON pal.artist_id = a.artist_id
-                    WHERE p.title = ? AND p.performance_date = ? AND a.artist_name = ?
-                    """, (title, date_yyyymmdd, primary_artist)
-                )
-            else:
-                cursor.execute(
-                    """
-                    SELECT 1 FROM music_videos mv
-                    JOIN music_video_artist_link mval ON mv.mv_id = mval.mv_id
-                    JOIN artists a ON mval.artist_id = a.artist_id
-                    WHERE mv.title = ? AND a.artist_name = ?
-                    """, (title, primary_artist)
-                )
-            if cursor.fetchone():
+            if checks['title_exists']:
                 label = 'Performance' if entry_type == 'performance' else 'Music Video'
-                msg = f"A {label.lower} with the same artist, title{', and date' if entry_type == 'performance' else ''} already exists."
+                msg = f"A {label.lower()} with the same artist, title{', and date' if entry_type == 'performance' else ''} already exists."
                 messagebox.showerror("Duplicate Entry", msg, parent=self)
                 return
 
@@ -1100,28 +1066,26 @@ class DataEntryWindow(tk.Toplevel):
             if entry_type == "performance":
                 show_type = self.show_type_var.get().strip()
                 resolution = self.resolution_var.get().strip()
-                self.db_ops.insert_performance(title=title, performance_date=perf_date,
+                new_id = self.db_ops.insert_performance(title=title, performance_date=perf_date,
                                                show_type=show_type, resolution=resolution,
                                                file_path1=file_path1, file_url=None,
                                                score=0, artist_names=artist_names,
                                                song_titles=song_titles)
                 messagebox.showinfo("Saved", f"Performance '{title}' saved successfully.", parent=self)
                 # Refresh main window list
-                self.master_app.load_performances()
-                self.master_app.update_list()
+                self._refresh_main_list(new_id, entry_type)
                 # Reset form for next entry instead of closing window
                 self.reset_form_fields()
                 return
             else:
-                self.db_ops.insert_music_video(title=title, release_date=perf_date,
+                new_id = self.db_ops.insert_music_video(title=title, release_date=perf_date,
                                                resolution=None,
                                                file_path1=file_path1, file_url=None,
                                                score=0, artist_names=artist_names,
                                                song_titles=song_titles)
                 messagebox.showinfo("Saved", f"Music Video '{title}' saved successfully.", parent=self)
                 # Refresh main window list
-                self.master_app.load_performances()
-                self.master_app.update_list()
+                self._refresh_main_list(new_id, entry_type)
                 # Reset form for next entry instead of closing window
                 self.reset_form_fields()
                 return
@@ -1140,6 +1104,8 @@ class DataEntryWindow(tk.Toplevel):
             base_dir = os.path.dirname(os.path.abspath(__file__))
             update_script = os.path.join(base_dir, "spotify_update_from.py")
             subprocess.run([sys.executable, update_script], check=True)
+            self.song_cache.invalidate()  # The sync may have added songs
+            artist_search.invalidate_artist_index()  # ...and added or updated artists
             self.load_initial_data()
             messagebox.showinfo("Artists Updated", "Artists have been updated and enriched from Spotify.", parent=self)
         except Exception as e:
@@ -1193,9 +1159,9 @@ class DataEntryWindow(tk.Toplevel):
         scrollbar.pack(side="right", fill="y")
         listbox.pack(side="left", fill="both", expand=True)
 
-        artist_names = [artist['name'] for artist in self.all_artists_list]
-        for name in artist_names:
-            listbox.insert(tk.END, name)
+        artist_names = self.artist_index.names
+        listbox.insert(tk.END, *artist_names)
+        type_ahead = artist_search.TypeAhead(self.artist_index)
 
         def on_select(event=None):
             selection = listbox.curselection()
@@ -1205,15 +1171,15 @@ class DataEntryWindow(tk.Toplevel):
                 popup.destroy()
 
         def on_key(event):
-            # Jump to letter
+            # Type-ahead: jump to the best match for the letters typed so far
             if event.char and event.char.isprintable():
-                typed = event.char.lower()
-                for idx, name in enumerate(artist_names):
-                    if name.lower().startswith(typed):
-                        listbox.selection_clear(0, tk.END)
-                        listbox.selection_set(idx)
-                        listbox.see(idx)
-                        break
+                selection = listbox.curselection()
+                name = type_ahead.feed(event.char, listbox.get(selection[0]) if selection else None)
+                if name is not None:
+                    idx = self.artist_index.positions[name]
+                    listbox.selection_clear(0, tk.END)
+                    listbox.selection_set(idx)
+                    listbox.see(idx)
             elif event.keysym in ("Return", "KP_Enter"):
                 on_select()
             elif event.keysym == "Escape":
@@ -1232,6 +1198,7 @@ class DataEntryWindow(tk.Toplevel):
             listbox.see(idx)
 
     def refresh_artist_list(self):
+        artist_search.invalidate_artist_index()
         self.load_initial_data()
         messagebox.showinfo("Artists Refreshed", "Artist list has been refreshed from the database.", parent=self)
 
@@ -1260,9 +1227,9 @@ class DataEntryWindow(tk.Toplevel):
         scrollbar.pack(side="right", fill="y")
         listbox.pack(side="left", fill="both", expand=True)
 
-        artist_names = [artist['name'] for artist in self.all_artists_list]
-        for name in artist_names:
-            listbox.insert(tk.END, name)
+        artist_names = self.artist_index.names
+        listbox.insert(tk.END, *artist_names)
+        type_ahead = artist_search.TypeAhead(self.artist_index)
 
         def on_select(event=None):
             selection = listbox.curselection()
@@ -1273,14 +1240,15 @@ class DataEntryWindow(tk.Toplevel):
                 self.handle_proceed() # Rebuild current UI
 
         def on_key(event):
+            # Type-ahead: jump to the best match for the letters typed so far
             if event.char and event.char.isprintable():
-                typed = event.char.lower()
-                for idx, name in enumerate(artist_names):
-                    if name.lower().startswith(typed):
-                        listbox.selection_clear(0, tk.END)
-                        listbox.selection_set(idx)
-                        listbox.see(idx)
-                        break
+                selection = listbox.curselection()
+                name = type_ahead.feed(event.char, listbox.get(selection[0]) if selection else None)
+                if name is not None:
+                    idx = self.artist_index.positions[name]
+                    listbox.selection_clear(0, tk.END)
+                    listbox.selection_set(idx)
+                    listbox.see(idx)
             elif event.keysym in ("Return", "KP_Enter"):
                 on_select()
             elif event.keysym == "Escape":
@@ -1302,38 +1270,19 @@ class DataEntryWindow(tk.Toplevel):
         self.secondary_artist_var.set("")
         self.handle_proceed() # Rebuild current UI
 
-    def get_songs_for_selected_artists(self):
-        # Get artist IDs
+    def _get_selected_artist_ids(self):
         artist_names = [self.primary_artist_var.get()]
         if self.secondary_artist_var.get().strip():
             artist_names.append(self.secondary_artist_var.get())
-        artist_ids = []
-        for name in artist_names:
-            for artist in self.all_artists_list:
-                if artist['name'] == name:
-                    artist_ids.append(artist['id'])
-        if not artist_ids:
-            return []
-
-        # Query songs for these artist_ids
-        placeholders = ",".join("?" for _ in artist_ids)
-        query = f"""
-            SELECT DISTINCT s.song_id, s.song_title
-            FROM songs s
-            JOIN song_artist_link sal ON s.song_id = sal.song_id
-            WHERE sal.artist_id IN ({placeholders})
-            ORDER BY s.song_title COLLATE NOCASE
-        """
-        conn = self.db_ops.get_db_connection()
-        if not conn:
-            return []
-        try:
-            cursor = conn.cursor()
-            cursor.execute(query, artist_ids)
-            return cursor.fetchall()  # List of (song_id, song_title)
-        except Exception as e:
-            print(f"Error fetching songs for artists: {e}")
-            return []
+        positions = self.artist_index.positions
+        return [self.artist_index.artists[positions[name]]['id'] for name in artist_names if name in positions]
+
+    def _preload_artist_songs(self, *args):
+        self.song_cache.preload_async(self._get_selected_artist_ids())
+
+    def get_songs_for_selected_artists(self):
+        # Served from the song cache; normally preloaded when the artist was chosen
+        return self.song_cache.get_songs(self._get_selected_artist_ids())  # List of (song_id, song_title)
 
     def show_song_selection_popup(self):
         songs = self.get_songs_for_selected_artists()
@@ -1418,40 +1367,21 @@ class DataEntryWindow(tk.Toplevel):
             
         # Use our utility function to find song matches in the filename
         song_matches = utils.find_song_in_filename(filename, songs, detailed=True)
+        # Decisions already made in the song linker take precedence over fuzzy matching
+        song_matches = self._get_linker_decision_matches(filename, songs) + song_matches
         
         if not song_matches:
             print("No song matches found in filename")
             return
             
-        # Process the matches to select songs
-        high_confidence_matches = [match for match in song_matches if match[2] >= 70]  # Score >= 70
-        
-        # Clear existing song selections
-        self.selected_song_ids = []
-        self.selected_song_titles = []
-        
-        # Add high confidence matches first
-        selected_titles = set()  # Use a set to avoid duplicates
-        for song_id, song_title, score, match_type in high_confidence_matches[:3]:  # Limit to top 3
-            if song_title not in selected_titles:  # Avoid duplicates
-                self.selected_song_ids.append(song_id)
-                self.selected_song_titles.append(song_title)
-                selected_titles.add(song_title)
-                print(f"Auto-selected song: {song_title} (Score: {score:.1f}, Type: {match_type})")
-        
-        # If no high confidence matches, try low confidence matches
-        if not selected_titles:
-            low_confidence_matches = [match for match in song_matches if match[2] < 70 and match[2] >= 50]  # Score 50-69
-            for song_id, song_title, score, match_type in low_confidence_matches[:2]:  # Limit to top 2
-                if song_title not in selected_titles:  # Avoid duplicates
-                    self.selected_song_ids.append(song_id)
-                    self.selected_song_titles.append(song_title)
-                    selected_titles.add(song_title)
-                    print(f"Auto-selected song (low confidence): {song_title} (Score: {score:.1f}, Type: {match_type})")
+        # Keep the best matches (see utils.select_detected_songs for the confidence thresholds)
+        selected = utils.select_detected_songs(song_matches)
+        self.selected_song_ids = [song_id for song_id, _ in selected]
+        self.selected_song_titles = [song_title for _, song_title in selected]
         
         # If we found songs, update the title and refresh the UI
-        if selected_titles:
-            print(f"Auto-detected {len(selected_titles)} song(s) from filename")
+        if selected:
+            print(f"Auto-detected {len(selected)} song(s) from filename: {', '.join(self.selected_song_titles)}")
             # Update the title field with the detected songs
             self.update_title_from_songs()
             # Refresh the UI to show the selected songs
@@ -1459,6 +1389,12 @@ class DataEntryWindow(tk.Toplevel):
         else:
             print("No song matches found in filename")
 
+    def _get_linker_decision_matches(self, filename, songs):
+        """Returns [(song_id, song_title, 100, "linker"), ...] for stored linker mentions found in the filename."""
+        artist_names = {self.primary_artist_var.get(), self.secondary_artist_var.get()}
+        artist_ids = [artist['id'] for artist in self.all_artists_list if artist['name'] in artist_names]
+        return utils.match_linker_decisions(filename, self.db_ops.get_linker_decisions_for_artists(artist_ids), songs)
+
     def remove_selected_song(self, idx):
         title_to_remove = self.selected_song_titles[idx]
         
@@ -1493,6 +1429,38 @@ class DataEntryWindow(tk.Toplevel):
             self.proceed_button.config(state=tk.NORMAL)
         else:
             self.proceed_button.config(state=tk.DISABLED)
+        self._schedule_validation(self._validate_url_entry)
+
+    def _check_duplicates(self, entry):
+        """db_operations.check_duplicates, cached per entry for this form (cleared when the form is reset)."""
+        key = tuple(sorted(entry.items()))
+        if key not in self._duplicate_check_cache:
+            self._duplicate_check_cache[key] = self.db_ops.check_duplicates(entry)
+        return self._duplicate_check_cache[key]
+
+    def _schedule_validation(self, callback):
+        """Runs callback once typing has paused for VALIDATION_DEBOUNCE_MS; a pending run is replaced."""
+        if self._validation_after_id is not None:
+            self.after_cancel(self._validation_after_id)
+        def run():
+            self._validation_after_id = None
+            callback()
+        self._validation_after_id = self.after(VALIDATION_DEBOUNCE_MS, run)
+
+    def _validate_url_entry(self):
+        """Flags a URL that is already in the database while it is being typed."""
+        label = getattr(self, 'url_status_label', None)
+        if label is None or not label.winfo_exists():
+            return
+        url = self.url_entry_var.get().strip()
+        if not (url.startswith("http://") or url.startswith("https://")):
+            label.config(text="")
+            return
+        entry_type = self.entry_type_var.get()
+        if self._check_duplicates({'entry_type': entry_type, 'file_url': url})['url_exists']:
+            label.config(text=f"A {entry_type.replace('_', ' ')} with this URL already exists.")
+        else:
+            label.config(text="")
 
     def open_url_in_browser(self):
         url = self.url_entry_var.get()
@@ -1525,7 +1493,7 @@ class DataEntryWindow(tk.Toplevel):
                 if entry_type == "music_video":
                     # Insert Music Video record
                     resolution = self.resolution_var.get().strip() if hasattr(self, 'resolution_var') else ''
-                    self.db_ops.insert_music_video(
+                    new_id = self.db_ops.insert_music_video(
                         title=title,
                         release_date=perf_date,
                         resolution=resolution if resolution else None,
@@ -1540,7 +1508,7 @@ class DataEntryWindow(tk.Toplevel):
                     # Insert Performance record
                     show_type = self.show_type_var.get().strip() if hasattr(self, 'show_type_var') else ''
                     resolution = self.resolution_var.get().strip() if hasattr(self, 'resolution_var') else ''
-                    self.db_ops.insert_performance(
+                    new_id = self.db_ops.insert_performance(
                         title=title,
                         performance_date=perf_date,
                         show_type=show_type,
@@ -1553,8 +1521,7 @@ class DataEntryWindow(tk.Toplevel):
                     )
                     messagebox.showinfo("Saved", f"Performance '{title}' saved successfully.", parent=self)
                 # Refresh main window data and reset form
-                self.master_app.load_performances()
-                self.master_app.update_list()
+                self._refresh_main_list(new_id, entry_type)
                 self.reset_form_fields()
             except Exception as e:
                 messagebox.showerror("Database Error", f"Failed to save entry: {e}", parent=self)
@@ -1569,39 +1536,19 @@ class DataEntryWindow(tk.Toplevel):
             # Only support one selected file
             file_path1 = self.selected_local_files[0] if self.selected_local_files else None
 
-            # --- DB-duplication checks ---
-            conn = self.db_ops.get_db_connection()
-            cursor = conn.cursor()
+            # --- DB-duplication checks (one query) ---
+            checks = self._check_duplicates({
+                'entry_type': 'performance' if entry_type == 'performance' else 'music_video',
+                'file_path1': file_path1, 'title': title, 'artist_name': primary_artist,
+                'date': self._convert_yymmdd_to_yyyy_mm_dd(date_yyyymmdd) or date_yyyymmdd})
             #  1. Ensure selected file is not already in DB
-            if file_path1:
-                table = 'performances' if entry_type == 'performance' else 'music_videos'
-                query = f"SELECT 1 FROM {table} WHERE file_path1 = ?"
-                cursor.execute(query, (file_path1,))
-                if cursor.fetchone():
-                    messagebox.showerror("Duplicate File", f"The file '{file_path1}' is already in the database.", parent=self)
-                    return
+            if file_path1 and checks['file_exists']:
+                messagebox.showerror("Duplicate File", f"The file '{file_path1}' is already in the database.", parent=self)
+                return
             # 2. Ensure no existing entry with same artist+title(+date)
-            if entry_type == 'performance':
-                cursor.execute(
-                    """
-                    SELECT 1 FROM performances p
-                    JOIN performance_artist_link pal ON p.performance_id = pal.performance_id
-                    JOIN artists a ON pal.artist_id = a.artist_id
-                    WHERE p.title = ? AND p.performance_date = ? AND a.artist_name = ?
-                    """, (title, date_yyyymmdd, primary_artist)
-                )
-            else:
-                cursor.execute(
-                    """
-                    SELECT 1 FROM music_videos mv
-                    JOIN music_video_artist_link mval ON mv.mv_id = mval.mv_id
-                    JOIN artists a ON mval.artist_id = a.artist_id
-                    WHERE mv.title = ? AND a.artist_name = ?
-                    """, (title, primary_artist)
-                )
-            if cursor.fetchone():
+            if checks['title_exists']:
                 label = 'Performance' if entry_type == 'performance' else 'Music Video'
-                msg = f"A {label.lower} with the same artist, title{', and date' if entry_type == 'performance' else ''} already exists."
+                msg = f"A {label.lower()} with the same artist, title{', and date' if entry_type == 'performance' else ''} already exists."
                 messagebox.showerror("Duplicate Entry", msg, parent=self)
                 return
 
@@ -1615,28 +1562,26 @@ class DataEntryWindow(tk.Toplevel):
             if entry_type == "performance":
                 show_type = self.show_type_var.get().strip()
                 resolution = self.resolution_var.get().strip()
-                self.db_ops.insert_performance(title=title, performance_date=perf_date,
+                new_id = self.db_ops.insert_performance(title=title, performance_date=perf_date,
                                                show_type=show_type, resolution=resolution,
                                                file_path1=file_path1, file_url=None,
                                                score=0, artist_names=artist_names,
                                                song_titles=song_titles)
                 messagebox.showinfo("Saved", f"Performance '{title}' saved successfully.", parent=self)
                 # Refresh main window list
-                self.master_app.load_performances()
-                self.master_app.update_list()
+                self._refresh_main_list(new_id, entry_type)
                 # Reset form for next entry instead of closing window
                 self.reset_form_fields()
                 return
             else:
-                self.db_ops.insert_music_video(title=title, release_date=perf_date,
+                new_id = self.db_ops.insert_music_video(title=title, release_date=perf_date,
                                                resolution=None,
                                                file_path1=file_path1, file_url=None,
                                                score=0, artist_names=artist_names,
                                                song_titles=song_titles)
                 messagebox.showinfo("Saved", f"Music Video '{title}' saved successfully.", parent=self)
                 # Refresh main window list
-                self.master_app.load_performances()
-                self.master_app.update_list()
+                self._refresh_main_list(new_id, entry_type)
                 # Reset form for next entry instead of closing window
                 self.reset_form_fields()
                 return
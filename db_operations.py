@@ -3,6 +3,7 @@ import sqlite3
 import config # To get DATABASE_FILE
 import os
 import re
+from collections import Counter
 
 def _get_windows_path(linux_path):
     """Convert a Linux path under windows_<letter>_drive to the corresponding Windows drive path."""
@@ -38,6 +39,15 @@ def get_db_connection():
                 _connection.execute("CREATE INDEX IF NOT EXISTS idx_mv_artist_link_mv_id ON music_video_artist_link(mv_id)")
                 _connection.execute("CREATE INDEX IF NOT EXISTS idx_song_mv_link_mv_id ON song_music_video_link(music_video_id)")
                 _connection.execute("CREATE INDEX IF NOT EXISTS idx_artists_name ON artists(artist_name)")
+                # Lookups behind check_duplicates()
+                _connection.execute("CREATE INDEX IF NOT EXISTS idx_performance_file_url ON performances(file_url)")
+                _connection.execute("CREATE INDEX IF NOT EXISTS idx_music_video_file_url ON music_videos(file_url)")
+                _connection.execute("CREATE INDEX IF NOT EXISTS idx_performance_file_path1 ON performances(file_path1)")
+                _connection.execute("CREATE INDEX IF NOT EXISTS idx_music_video_file_path1 ON music_videos(file_path1)")
+                _connection.execute("CREATE INDEX IF NOT EXISTS idx_performance_title_date ON performances(title, performance_date)")
+                _connection.execute("CREATE INDEX IF NOT EXISTS idx_music_video_title ON music_videos(title)")
+                _connection.execute("CREATE INDEX IF NOT EXISTS idx_perf_artist_link_artist_id ON performance_artist_link(artist_id, performance_id)")
+                _connection.execute("CREATE INDEX IF NOT EXISTS idx_mv_artist_link_artist_id ON music_video_artist_link(artist_id, mv_id)")
                 _connection.commit()
             except sqlite3.Error as e:
                 print(f"Error creating indexes: {e}")
@@ -51,15 +61,131 @@ def get_db_connection():
 
 def close_db_connection():
     """Closes the database connection if it's open."""
-    global _connection
+    global _connection, _used_file_paths, _reference_data, _has_linker_decisions
     # print("DEBUG: db_operations.close_db_connection() called.")
     if _connection:
         _connection.close()
         _connection = None
+        _used_file_paths = None
+        _reference_data = None
+        _has_linker_decisions = None
         print("Database connection closed.") # Keep this one
     # else:
         # print("DEBUG: db_operations - No connection to close.")
 
+_used_file_paths = None # Counter of file_path1 values across performances and music_videos, loaded on first use
+
+def get_used_file_paths():
+    """
+    Returns the in-memory set of file_path1 values already in the database (as a Counter,
+    so membership tests work like a set). Loaded once; kept current by the insert/update/delete
+    functions below instead of being re-queried by every caller.
+    """
+    global _used_file_paths
+    if _used_file_paths is None:
+        conn = get_db_connection()
+        if not conn:
+            return Counter()
+        used = Counter()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT file_path1 FROM performances WHERE file_path1 IS NOT NULL")
+            used.update(row[0] for row in cursor.fetchall() if row[0])
+            cursor.execute("SELECT file_path1 FROM music_videos WHERE file_path1 IS NOT NULL")
+            used.update(row[0] for row in cursor.fetchall() if row[0])
+        except sqlite3.Error as e:
+            print(f"Database error in get_used_file_paths: {e}")
+            return used
+        _used_file_paths = used
+    return _used_file_paths
+
+def track_file_path_change(old_path, new_path):
+    """Applies a file_path1 change to the used-path cache (no-op until it has been loaded)."""
+    if _used_file_paths is None or old_path == new_path:
+        return
+    if old_path and _used_file_paths[old_path] > 0:
+        _used_file_paths[old_path] -= 1
+        if _used_file_paths[old_path] == 0:
+            del _used_file_paths[old_path]
+    if new_path:
+        _used_file_paths[new_path] += 1
+
+def _get_file_path1(table, id_column, row_id):
+    """Returns the current file_path1 of a row, used to keep the used-path cache in sync."""
+    if _used_file_paths is None:
+        return None
+    cursor = get_db_connection().cursor()
+    cursor.execute(f"SELECT file_path1 FROM {table} WHERE {id_column} = ?", (row_id,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+_reference_data = None # Show type / resolution Counters plus the version they were loaded at, loaded on first use
+
+def _get_reference_version(conn):
+    """Highest performance and music video ids: two index lookups that change when another process adds records."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT MAX(performance_id) FROM performances")
+    max_perf = cursor.fetchone()[0]
+    cursor.execute("SELECT MAX(mv_id) FROM music_videos")
+    return (max_perf, cursor.fetchone()[0])
+
+def get_reference_choices():
+    """
+    Returns (show_types, resolutions): the distinct non-blank values in use, for the entry and
+    modify windows. The values are counted once per process and kept current by the
+    insert/update/delete functions below; they are only re-counted if another process
+    (e.g. an importer) added records since.
+    """
+    global _reference_data
+    conn = get_db_connection()
+    if not conn:
+        return [], []
+    try:
+        version = _get_reference_version(conn)
+        if _reference_data is None or _reference_data['version'] != version:
+            show_types, resolutions = Counter(), Counter()
+            cursor = conn.cursor()
+            cursor.execute("SELECT show_type, resolution FROM performances")
+            for show_type, resolution in cursor.fetchall():
+                if show_type and show_type.strip(): show_types[show_type] += 1
+                if resolution and resolution.strip(): resolutions[resolution] += 1
+            cursor.execute("SELECT resolution FROM music_videos")
+            resolutions.update(row[0] for row in cursor.fetchall() if row[0] and row[0].strip())
+            _reference_data = {'version': version, 'show_types': show_types, 'resolutions': resolutions}
+    except sqlite3.Error as e:
+        print(f"Database error in get_reference_choices: {e}")
+        return [], []
+    return (sorted(_reference_data['show_types']),
+            sorted(_reference_data['resolutions'], key=lambda r: r.lower()))
+
+def _get_reference_values(table, id_column, row_id):
+    """Returns the current (show_type, resolution) of a row, used to keep the reference cache in sync."""
+    if _reference_data is None:
+        return None, None
+    show_type_column = "show_type" if table == "performances" else "NULL"
+    cursor = get_db_connection().cursor()
+    cursor.execute(f"SELECT {show_type_column}, resolution FROM {table} WHERE {id_column} = ?", (row_id,))
+    row = cursor.fetchone()
+    return row if row else (None, None)
+
+def _track_reference_change(old_values, new_values):
+    """Applies a (show_type, resolution) change to the reference cache (no-op until it has been loaded)."""
+    if _reference_data is None:
+        return
+    for key, old, new in zip(('show_types', 'resolutions'), old_values, new_values):
+        counter = _reference_data[key]
+        if old and old.strip() and counter[old] > 0:
+            counter[old] -= 1
+            if counter[old] == 0:
+                del counter[old]
+        if new and new.strip():
+            counter[new] += 1
+    try:
+        # Our own inserts move the version too; they are already counted
+        _reference_data['version'] = _get_reference_version(get_db_connection())
+    except sqlite3.Error:
+        _reference_data['version'] = None
+
 def get_all_artists():
     """Fetches all artists from the database, ordered by name."""
     # print("DEBUG: db_operations.get_all_artists() called.")
@@ -80,10 +206,11 @@ def get_all_artists():
         print(f"AttributeError in get_all_artists (likely conn is None): {e}")
     return artists
 
-def get_all_performances_raw():
+def get_all_performances_raw(performance_ids=None):
     """
     Fetches raw performance data along with concatenated artists and songs.
     Returns a list of tuples directly from the database query.
+    Pass performance_ids to fetch only those records (e.g. ones just inserted).
     """
     # print("DEBUG: db_operations.get_all_performances_raw() called.")
     conn = get_db_connection()
@@ -102,12 +229,15 @@ def get_all_performances_raw():
              FROM songs s JOIN song_performance_link spl ON s.song_id = spl.song_id
              WHERE spl.performance_id = p.performance_id) AS songs_concatenated
         FROM performances p
+        {where}
         ORDER BY p.performance_date DESC, p.performance_id DESC;
     """
+    params = tuple(performance_ids or ())
+    query = query.format(where=f"WHERE p.performance_id IN ({','.join('?' * len(params))})" if performance_ids is not None else "")
     performances_raw = []
     try:
         cursor = conn.cursor()
-        cursor.execute(query)
+        cursor.execute(query, params)
         performances_raw = cursor.fetchall()
         # print(f"DEBUG: db_operations.get_all_performances_raw - Found {len(performances_raw)} raw performance rows.")
     except sqlite3.Error as e:
@@ -117,14 +247,22 @@ def get_all_performances_raw():
     return performances_raw
 
 def insert_music_video(title, release_date, resolution=None, file_path1=None, file_url=None, score=0, artist_names=None, song_titles=None):
+    """Inserts a music video with its artist and song links and commits. Returns the new mv_id."""
+    conn = get_db_connection()
+    mv_id = _insert_music_video_rows(conn.cursor(), title, release_date, resolution, file_path1, file_url, score, artist_names, song_titles)
+    conn.commit()
+    track_file_path_change(None, file_path1)
+    _track_reference_change((None, None), (None, resolution))
+    return mv_id
+
+def _insert_music_video_rows(cursor, title, release_date, resolution=None, file_path1=None, file_url=None, score=0, artist_names=None, song_titles=None):
+    """Inserts a music video and its links without committing (callers own the transaction). Returns the new mv_id."""
     if artist_names is None:
         artist_names = []
     if song_titles is None:
         song_titles = []
-    conn = get_db_connection()
     # Compute Windows drive path for local file (file_path2)
     file_path2 = _get_windows_path(file_path1)
-    cursor = conn.cursor()
     # 1. Insert music video (including file_path1, file_path2, and resolution)
     cursor.execute(
         "INSERT INTO music_videos (title, release_date, file_path1, file_path2, file_url, score, resolution) VALUES (?, ?, ?, ?, ?, ?, ?)",
@@ -164,12 +302,13 @@ def insert_music_video(title, release_date, resolution=None, file_path1=None, fi
                 "INSERT OR IGNORE INTO song_music_video_link (song_id, music_video_id) VALUES (?, ?)",
                 [(song_id, mv_id) for song_id in song_ids]
             )
-    conn.commit()
+    return mv_id
 
-def get_all_music_videos_raw():
+def get_all_music_videos_raw(mv_ids=None):
     """
     Fetches raw music video data along with concatenated artists and songs, including file_path1 and file_path2 for local playback.
     Returns a list of tuples directly from the database query.
+    Pass mv_ids to fetch only those records (e.g. ones just inserted).
     """
     conn = get_db_connection()
     if not conn:
@@ -184,12 +323,15 @@ def get_all_music_videos_raw():
              FROM songs s JOIN song_music_video_link smvl ON s.song_id = smvl.song_id
              WHERE smvl.music_video_id = mv.mv_id) AS songs_concatenated
         FROM music_videos mv
+        {where}
         ORDER BY mv.release_date DESC, mv.mv_id DESC;
     """
+    params = tuple(mv_ids or ())
+    query = query.format(where=f"WHERE mv.mv_id IN ({','.join('?' * len(params))})" if mv_ids is not None else "")
     music_videos_raw = []
     try:
         cursor = conn.cursor()
-        cursor.execute(query)
+        cursor.execute(query, params)
         music_videos_raw = cursor.fetchall()
     except sqlite3.Error as e:
         print(f"Database error in get_all_music_videos_raw: {e}")
@@ -198,12 +340,20 @@ def get_all_music_videos_raw():
     return music_videos_raw
 
 def insert_performance(title, performance_date, show_type, resolution, file_path1=None, file_url=None, score=0, artist_names=None, song_titles=None):
+    """Inserts a performance with its artist and song links and commits. Returns the new performance_id."""
+    conn = get_db_connection()
+    perf_id = _insert_performance_rows(conn.cursor(), title, performance_date, show_type, resolution, file_path1, file_url, score, artist_names, song_titles)
+    conn.commit()
+    track_file_path_change(None, file_path1)
+    _track_reference_change((None, None), (show_type, resolution))
+    return perf_id
+
+def _insert_performance_rows(cursor, title, performance_date, show_type, resolution, file_path1=None, file_url=None, score=0, artist_names=None, song_titles=None):
+    """Inserts a performance and its links without committing (callers own the transaction). Returns the new performance_id."""
     if artist_names is None:
         artist_names = []
     if song_titles is None:
         song_titles = []
-    conn = get_db_connection()
-    cursor = conn.cursor()
     # Compute Windows drive path for local file (file_path2)
     file_path2 = _get_windows_path(file_path1)
     # 1. Insert performance (including file_path1 and file_path2)
@@ -241,7 +391,37 @@ def insert_performance(title, performance_date, show_type, resolution, file_path
                 "INSERT OR IGNORE INTO song_performance_link (song_id, performance_id) VALUES (?, ?)",
                 [(song_id, perf_id) for song_id in song_ids]
             )
-    conn.commit()
+    return perf_id
+
+def insert_entries_batch(entries):
+    """
+    Inserts several entries in one transaction: either all of them are saved or none are.
+    Each entry is a dict with entry_type ('performance' or 'music_video'), title, date,
+    show_type, resolution, file_path1, file_url, artist_names and song_titles.
+    Returns (performance_ids, mv_ids) of the new records. Errors are raised after rolling back.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    performance_ids, mv_ids = [], []
+    try:
+        for entry in entries:
+            if entry['entry_type'] == 'performance':
+                performance_ids.append(_insert_performance_rows(
+                    cursor, entry['title'], entry['date'], entry.get('show_type'), entry.get('resolution'),
+                    entry.get('file_path1'), entry.get('file_url'), 0, entry.get('artist_names'), entry.get('song_titles')))
+            else:
+                mv_ids.append(_insert_music_video_rows(
+                    cursor, entry['title'], entry['date'], entry.get('resolution') or None,
+                    entry.get('file_path1'), entry.get('file_url'), 0, entry.get('artist_names'), entry.get('song_titles')))
+        conn.commit()
+    except Exception:  # Not only sqlite3.Error: a bad entry (e.g. a missing key) must not leave half a batch pending
+        conn.rollback()
+        raise
+    for entry in entries:
+        track_file_path_change(None, entry.get('file_path1'))
+        show_type = entry.get('show_type') if entry['entry_type'] == 'performance' else None
+        _track_reference_change((None, None), (show_type, entry.get('resolution')))
+    return performance_ids, mv_ids
 
 def update_performance(performance_id, title, performance_date, show_type, resolution,
                        file_path1=None, file_path2=None, file_url=None, score=None,
@@ -251,6 +431,8 @@ def update_performance(performance_id, title, performance_date, show_type, resol
     """
     conn = get_db_connection()
     cursor = conn.cursor()
+    old_file_path1 = _get_file_path1('performances', 'performance_id', performance_id)
+    old_reference_values = _get_reference_values('performances', 'performance_id', performance_id)
     # Update main performance fields
     cursor.execute(
         """
@@ -296,6 +478,8 @@ def update_performance(performance_id, title, performance_date, show_type, resol
                 [(song_id, performance_id) for song_id in song_ids]
             )
     conn.commit()
+    track_file_path_change(old_file_path1, file_path1)
+    _track_reference_change(old_reference_values, (show_type, resolution))
 
 
 def delete_performance(performance_id):
@@ -304,8 +488,12 @@ def delete_performance(performance_id):
     """
     conn = get_db_connection()
     cursor = conn.cursor()
+    old_file_path1 = _get_file_path1('performances', 'performance_id', performance_id)
+    old_reference_values = _get_reference_values('performances', 'performance_id', performance_id)
     cursor.execute("DELETE FROM performances WHERE performance_id = ?", (performance_id,))
     conn.commit()
+    track_file_path_change(old_file_path1, None)
+    _track_reference_change(old_reference_values, (None, None))
 
 
 def get_all_performance_ids():
@@ -336,6 +524,8 @@ def update_music_video(mv_id, title, release_date, resolution=None,
     """
     conn = get_db_connection()
     cursor = conn.cursor()
+    old_file_path1 = _get_file_path1('music_videos', 'mv_id', mv_id)
+    old_reference_values = _get_reference_values('music_videos', 'mv_id', mv_id)
     # Update main music video fields
     cursor.execute(
         """
@@ -378,6 +568,8 @@ def update_music_video(mv_id, title, release_date, resolution=None,
                 [(song_id, mv_id) for song_id in song_ids]
             )
     conn.commit()
+    track_file_path_change(old_file_path1, file_path1)
+    _track_reference_change(old_reference_values, (None, resolution))
 
 
 def delete_music_video(mv_id):
@@ -386,8 +578,12 @@ def delete_music_video(mv_id):
     """
     conn = get_db_connection()
     cursor = conn.cursor()
+    old_file_path1 = _get_file_path1('music_videos', 'mv_id', mv_id)
+    old_reference_values = _get_reference_values('music_videos', 'mv_id', mv_id)
     cursor.execute("DELETE FROM music_videos WHERE mv_id = ?", (mv_id,))
     conn.commit()
+    track_file_path_change(old_file_path1, None)
+    _track_reference_change(old_reference_values, (None, None))
 
 
 def get_all_music_video_ids():
@@ -408,4 +604,189 @@ def get_all_music_video_ids():
         return []
     except AttributeError as e:
         print(f"AttributeError in get_all_music_video_ids (likely conn is None): {e}")
-        return []
\ No newline at end of file
+        return []
+
+def get_songs_for_artists(artist_ids, conn=None):
+    """
+    Fetches the songs of the given artists as [(song_id, song_title), ...], sorted by title.
+    Background workers pass their own conn; the shared connection belongs to the Tk thread.
+    """
+    conn = conn or get_db_connection()
+    if not conn or not artist_ids:
+        return []
+    placeholders = ",".join("?" for _ in artist_ids)
+    query = f"""
+        SELECT DISTINCT s.song_id, s.song_title
+        FROM songs s
+        JOIN song_artist_link sal ON s.song_id = sal.song_id
+        WHERE sal.artist_id IN ({placeholders})
+        ORDER BY s.song_title COLLATE NOCASE
+    """
+    try:
+        return conn.execute(query, tuple(artist_ids)).fetchall()
+    except sqlite3.Error as e:
+        print(f"Database error in get_songs_for_artists: {e}")
+        return []
+
+_has_linker_decisions = None # Whether the linker_decisions table exists, looked up on first use
+
+def get_linker_decisions_for_artists(artist_ids, conn=None):
+    """
+    Fetches the stored song-linker decisions (see performance_linker1.py) for the given artists.
+    Returns a dict {normalized_mention: [song_id, ...]}; skipped mentions are left out.
+    """
+    global _has_linker_decisions
+    conn = conn or get_db_connection()
+    if not conn or not artist_ids:
+        return {}
+    if _has_linker_decisions is None:
+        # The table only exists once the linker has been run against this database
+        try:
+            _has_linker_decisions = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'linker_decisions'").fetchone() is not None
+        except sqlite3.Error as e:
+            print(f"Database error in get_linker_decisions_for_artists: {e}")
+            return {}
+    if not _has_linker_decisions:
+        return {}
+    placeholders = ",".join("?" for _ in artist_ids)
+    query = f"SELECT normalized_mention, song_ids FROM linker_decisions WHERE artist_id IN ({placeholders})"
+    decisions = {}
+    try:
+        cursor = conn.cursor()
+        cursor.execute(query, tuple(artist_ids))
+        for mention, song_ids_str in cursor.fetchall():
+            song_ids = [int(x) for x in (song_ids_str or "").split(',') if x.strip()]
+            if mention and song_ids:
+                decisions.setdefault(mention, []).extend(song_ids)
+    except sqlite3.Error as e:
+        print(f"Database error in get_linker_decisions_for_artists: {e}")
+    return decisions
+
+def get_play_stats():
+    """
+    Fetches the aggregated play history (see play_history.py).
+    Returns a dict {(entry_type, record_id): (play_count, last_played_at)}.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return {}
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT entry_type, record_id, play_count, last_played_at FROM play_stats")
+        return {(row[0], row[1]): (row[2], row[3]) for row in cursor.fetchall()}
+    except sqlite3.Error as e:
+        # The table is created by the play event writer on first start
+        print(f"Database error in get_play_stats: {e}")
+        return {}
+
+def get_probed_heights(paths=None):
+    """
+    Fetches the probed pixel heights of local files (see media_probe.py), or only of paths if given.
+    Returns a dict {path: height}; files that have not been probed are left out.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return {}
+    try:
+        cursor = conn.cursor()
+        if paths is not None:
+            paths = tuple(paths)
+            cursor.execute(f"SELECT path, height FROM media_probe WHERE height IS NOT NULL AND path IN ({','.join('?' * len(paths))})", paths)
+        else:
+            cursor.execute("SELECT path, height FROM media_probe WHERE height IS NOT NULL")
+        return dict(cursor.fetchall())
+    except sqlite3.Error as e:
+        # The table is created by the probe service on first start
+        print(f"Database error in get_probed_heights: {e}")
+        return {}
+
+def get_artist_search_stats():
+    """
+    Fetches the ranking inputs for artist search (see artist_search.py): Spotify popularity and
+    the date of the artist's most recent performance or music video.
+    Returns a dict {artist_id: (popularity or None, last_date or None)}.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return {}
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT a.artist_id, a.popularity, MAX(d.last_date)
+            FROM artists a
+            LEFT JOIN (
+                SELECT pal.artist_id, MAX(p.performance_date) AS last_date
+                FROM performance_artist_link pal JOIN performances p ON p.performance_id = pal.performance_id
+                GROUP BY pal.artist_id
+                UNION ALL
+                SELECT mval.artist_id, MAX(mv.release_date)
+                FROM music_video_artist_link mval JOIN music_videos mv ON mv.mv_id = mval.mv_id
+                GROUP BY mval.artist_id
+            ) d ON d.artist_id = a.artist_id
+            GROUP BY a.artist_id
+        """)
+        return {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+    except sqlite3.Error as e:
+        print(f"Database error in get_artist_search_stats: {e}")
+        return {}
+
+def get_artists_version():
+    """
+    Returns a cheap fingerprint of the artists table for cache invalidation: the highest id, one
+    index lookup. It catches the importer scripts, which add artists from other processes; changes
+    made in this process go through artist_search.invalidate_artist_index instead.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        return conn.execute("SELECT MAX(artist_id) FROM artists").fetchone()[0]
+    except sqlite3.Error as e:
+        print(f"Database error in get_artists_version: {e}")
+        return None
+
+_ARTIST_ID_BY_NAME = "(SELECT artist_id FROM artists WHERE artist_name = :artist_name)"
+_DUPLICATE_CHECK_QUERIES = {
+    'performance': f"""
+        SELECT {_ARTIST_ID_BY_NAME},
+               EXISTS(SELECT 1 FROM performances WHERE file_url = :file_url),
+               EXISTS(SELECT 1 FROM performances WHERE file_path1 = :file_path1),
+               EXISTS(SELECT 1 FROM performances p
+                      JOIN performance_artist_link pal ON pal.performance_id = p.performance_id
+                      WHERE p.title = :title AND p.performance_date = :date AND pal.artist_id = {_ARTIST_ID_BY_NAME})
+    """,
+    # Music videos are matched on artist and title only (re-uploads keep their title, not their date)
+    'music_video': f"""
+        SELECT {_ARTIST_ID_BY_NAME},
+               EXISTS(SELECT 1 FROM music_videos WHERE file_url = :file_url),
+               EXISTS(SELECT 1 FROM music_videos WHERE file_path1 = :file_path1),
+               EXISTS(SELECT 1 FROM music_videos mv
+                      JOIN music_video_artist_link mval ON mval.mv_id = mv.mv_id
+                      WHERE mv.title = :title AND mval.artist_id = {_ARTIST_ID_BY_NAME})
+    """,
+}
+
+def check_duplicates(entry):
+    """
+    Runs every pre-save check for a new entry in one query.
+    entry: dict with 'entry_type' ('performance' or 'music_video') and any of 'file_url',
+    'file_path1', 'title', 'date' (YYYY-MM-DD) and 'artist_name' (the primary artist).
+    Returns a dict: artist_id (None if the artist is unknown), url_exists, file_exists, title_exists
+    (a record with the same artist and title, and date for performances).
+    """
+    result = {'artist_id': None, 'url_exists': False, 'file_exists': False, 'title_exists': False}
+    conn = get_db_connection()
+    if not conn:
+        return result
+    params = {key: entry.get(key) for key in ('file_url', 'file_path1', 'title', 'date', 'artist_name')}
+    try:
+        cursor = conn.cursor()
+        cursor.execute(_DUPLICATE_CHECK_QUERIES[entry.get('entry_type', 'performance')], params)
+        artist_id, url_exists, file_exists, title_exists = cursor.fetchone()
+    except sqlite3.Error as e:
+        print(f"Database error in check_duplicates: {e}")
+        return result
+    result.update(artist_id=artist_id, url_exists=bool(url_exists), file_exists=bool(file_exists),
+                  title_exists=bool(title_exists))
+    return result
@@ -0,0 +1,86 @@
+# directory_index.py
+# Cached directory listings for the local file browser (utils.show_file_browser).
+# Listings are read with os.scandir (no extra stat per entry) and cached per
+# directory; a cached listing is reused as long as the directory's mtime is unchanged.
+import os
+import threading
+
+_listing_cache = {}  # {directory: (mtime_ns, [(name, is_dir), ...])}
+_cache_lock = threading.Lock()
+_refreshing = set()  # Directories with a background refresh in flight
+
+
+def get_cached_listing(directory):
+    """
+    Returns the last known listing for directory as a list of (name, is_dir) tuples,
+    or None if it has never been scanned. Never touches the filesystem.
+    """
+    with _cache_lock:
+        cached = _listing_cache.get(directory)
+    return cached[1] if cached else None
+
+
+def scan_directory(directory):
+    """
+    Returns (entries, changed) for directory, where entries is a list of (name, is_dir)
+    tuples sorted case-insensitively. The directory is only re-read if its mtime differs
+    from the cached one. Returns ([], True) if the directory cannot be read.
+    """
+    try:
+        mtime_ns = os.stat(directory).st_mtime_ns
+    except OSError:
+        with _cache_lock:
+            had_entry = _listing_cache.pop(directory, None) is not None
+        return [], had_entry
+
+    with _cache_lock:
+        cached = _listing_cache.get(directory)
+    if cached and cached[0] == mtime_ns:
+        return cached[1], False
+
+    entries = []
+    try:
+        with os.scandir(directory) as it:
+            for dir_entry in it:
+                try:
+                    is_dir = dir_entry.is_dir()
+                except OSError:
+                    is_dir = False
+                entries.append((dir_entry.name, is_dir))
+    except OSError as e:
+        print(f"Error scanning directory {directory}: {e}")
+        return [], True
+    entries.sort(key=lambda item: item[0].lower())
+
+    with _cache_lock:
+        _listing_cache[directory] = (mtime_ns, entries)
+    return entries, True
+
+
+def refresh_async(directory, on_done):
+    """
+    Re-validates the listing for directory in a background thread and calls
+    on_done(directory, entries, changed) from that thread. Callers in the UI must
+    marshal back to the Tk thread themselves (e.g. with widget.after).
+    A refresh already running for the same directory is not started twice.
+    """
+    with _cache_lock:
+        if directory in _refreshing:
+            return
+        _refreshing.add(directory)
+
+    def worker():
+        try:
+            entries, changed = scan_directory(directory)
+        finally:
+            with _cache_lock:
+                _refreshing.discard(directory)
+        on_done(directory, entries, changed)
+
+    threading.Thread(target=worker, daemon=True).start()
+
+
+def invalidate(directory):
+    """Drops the cached listing for directory, e.g. after deleting a file from it."""
+    with _cache_lock:
+        _listing_cache.pop(directory, None)
@@ -0,0 +1,149 @@
+# drive_keep_warm.py
+# Keeps the external USB drives spun up while the browser is open.
+# Known media paths are grouped by drive (the configured library root they sit under, matched
+# by string prefix so the Tk thread never stats a sleeping drive); every drive is woken in parallel at
+# startup, drives that have been idle for KEEP_WARM_INTERVAL_SECONDS get a small read,
+# and the drive of the currently selected rows can be woken on demand.
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+
+KEEP_WARM_INTERVAL_SECONDS = 120  # Well under the typical 5-10 minute USB drive spin-down timer
+SAMPLE_FILES_PER_DRIVE = 8
+WAKE_READ_BYTES = 4096
+
+
+def get_drive_root(path):
+    """
+    Returns the entry of config.LIBRARY_ROOTS (the drive mount points) that holds path, or None.
+    Pure string matching, so it is safe to call on the Tk thread.
+    """
+    path = os.path.normpath(path)
+    for root in config.LIBRARY_ROOTS:
+        if path.startswith(root.rstrip("/") + "/"):
+            return root
+    return None
+
+
+def group_paths_by_mount(paths):
+    """
+    Returns {mount_point: [path, ...]} for the given local file paths, keyed by their library root;
+    paths outside every root are grouped under None. Does not touch the filesystem.
+    """
+    groups = {}
+    for path in paths:
+        if path:
+            groups.setdefault(get_drive_root(path), []).append(path)
+    return groups
+
+
+class DriveKeepWarm:
+    """
+    Drive-aware keep-warm scheduler. on_report(mount_point, latency_seconds, ok) is called
+    from a worker thread after each wake read; UI callers must marshal it to the Tk thread.
+    """
+    def __init__(self, on_report=None):
+        self.on_report = on_report
+        self.samples = {}  # {mount_point: [sample file paths]}
+        self.latencies = {}  # {mount_point: last wake latency in seconds}
+        self.last_access = {}  # {mount_point: time.monotonic() of the last read or playback}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="DriveWake")
+        self._in_flight = set()
+        self._thread = None
+
+    def set_paths(self, paths):
+        """Replaces the known media paths; keeps a few sample files per drive for wake reads."""
+        samples = {}
+        for mount_point, mount_paths in group_paths_by_mount(paths).items():
+            if mount_point is None:  # Not on one of the library drives
+                continue
+            samples[mount_point] = random.sample(mount_paths, min(SAMPLE_FILES_PER_DRIVE, len(mount_paths)))
+        with self._lock:
+            self.samples = samples
+
+    def start(self):
+        """Wakes every drive in parallel, then keeps idle drives warm in the background."""
+        self.wake_all()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._keep_warm_loop, name="DriveKeepWarm", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._executor.shutdown(wait=False)
+
+    def wake_all(self):
+        with self._lock:
+            mount_points = list(self.samples)
+        for mount_point in mount_points:
+            self._submit_wake(mount_point)
+
+    def wake_for_paths(self, paths):
+        """Wakes the drives holding the given paths (e.g. the currently selected rows)."""
+        for mount_point in group_paths_by_mount(paths):
+            if mount_point is not None:
+                self._submit_wake(mount_point)
+
+    def note_access(self, paths):
+        """Records that the drives holding paths are in use, so the idle reads can skip them."""
+        now = time.monotonic()
+        with self._lock:
+            for mount_point in group_paths_by_mount(paths):
+                if mount_point is not None:
+                    self.last_access[mount_point] = now
+
+    def _submit_wake(self, mount_point):
+        with self._lock:
+            if mount_point in self._in_flight or self._stop_event.is_set():
+                return
+            self._in_flight.add(mount_point)
+        try:
+            self._executor.submit(self._wake_drive, mount_point)
+        except RuntimeError:  # Executor already shut down
+            with self._lock:
+                self._in_flight.discard(mount_point)
+
+    def _wake_drive(self, mount_point):
+        """Reads a few KB at a random offset of a sample file so the read cannot be served from cache."""
+        with self._lock:
+            candidates = list(self.samples.get(mount_point, []))
+        start = time.monotonic()
+        ok = False
+        random.shuffle(candidates)
+        for path in candidates:
+            try:
+                size = os.path.getsize(path)
+                with open(path, "rb") as f:
+                    f.seek(random.randrange(0, max(1, size - WAKE_READ_BYTES)))
+                    f.read(WAKE_READ_BYTES)
+                ok = True
+                break
+            except OSError:
+                continue
+        if not candidates:
+            try:
+                os.listdir(mount_point)
+                ok = True
+            except OSError:
+                pass
+        latency = time.monotonic() - start
+        with self._lock:
+            self._in_flight.discard(mount_point)
+            self.latencies[mount_point] = latency
+            self.last_access[mount_point] = time.monotonic()
+        if self.on_report:
+            self.on_report(mount_point, latency, ok)
+
+    def _keep_warm_loop(self):
+        while not self._stop_event.wait(KEEP_WARM_INTERVAL_SECONDS / 4):
+            now = time.monotonic()
+            with self._lock:
+                idle = [m for m in self.samples if now - self.last_access.get(m, 0) >= KEEP_WARM_INTERVAL_SECONDS]
+            for mount_point in idle:
+                self._submit_wake(mount_point)
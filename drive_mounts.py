@@ -0,0 +1,106 @@
+# drive_mounts.py
+# Mounts and unmounts the external drives in the background (mount_kpop_drives.sh /
+# unmount_kpop_drives.sh via sudo), so the browser can load the catalog without waiting
+# for blkid/lsblk and disk spin-up. Per-drive status is taken from the script's log lines
+# as they are printed, and from os.path.ismount once the script has finished.
+import os
+import re
+import subprocess
+import threading
+
+import config
+
+MOUNT_SCRIPT = "./mount_kpop_drives.sh"
+UNMOUNT_SCRIPT = "./unmount_kpop_drives.sh"
+SCRIPT_TIMEOUT_SECONDS = 180
+
+STATUS_PENDING = "pending"
+STATUS_MOUNTED = "mounted"
+STATUS_FAILED = "failed"
+STATUS_UNMOUNTED = "unmounted"
+
+_ATTEMPT_RE = re.compile(r"Attempting to mount '.*' at '(?P<mount>.+)'")
+_MOUNTED_RE = re.compile(r"(Successfully mounted '.*' \(.*\) at|is already mounted at) '(?P<mount>.+)'")
+
+
+class DriveMountManager:
+    """
+    Tracks the mount status of each library root. on_status(mount_point, status) is called from
+    a worker thread whenever a drive's status changes; UI callers must marshal it to the Tk thread.
+    """
+    def __init__(self, roots=None, on_status=None):
+        self.roots = list(roots or config.LIBRARY_ROOTS)
+        self.on_status = on_status
+        self.status = {root: (STATUS_MOUNTED if os.path.ismount(root) else STATUS_PENDING) for root in self.roots}
+        self._lock = threading.Lock()
+
+    def all_settled(self):
+        return STATUS_PENDING not in self.status.values()
+
+    def status_for_path(self, path):
+        """Returns the status of the library drive holding path, or None if path is not under a library root."""
+        for root, status in self.status.items():
+            if path.startswith(root.rstrip("/") + "/"):
+                return status
+        return None
+
+    def _set_status(self, mount_point, status):
+        # The script's mount points are /home/$SUDO_USER/..., which may not match the expanded roots exactly
+        root = next((r for r in self.roots if os.path.basename(r.rstrip("/")) == os.path.basename(mount_point.rstrip("/"))), None)
+        if root is None:
+            return
+        with self._lock:
+            if self.status.get(root) == status:
+                return
+            self.status[root] = status
+        if self.on_status:
+            self.on_status(root, status)
+
+    def mount_async(self):
+        """Runs the mount script in the background unless every drive is already mounted."""
+        if self.all_settled():
+            for root in self.roots:
+                if self.on_status: self.on_status(root, self.status[root])
+            return
+        threading.Thread(target=self._run_mount, name="DriveMount", daemon=True).start()
+
+    def _run_mount(self):
+        current = None
+        try:
+            proc = subprocess.Popen(['sudo', os.path.expanduser(MOUNT_SCRIPT)], stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, text=True)
+            for line in proc.stdout:
+                print(f"Mount: {line.rstrip()}")
+                match = _MOUNTED_RE.search(line)
+                if match:
+                    self._set_status(match.group("mount"), STATUS_MOUNTED)
+                    current = None
+                    continue
+                match = _ATTEMPT_RE.search(line)
+                if match:
+                    current = match.group("mount")
+                elif "ERROR" in line and current:
+                    self._set_status(current, STATUS_FAILED)
+                    current = None
+            proc.wait(timeout=SCRIPT_TIMEOUT_SECONDS)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            print(f"Mount: error running mount script: {e}")
+        # Whatever the log said, the mount table has the final word
+        for root in self.roots:
+            self._set_status(root, STATUS_MOUNTED if os.path.ismount(root) else STATUS_FAILED)
+
+    def unmount_async(self, on_done=None):
+        """Runs the unmount script in the background; on_done(ok, message) is called from the worker thread."""
+        def run():
+            try:
+                result = subprocess.run(['sudo', os.path.expanduser(UNMOUNT_SCRIPT)], capture_output=True,
+                                        text=True, stdin=subprocess.DEVNULL, timeout=SCRIPT_TIMEOUT_SECONDS)
+                stdout, stderr = result.stdout or '', result.stderr or ''
+                ok = result.returncode == 0 or "All mounted K-Pop drives unmounted successfully" in stdout
+                message = stderr.strip() or (stdout.strip().splitlines() or [''])[-1]
+            except (OSError, subprocess.TimeoutExpired) as e:
+                ok, message = False, f"Error running unmount script: {e}"
+            for root in self.roots:
+                self._set_status(root, STATUS_MOUNTED if os.path.ismount(root) else STATUS_UNMOUNTED)
+            if on_done: on_done(ok, message)
+        threading.Thread(target=run, name="DriveUnmount", daemon=True).start()
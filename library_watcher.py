@@ -0,0 +1,395 @@
+# library_watcher.py
+# Keeps the media_files table in sync with the media files on the external drives
+# (config.LIBRARY_ROOTS). Locally mounted drives are watched with inotify; network
+# mounts (CIFS/NFS), or all drives when inotify_simple is not installed, are polled,
+# re-reading only directories whose mtime changed since the last pass.
+import os
+import sqlite3
+import threading
+import time
+import datetime
+
+import config
+import db_operations  # For _get_windows_path
+
+try:
+    from inotify_simple import INotify, flags
+    HAS_INOTIFY = True
+except ImportError:
+    HAS_INOTIFY = False
+
+POLL_INTERVAL_SECONDS = 60
+NETWORK_FILESYSTEMS = {"cifs", "smb3", "smbfs", "nfs", "nfs4"}
+
+
+def ensure_media_files_table(conn):
+    """Creates the media_files table and the indexes the watcher relies on."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS media_files (
+            path TEXT PRIMARY KEY,
+            directory TEXT NOT NULL,
+            size INTEGER,
+            mtime REAL,
+            inode INTEGER,
+            device INTEGER,
+            performance_id INTEGER,
+            mv_id INTEGER,
+            missing INTEGER NOT NULL DEFAULT 0,
+            last_seen_at TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_media_files_directory ON media_files(directory)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_media_files_inode ON media_files(device, inode)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_media_files_performance_id ON media_files(performance_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_media_files_mv_id ON media_files(mv_id)")
+    # Record lookups by path (linking and moved-file repair)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_performance_file_path1 ON performances(file_path1)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_music_video_file_path1 ON music_videos(file_path1)")
+    conn.commit()
+
+
+def _is_media_file(name):
+    return name.lower().endswith(config.MEDIA_FILE_EXTENSIONS)
+
+
+def _get_mount_fstype(path):
+    """Returns the filesystem type of the mount containing path (from /proc/mounts), or None."""
+    best_mount, best_type = "", None
+    try:
+        with open("/proc/mounts") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) < 3:
+                    continue
+                mount_point = parts[1].replace("\\040", " ")
+                if (path == mount_point or path.startswith(mount_point.rstrip("/") + "/")) and len(mount_point) > len(best_mount):
+                    best_mount, best_type = mount_point, parts[2]
+    except OSError:
+        return None
+    return best_type
+
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+def _find_linked_records(conn, path):
+    """Returns (performance_id, mv_id) of the records whose file_path1 is path."""
+    row = conn.execute("SELECT performance_id FROM performances WHERE file_path1 = ?", (path,)).fetchone()
+    perf_id = row[0] if row else None
+    row = conn.execute("SELECT mv_id FROM music_videos WHERE file_path1 = ?", (path,)).fetchone()
+    mv_id = row[0] if row else None
+    return perf_id, mv_id
+
+
+def repoint_records(conn, old_path, new_path, perf_id, mv_id):
+    """Points the records linked to a moved file at its new location."""
+    new_path2 = db_operations._get_windows_path(new_path)
+    if perf_id is not None:
+        conn.execute("UPDATE performances SET file_path1 = ?, file_path2 = ? WHERE performance_id = ? AND file_path1 = ?",
+                     (new_path, new_path2, perf_id, old_path))
+    if mv_id is not None:
+        conn.execute("UPDATE music_videos SET file_path1 = ?, file_path2 = ? WHERE mv_id = ? AND file_path1 = ?",
+                     (new_path, new_path2, mv_id, old_path))
+
+
+def upsert_file(conn, path, st):
+    """
+    Records a file seen at path with stat result st. If the file is not known yet but a
+    row with the same device/inode/size/mtime exists at a path that is gone, the file is
+    treated as moved: that row and any linked records are re-pointed to the new path.
+    Returns (old_path, new_path) for a detected move, otherwise None.
+    """
+    directory = os.path.dirname(path)
+    row = conn.execute("SELECT size, mtime, inode, missing FROM media_files WHERE path = ?", (path,)).fetchone()
+    if row:
+        if row[0] != st.st_size or row[1] != st.st_mtime or row[2] != st.st_ino or row[3]:
+            conn.execute("UPDATE media_files SET size = ?, mtime = ?, inode = ?, device = ?, missing = 0, last_seen_at = ? WHERE path = ?",
+                         (st.st_size, st.st_mtime, st.st_ino, st.st_dev, _now(), path))
+        return None
+
+    moved_from = None
+    for old_path, old_size, old_mtime, perf_id, mv_id in conn.execute(
+            "SELECT path, size, mtime, performance_id, mv_id FROM media_files WHERE device = ? AND inode = ?",
+            (st.st_dev, st.st_ino)).fetchall():
+        if old_size == st.st_size and old_mtime == st.st_mtime and not os.path.exists(old_path):
+            moved_from = (old_path, perf_id, mv_id)
+            break
+
+    if moved_from:
+        old_path, perf_id, mv_id = moved_from
+        conn.execute("UPDATE media_files SET path = ?, directory = ?, missing = 0, last_seen_at = ? WHERE path = ?",
+                     (path, directory, _now(), old_path))
+        repoint_records(conn, old_path, path, perf_id, mv_id)
+        print(f"Library watcher: moved {old_path} -> {path}")
+        return (old_path, path)
+
+    perf_id, mv_id = _find_linked_records(conn, path)
+    conn.execute(
+        "INSERT INTO media_files (path, directory, size, mtime, inode, device, performance_id, mv_id, missing, last_seen_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0, ?)",
+        (path, directory, st.st_size, st.st_mtime, st.st_ino, st.st_dev, perf_id, mv_id, _now()))
+    return None
+
+
+def mark_missing(conn, path):
+    """Flags a file (or, for a directory, everything below it) as missing. Rows are kept so moves can be matched."""
+    conn.execute("UPDATE media_files SET missing = 1 WHERE path = ?", (path,))
+    conn.execute("UPDATE media_files SET missing = 1 WHERE path LIKE ? ESCAPE '\\'",
+                 (path.rstrip("/").replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "/%",))
+
+
+def sync_directory(conn, directory):
+    """
+    Re-reads one directory: upserts the media files in it and flags rows for files that
+    are no longer there as missing. Returns (subdirectories, moves).
+    """
+    subdirs, moves, present = [], [], set()
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif _is_media_file(entry.name) and entry.is_file():
+                        present.add(entry.path)
+                        move = upsert_file(conn, entry.path, entry.stat())
+                        if move:
+                            moves.append(move)
+                except OSError as e:
+                    print(f"Library watcher: cannot stat {entry.path}: {e}")
+    except OSError as e:
+        print(f"Library watcher: cannot read {directory}: {e}")
+        return [], moves
+    for (path,) in conn.execute("SELECT path FROM media_files WHERE directory = ? AND missing = 0", (directory,)).fetchall():
+        if path not in present:
+            conn.execute("UPDATE media_files SET missing = 1 WHERE path = ?", (path,))
+    conn.commit()
+    return subdirs, moves
+
+
+def relink_records(conn):
+    """Refreshes the linked record ids (records may have been added or edited since a file was indexed)."""
+    conn.execute("""
+        UPDATE media_files SET
+            performance_id = (SELECT performance_id FROM performances WHERE file_path1 = media_files.path),
+            mv_id = (SELECT mv_id FROM music_videos WHERE file_path1 = media_files.path)
+        WHERE missing = 0
+    """)
+    conn.commit()
+
+
+# --- Indexed queries ---
+
+def get_unlinked_media_files(conn, directory):
+    """
+    Paths of media files in directory that no performance or music video points at ("Show Only New"),
+    or None if the directory has no files in the index. Links are checked against the records
+    themselves, since records added since the last watcher pass aren't in the linked ids yet.
+    """
+    try:
+        rows = conn.execute("""
+            SELECT m.path,
+                   EXISTS (SELECT 1 FROM performances p WHERE p.file_path1 = m.path)
+                   OR EXISTS (SELECT 1 FROM music_videos v WHERE v.file_path1 = m.path)
+            FROM media_files m WHERE m.directory = ? AND m.missing = 0
+        """, (os.path.normpath(directory),)).fetchall()
+    except sqlite3.OperationalError:
+        return None  # The watcher hasn't created the table yet
+    if not rows:
+        return None
+    return [path for path, linked in rows if not linked]
+
+
+def get_orphaned_records(conn, roots=None):
+    """
+    Returns [(entry_type, record_id, file_path1)] for records whose local file is not in
+    the index. Only drives that are currently mounted are considered.
+    """
+    orphans = []
+    for root in roots or config.LIBRARY_ROOTS:
+        if not os.path.ismount(root):
+            continue
+        pattern = root.rstrip("/") + "/%"
+        for entry_type, table, id_col in (("performance", "performances", "performance_id"),
+                                          ("mv", "music_videos", "mv_id")):
+            cursor = conn.execute(
+                f"SELECT t.{id_col}, t.file_path1 FROM {table} t WHERE t.file_path1 LIKE ? "
+                "AND NOT EXISTS (SELECT 1 FROM media_files m WHERE m.path = t.file_path1 AND m.missing = 0)",
+                (pattern,))
+            orphans.extend((entry_type, rid, path) for rid, path in cursor.fetchall())
+    return orphans
+
+
+class LibraryWatcher:
+    """
+    Background thread that indexes config.LIBRARY_ROOTS into media_files and keeps it current.
+    on_moves, if given, is called from the watcher thread with a list of (old_path, new_path)
+    for files whose records were re-pointed; UI callers must marshal it to the Tk thread.
+    """
+    def __init__(self, roots=None, db_file=None, on_moves=None):
+        self.roots = list(roots or config.LIBRARY_ROOTS)
+        self.db_file = db_file or config.DATABASE_FILE
+        self.on_moves = on_moves
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._dir_state = {}  # {directory: (mtime_ns, [subdirectories])} for polled roots
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="LibraryWatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _report(self, moves):
+        if moves and self.on_moves:
+            self.on_moves(moves)
+
+    def _run(self):
+        try:
+            conn = sqlite3.connect(self.db_file, timeout=30)
+            ensure_media_files_table(conn)
+        except sqlite3.Error as e:
+            print(f"Library watcher: database error, not starting: {e}")
+            return
+
+        roots = [r for r in self.roots if os.path.isdir(r)]
+        if not HAS_INOTIFY:
+            print("Library watcher: inotify_simple is not installed; polling every drive "
+                  f"every {POLL_INTERVAL_SECONDS}s (pip install inotify_simple to watch local drives).")
+        watched_roots, polled_roots = [], []
+        for root in roots:
+            if HAS_INOTIFY and _get_mount_fstype(root) not in NETWORK_FILESYSTEMS:
+                watched_roots.append(root)
+            else:
+                polled_roots.append(root)
+
+        inotify, wd_paths = None, {}
+        if watched_roots:
+            inotify = INotify()
+        try:
+            # Initial pass over every root; watched roots get their inotify watches as they are walked
+            for root in roots:
+                if self._stop_event.is_set():
+                    return
+                self._report(self._poll_tree(conn, root, inotify, wd_paths if root in watched_roots else None))
+            self._after_pass(conn)
+            print(f"Library watcher: indexed {len(roots)} drive(s) "
+                  f"({len(watched_roots)} watched, {len(polled_roots)} polled)")
+
+            last_poll = time.monotonic()
+            while not self._stop_event.is_set():
+                if inotify:
+                    # Returns early when events arrive, so the poll is timed by the clock, not by iterations
+                    self._report(self._handle_events(conn, inotify, wd_paths))
+                else:
+                    self._stop_event.wait(POLL_INTERVAL_SECONDS)
+                if time.monotonic() - last_poll >= POLL_INTERVAL_SECONDS and not self._stop_event.is_set():
+                    last_poll = time.monotonic()
+                    for root in polled_roots:
+                        self._report(self._poll_tree(conn, root))
+                    self._after_pass(conn)
+        except sqlite3.Error as e:
+            print(f"Library watcher: database error, stopping: {e}")
+        finally:
+            if inotify:
+                inotify.close()
+            conn.close()
+
+    def _after_pass(self, conn):
+        """Refreshes record links, then fingerprints new files and repairs records whose file moved."""
+        import media_fingerprints  # Imported here: media_fingerprints itself builds on this module
+        relink_records(conn)
+        self._report(media_fingerprints.run_fingerprint_job(conn, self._stop_event, self.roots))
+
+    def _poll_tree(self, conn, root, inotify=None, wd_paths=None):
+        """Walks root, re-reading only directories whose mtime changed. Adds inotify watches if given."""
+        moves, stack, seen = [], [root], set()
+        while stack and not self._stop_event.is_set():
+            directory = stack.pop()
+            seen.add(directory)
+            try:
+                mtime_ns = os.stat(directory).st_mtime_ns
+            except OSError:
+                continue
+            if inotify is not None:
+                self._add_watch(inotify, wd_paths, directory)
+            cached = self._dir_state.get(directory)
+            if cached and cached[0] == mtime_ns:
+                subdirs = cached[1]
+            else:
+                subdirs, dir_moves = sync_directory(conn, directory)
+                moves.extend(dir_moves)
+                self._dir_state[directory] = (mtime_ns, subdirs)
+            stack.extend(subdirs)
+        # Directories that disappeared since the last pass
+        prefix = root.rstrip("/") + "/"
+        for directory in [d for d in self._dir_state if d.startswith(prefix) and d not in seen]:
+            if not self._stop_event.is_set():
+                del self._dir_state[directory]
+                mark_missing(conn, directory)
+        conn.commit()
+        return moves
+
+    def _add_watch(self, inotify, wd_paths, directory):
+        mask = (flags.CREATE | flags.DELETE | flags.MOVED_FROM | flags.MOVED_TO |
+                flags.CLOSE_WRITE | flags.DELETE_SELF)
+        try:
+            wd_paths[inotify.add_watch(directory, mask)] = directory
+        except OSError as e:
+            print(f"Library watcher: cannot watch {directory}: {e}")
+
+    def _handle_events(self, conn, inotify, wd_paths):
+        """Applies the inotify events that arrive within one second."""
+        moves = []
+        for event in inotify.read(timeout=1000):
+            directory = wd_paths.get(event.wd)
+            if event.mask & flags.IGNORED:
+                wd_paths.pop(event.wd, None)
+                continue
+            if directory is None or not event.name:
+                continue
+            path = os.path.join(directory, event.name)
+            is_dir = bool(event.mask & flags.ISDIR)
+            if event.mask & (flags.DELETE | flags.MOVED_FROM):
+                mark_missing(conn, path)
+                for stale in [d for d in self._dir_state if d == path or d.startswith(path + "/")]:
+                    del self._dir_state[stale]
+            elif is_dir and event.mask & (flags.CREATE | flags.MOVED_TO):
+                # New or moved-in directory: index it (moves are matched by inode) and watch it
+                moves.extend(self._poll_tree(conn, path, inotify, wd_paths))
+            elif event.mask & (flags.CLOSE_WRITE | flags.MOVED_TO) and _is_media_file(event.name):
+                try:
+                    move = upsert_file(conn, path, os.stat(path))
+                except OSError:
+                    continue
+                if move:
+                    moves.append(move)
+        conn.commit()
+        return moves
+
+
+if __name__ == "__main__":
+    # One-off index pass: prints new (unlinked) files and records whose file is missing
+    import sys
+    db_file = sys.argv[1] if len(sys.argv) > 1 else config.DATABASE_FILE
+    conn = sqlite3.connect(db_file)
+    ensure_media_files_table(conn)
+    watcher = LibraryWatcher(db_file=db_file)
+    for root in watcher.roots:
+        if os.path.isdir(root):
+            watcher._poll_tree(conn, root)
+    relink_records(conn)
+    new_count = conn.execute(
+        "SELECT COUNT(*) FROM media_files WHERE missing = 0 AND performance_id IS NULL AND mv_id IS NULL").fetchone()[0]
+    print(f"Unlinked media files: {new_count}")
+    for entry_type, record_id, path in get_orphaned_records(conn):
+        print(f"Missing file for {entry_type} {record_id}: {path}")
+    conn.close()
@@ -7,16 +7,26 @@ import sys
 import tkinter as tk
 from tkinter import ttk, messagebox
 import threading
-import random
+import datetime
 import webbrowser
 from urllib.parse import urlparse, urlunparse, parse_qs, urlencode
 
 # Modularized imports
 import config
-import utils
 import db_operations
 import data_entry_ui # For the new data entry window
 import modify_entry_ui  # For the modify-entry window
+import library_watcher
+import drive_keep_warm
+import playback_prefetch
+import mpv_controller
+import play_history
+import playlist_engine
+import media_probe
+import thumbnail_cache
+import drive_mounts
+import path_resolver
+import artist_search
 
 # Constants
 DARK_BG = "#222222"
@@ -286,9 +296,35 @@ class KpopDBBrowser(tk.Tk):
         self.play_button = None; self.play_random_button = None
         self.random_count_var = tk.StringVar(); self.random_count_dropdown = None
         self.change_score_var = tk.BooleanVar(value=False)
+        self.group_by_drive_var = tk.BooleanVar(value=True)  # Play each drive's files back to back
         self.score_editor_window = None
         self.data_entry_window_instance = None # For the new data entry window
         self.modify_window = None  # For the modify-entry window
+        self.drive_keep_warm = drive_keep_warm.DriveKeepWarm(
+            on_report=lambda mount, latency, ok: self.after(0, lambda: self._on_drive_woken(mount, latency, ok)))
+        self.playback_prefetcher = playback_prefetch.PlaybackPrefetcher()
+        # One long-lived mpv for local playback; its callbacks arrive on the IPC reader thread
+        self.mpv_controller = mpv_controller.MpvController(
+            on_item_start=lambda index, path: self.after(0, lambda: self._on_mpv_item_start(index, path)),
+            on_item_end=lambda path, reason, watched, duration: self.after(0, lambda: self._on_mpv_item_end(path, reason, watched, duration)),
+            on_queue_finished=lambda: self._local_playback_finished.set())
+        self._local_playback_finished = threading.Event()
+        self._active_playback_details = None  # perf dicts of the running local queue (enqueue appends here)
+        self._queued_items_by_path = {}  # playable_path -> perf dict for the items handed to mpv
+        self._queue_source = "selected"
+        self.play_event_writer = play_history.PlayEventWriter()
+        self.media_probe_service = media_probe.ProbeService(
+            on_probed=lambda results: self.after(0, lambda: self._on_media_probed(results)))
+        self.thumbnail_service = thumbnail_cache.ThumbnailService(
+            on_ready=lambda path, frames: self.after(0, lambda: self._on_thumbnails_ready(path, frames)))
+        self._preview_path = None  # Local path whose previews the preview strip should show
+        self._preview_images = []  # PhotoImage references (Tk drops images that aren't referenced)
+        # Drives are mounted in the background; rows on a drive that isn't ready yet are marked
+        self._closing = False
+        self.path_resolver = path_resolver.PathResolver(
+            on_update=lambda paths: self.after(0, lambda: self._on_paths_checked(paths)))
+        self.drive_mounts = drive_mounts.DriveMountManager(
+            on_status=lambda mount, status: self.after(0, lambda: self._on_drive_mount_status(mount, status)))
 
         # --- New variables for filtering ---
         self.show_mv_var = tk.BooleanVar(value=True)
@@ -296,6 +332,7 @@ class KpopDBBrowser(tk.Tk):
         self.show_url_only_var = tk.BooleanVar(value=True)
         self.show_local_var = tk.BooleanVar(value=True)  # Local file filter
         self.show_new_var = tk.BooleanVar(value=False)   # New record filter (score 0 or None)
+        self.show_unplayed_var = tk.BooleanVar(value=False)  # Never-played filter (play_count 0)
 
         # Create large checkbox images before widgets that use them
         self.checkbox_unchecked_img, self.checkbox_checked_img = self._create_checkbox_images(size=28, fg=BRIGHT_FG, bg=DARK_BG, accent=ACCENT)
@@ -304,6 +341,50 @@ class KpopDBBrowser(tk.Tk):
         self.load_artists() 
         self.load_performances()
 
+        # Keep the media_files index current in the background; moved files get their records re-pointed.
+        # Started once every drive has been mounted (or failed to), so it never indexes empty mount points.
+        self.library_watcher = library_watcher.LibraryWatcher(
+            on_moves=lambda moves: self.after(0, lambda: self._on_library_files_moved(moves)))
+        self.drive_mounts.mount_async()
+
+    def _on_drive_mount_status(self, mount_point, status):
+        """Called on the Tk thread when a drive's mount status changes."""
+        if self._closing or not self.winfo_exists(): return
+        drive_name = os.path.basename(mount_point)
+        if status == drive_mounts.STATUS_MOUNTED:
+            self.pre_wake_external_drives()
+            self._probe_unprobed_files()
+        elif status == drive_mounts.STATUS_FAILED:
+            self.status_var.set(f"Drive {drive_name} could not be mounted.")
+        prefix = mount_point.rstrip("/") + "/"
+        if status in (drive_mounts.STATUS_MOUNTED, drive_mounts.STATUS_FAILED):
+            self.path_resolver.invalidate_mount(mount_point)
+            self.path_resolver.probe_async(p for p in self._get_candidate_paths(self.all_performances_data) if p.startswith(prefix))
+        self._refresh_rows(lambda perf_data: (self._get_local_path(perf_data) or "").startswith(prefix))
+        if self.drive_mounts.all_settled():
+            self.library_watcher.start()
+            mounted = sum(1 for s in self.drive_mounts.status.values() if s == drive_mounts.STATUS_MOUNTED)
+            if status == drive_mounts.STATUS_MOUNTED:
+                self.status_var.set(f"{mounted}/{len(self.drive_mounts.status)} drive(s) mounted. Ready.")
+
+    def _refresh_rows(self, should_refresh):
+        """Re-renders the visible rows for which should_refresh(perf_data) is true, keeping the selection."""
+        selected = set(int(i) for i in self.listbox.curselection())
+        for idx, perf_data in enumerate(self.filtered_performances_data):
+            if not should_refresh(perf_data): continue
+            display_string, color = self._format_row(perf_data)
+            self.listbox.delete(idx)
+            self.listbox.insert(idx, display_string)
+            if color: self.listbox.itemconfig(idx, fg=color)
+            if idx in selected: self.listbox.selection_set(idx)
+
+    def _on_library_files_moved(self, moves):
+        """Called on the Tk thread after the library watcher re-pointed records to moved files."""
+        for old_path, new_path in moves:
+            db_operations.track_file_path_change(old_path, new_path)
+        self.status_var.set(f"Library: {len(moves)} moved file(s) re-linked.")
+        self.load_performances()
+
     def _create_checkbox_images(self, size=28, fg='#f8f8f2', bg='#222222', accent='#bd93f9'):
         """Create large checked and unchecked images for checkboxes with correct background."""
         from tkinter import PhotoImage
@@ -392,7 +473,7 @@ class KpopDBBrowser(tk.Tk):
                                            width=int(40*UI_SCALE))
         self.artist_dropdown.pack(side="left", padx=5, ipadx=5, ipady=6)
         self.artist_dropdown.bind("<<ComboboxSelected>>", lambda e: self.update_list(apply_current_sort=True))
-        # Enable keyboard navigation: jump to artist starting with typed letter
+        # Enable keyboard navigation: typed letters jump to the best matching artist
         self.artist_dropdown.bind("<KeyPress>", self.handle_artist_combo_keypress)
         
         ttk.Label(filter_frame, text="Date (YYYY or YYYY-MM):").pack(side="left", padx=(15,0))
@@ -414,6 +495,13 @@ class KpopDBBrowser(tk.Tk):
                                            font=checkbox_font, bg=DARK_BG, fg=BRIGHT_FG, activebackground=DARK_BG, activeforeground=BRIGHT_FG, highlightthickness=0, bd=0, selectcolor=DARK_BG, padx=8, pady=4,
                                            image=self.checkbox_unchecked_img, selectimage=self.checkbox_checked_img, indicatoron=False, compound='left')
         self.new_checkbox.pack(side="left", padx=(2, 10))
+
+        # Never-played records only
+        self.unplayed_checkbox = tk.Checkbutton(filter_frame, text="Unplayed", variable=self.show_unplayed_var, 
+                                                command=lambda: self.update_list(apply_current_sort=True),
+                                                font=checkbox_font, bg=DARK_BG, fg=BRIGHT_FG, activebackground=DARK_BG, activeforeground=BRIGHT_FG, highlightthickness=0, bd=0, selectcolor=DARK_BG, padx=8, pady=4,
+                                                image=self.checkbox_unchecked_img, selectimage=self.checkbox_checked_img, indicatoron=False, compound='left')
+        self.unplayed_checkbox.pack(side="left", padx=(2, 10))
         
         ttk.Label(filter_frame, text="Search:").pack(side="left", padx=(10,0))
         self.search_var = tk.StringVar()
@@ -434,6 +522,8 @@ class KpopDBBrowser(tk.Tk):
             {"name": "Show Type", "width": 22, "key": "show_type"},
             {"name": "Res", "width": 10, "key": "resolution"},
             {"name": "Score", "width": 6, "key": "score"},
+            {"name": "Plays", "width": 6, "key": "play_count"},
+            {"name": "Last Played", "width": 12, "key": "last_played"},
             {"name": "Source", "width": 12, "key": "source"}
         ]
         
@@ -490,6 +580,15 @@ class KpopDBBrowser(tk.Tk):
         self.listbox.pack(side="left", fill="both", expand=True)
         
         self.listbox.bind("<Double-Button-1>", lambda e: self.play_selected())
+        self.listbox.bind("<<ListboxSelect>>", lambda e: (self.pre_wake_selected_drives(), self.show_selected_preview()))
+
+        # Preview frames of the selected row (from the thumbnail cache)
+        self.preview_frame = tk.Frame(self, bg=DARK_BG); self.preview_frame.pack(fill="x", padx=10, pady=(0,5))
+        self.preview_labels = []
+        for _ in range(thumbnail_cache.FRAMES_PER_FILE):
+            label = tk.Label(self.preview_frame, bg=DARK_BG, fg=BRIGHT_FG, font=scale_font(("Arial", 11)))
+            label.pack(side="left", padx=(0, 6))
+            self.preview_labels.append(label)
         # --- Media type filters: MV, Performance, URL, Local ---
         media_filter_frame = ttk.Frame(self)
         media_filter_frame.pack(fill="x", padx=10, pady=(0,5))
@@ -553,6 +652,11 @@ class KpopDBBrowser(tk.Tk):
                                                     image=self.checkbox_unchecked_img, selectimage=self.checkbox_checked_img, indicatoron=False, compound='left')
         self.change_score_checkbox.pack(side="left", padx=(20, 0))
 
+        self.group_by_drive_checkbox = tk.Checkbutton(play_controls_frame, text="Group By Drive", variable=self.group_by_drive_var,
+                                                      font=checkbox_font, bg=DARK_BG, fg=BRIGHT_FG, activebackground=DARK_BG, activeforeground=BRIGHT_FG, highlightthickness=0, bd=0, selectcolor=DARK_BG, padx=8, pady=4,
+                                                      image=self.checkbox_unchecked_img, selectimage=self.checkbox_checked_img, indicatoron=False, compound='left')
+        self.group_by_drive_checkbox.pack(side="left", padx=(20, 0))
+
         # Status bar (packed last to ensure it's at the very bottom)
         status_font = scale_font(("Arial", 16, "bold")) 
         status = tk.Label(self, textvariable=self.status_var, relief="sunken", anchor="w", font=status_font, bg=ACCENT, fg=BRIGHT_FG, padx=int(8*UI_SCALE), pady=int(6*UI_SCALE))
@@ -598,34 +702,23 @@ class KpopDBBrowser(tk.Tk):
 
     def clear_search(self):
         self.search_var.set(""); self.artist_var.set(""); self.date_var.set(""); self.filter_4k_var.set(False)
-        self.show_mv_var.set(True); self.show_perf_var.set(True); self.show_url_only_var.set(True); self.show_local_var.set(True); self.show_new_var.set(False)
+        self.show_mv_var.set(True); self.show_perf_var.set(True); self.show_url_only_var.set(True); self.show_local_var.set(True); self.show_new_var.set(False); self.show_unplayed_var.set(False)
         self.update_list(apply_current_sort=True)
 
-    # New keyboard navigation handler for artist combobox
+    # Keyboard navigation for the artist combobox: type-ahead over the shared artist index
     def handle_artist_combo_keypress(self, event):
         if event.char and event.char.isalnum():
-            typed = event.char.lower()
-            values = self.artist_dropdown.cget("values")
-            if not values:
-                return
-            current = self.artist_var.get()
-            try:
-                idx = values.index(current)
-                start = (idx + 1) % len(values)
-            except ValueError:
-                start = 0
-            # Search forward from next index, then wrap around
-            for i in list(range(start, len(values))) + list(range(0, start)):
-                if values[i].lower().startswith(typed):
-                    self.artist_var.set(values[i])
-                    self.update_list(apply_current_sort=True)
-                    return
+            name = self.artist_type_ahead.feed(event.char, self.artist_var.get())
+            if name and name != self.artist_var.get():
+                self.artist_var.set(name)
+                self.update_list(apply_current_sort=True)
 
     def load_artists(self):
-        self.artists_list = db_operations.get_all_artists()
-        # Sort artist names alphabetically, ignoring case, then add blank at top
-        sorted_names = sorted([artist['name'] for artist in self.artists_list], key=lambda n: n.lower())
-        artist_names = [""] + sorted_names
+        self.artist_index = artist_search.get_artist_index()
+        self.artist_type_ahead = artist_search.TypeAhead(self.artist_index)
+        self.artists_list = self.artist_index.artists
+        # Names are already sorted alphabetically, ignoring case; add blank at top
+        artist_names = [""] + self.artist_index.names
         self.artist_dropdown["values"] = artist_names
         if artist_names:
             self.artist_var.set(artist_names[0])
@@ -634,8 +727,21 @@ class KpopDBBrowser(tk.Tk):
         self.status_var.set("Loading performances and music videos from database..."); self.update_idletasks()
         perf_rows = db_operations.get_all_performances_raw()
         mv_rows = db_operations.get_all_music_videos_raw()
+        play_stats = db_operations.get_play_stats()
+        probed_heights = db_operations.get_probed_heights()
 
-        self.all_performances_data = []
+        self.all_performances_data = self._build_records(perf_rows, mv_rows, play_stats, probed_heights)
+        self.update_list(apply_current_sort=True)
+        self.pre_wake_external_drives()
+        self._probe_unprobed_files()
+        # Drives still being mounted are probed once they are ready (see _on_drive_mount_status)
+        self.path_resolver.probe_async(p for p in self._get_candidate_paths(self.all_performances_data)
+                                       if self.drive_mounts.status_for_path(p) != drive_mounts.STATUS_PENDING)
+
+    def _build_records(self, perf_rows, mv_rows, play_stats, probed_heights):
+        """Turns raw performance and music video rows into the record dicts used by the list."""
+        records = []
+        now = datetime.datetime.now()  # One clock reading for every record's playlist weight
         # Process performances
         for row in perf_rows:
             perf_dict = {
@@ -645,9 +751,12 @@ class KpopDBBrowser(tk.Tk):
                 "artists_str": row[9] or "N/A", "songs_str": row[10] or "N/A",
                 "entry_type": "performance"
             }
-            path, is_yt = utils.get_playable_path_info(perf_dict)
+            path, is_yt, perf_dict["path_available"] = self.path_resolver.resolve(perf_dict)
             perf_dict["playable_path"] = path; perf_dict["is_youtube"] = is_yt
-            self.all_performances_data.append(perf_dict)
+            perf_dict["play_count"], perf_dict["last_played"] = play_stats.get(("performance", row[0]), (0, None))
+            perf_dict["pixel_height"] = probed_heights.get(path)
+            playlist_engine.set_item_weight(perf_dict, now)
+            records.append(perf_dict)
         # Process music videos
         for row in mv_rows:
             # Row now: mv_id, title, release_date, resolution, file_url, file_path1, file_path2, score, artists, songs
@@ -664,16 +773,74 @@ class KpopDBBrowser(tk.Tk):
                 "songs_str": row[9] if len(row) > 9 else "N/A",
                 "entry_type": "mv"
             }
-            # Fallback for legacy tuple length (if needed)
-            # The line that copied file_url to file_path1 has been removed.
-            # mv_dict["file_path1"] will now correctly be None if row[5] was None.
-            # The redundant fallback copying file_path1 to file_path2 for MVs (if file_path2 was None) has been removed.
-
-            path, is_yt = utils.get_playable_path_info(mv_dict)
+            path, is_yt, mv_dict["path_available"] = self.path_resolver.resolve(mv_dict)
             mv_dict["playable_path"] = path; mv_dict["is_youtube"] = is_yt
-            self.all_performances_data.append(mv_dict)
+            mv_dict["play_count"], mv_dict["last_played"] = play_stats.get(("mv", row[0]), (0, None))
+            mv_dict["pixel_height"] = probed_heights.get(path)
+            playlist_engine.set_item_weight(mv_dict, now)
+            records.append(mv_dict)
+        return records
+
+    def add_new_records(self, performance_ids=(), mv_ids=()):
+        """
+        Adds just-inserted records to the list without reloading the catalog: only the new ids are
+        queried, and they are placed where load_performances would have put them (performances,
+        then music videos, each newest first).
+        """
+        perf_rows = db_operations.get_all_performances_raw(performance_ids) if performance_ids else []
+        mv_rows = db_operations.get_all_music_videos_raw(mv_ids) if mv_ids else []
+        if not perf_rows and not mv_rows:
+            return
+        paths = [p for row in perf_rows + mv_rows for p in (row[5], row[6]) if p]
+        new_records = self._build_records(perf_rows, mv_rows, {}, db_operations.get_probed_heights(paths))
+        self.all_performances_data.extend(new_records)
+        # Both sorts are stable and the list is already in order, so this is close to linear
+        self.all_performances_data.sort(key=self._record_id_key, reverse=True)
+        self.all_performances_data.sort(key=lambda d: d.get("performance_date") if d.get("performance_date") != "N/A" else "", reverse=True)
+        self.all_performances_data.sort(key=lambda d: d.get("entry_type") == "mv")
         self.update_list(apply_current_sort=True)
-        self.pre_wake_external_drives()
+        self.path_resolver.probe_async(p for p in self._get_candidate_paths(new_records)
+                                       if self.drive_mounts.status_for_path(p) != drive_mounts.STATUS_PENDING)
+        self.status_var.set(f"{len(new_records)} new record(s) added. {len(self.filtered_performances_data)} records match your filters.")
+
+    @staticmethod
+    def _record_id_key(perf_data):
+        record_id = perf_data.get("performance_id")
+        return int(record_id[3:]) if isinstance(record_id, str) and record_id.startswith("mv_") else (record_id or 0)
+
+    @staticmethod
+    def _get_candidate_paths(perf_dicts):
+        return [p for d in perf_dicts for p in (d.get("file_path1"), d.get("file_path2")) if p]
+
+    def _on_paths_checked(self, paths):
+        """Re-resolves the records whose file availability changed and re-renders their rows."""
+        if self._closing or not self.winfo_exists(): return
+        paths = set(paths)
+        changed_ids = set()
+        for perf_data in self.all_performances_data:
+            if perf_data.get("file_path1") not in paths and perf_data.get("file_path2") not in paths: continue
+            path, is_yt, available = self.path_resolver.resolve(perf_data)
+            if (path, is_yt, available) != (perf_data.get("playable_path"), perf_data.get("is_youtube"), perf_data.get("path_available")):
+                perf_data["playable_path"], perf_data["is_youtube"], perf_data["path_available"] = path, is_yt, available
+                changed_ids.add(id(perf_data))
+        if changed_ids:
+            self._refresh_rows(lambda perf_data: id(perf_data) in changed_ids)
+
+    def _probe_unprobed_files(self):
+        """Probes local files that aren't in the media_probe cache yet (runs in the background)."""
+        self.media_probe_service.probe_missing_async(
+            d["playable_path"] for d in self.all_performances_data if self._get_local_path(d) and d.get("pixel_height") is None)
+
+    def _on_media_probed(self, results):
+        """Applies probe results (path -> info) to the loaded records; re-filters if the 4K filter depends on them."""
+        updated = False
+        for perf_data in self.all_performances_data:
+            info = results.get(perf_data.get("playable_path"))
+            if info and info.get("height"):
+                perf_data["pixel_height"] = info["height"]
+                updated = True
+        if updated and self.filter_4k_var.get():
+            self.update_list(apply_current_sort=True)
 
     def sort_list_by(self, column_key):
         """Sort the performance list by the specified column"""
@@ -701,6 +868,7 @@ class KpopDBBrowser(tk.Tk):
         show_url = self.show_url_only_var.get()
         show_local = self.show_local_var.get()
         show_new = self.show_new_var.get()
+        show_unplayed = self.show_unplayed_var.get()
         self.filtered_performances_data = []
         self.listbox.delete(0, tk.END)
         for perf_data in self.all_performances_data:
@@ -715,12 +883,17 @@ class KpopDBBrowser(tk.Tk):
             if artist_filter and artist_filter not in perf_data.get("artists_str", "").lower(): continue
             if date_filter and not perf_data.get("performance_date", "").startswith(date_filter): continue
             if filter_4k:
-                res_lower = perf_data.get("resolution", "").lower()
-                if not any(keyword in res_lower for keyword in self.RESOLUTION_HIGH_QUALITY_KEYWORDS): continue
+                pixel_height = perf_data.get("pixel_height")
+                if pixel_height:  # Probed local file: use the real height
+                    if pixel_height < media_probe.HIGH_QUALITY_MIN_HEIGHT: continue
+                else:
+                    res_lower = perf_data.get("resolution", "").lower()
+                    if not any(keyword in res_lower for keyword in self.RESOLUTION_HIGH_QUALITY_KEYWORDS): continue
             # Filter new records (score 0 or None)
             if show_new:
                 score_val = perf_data.get("score")
                 if score_val is not None and score_val != 0: continue
+            if show_unplayed and perf_data.get("play_count"): continue
             if not show_local and perf_data.get("file_url") is None:
                 continue  # Skip items without a URL if show_url_only is checked
 
@@ -741,39 +914,55 @@ class KpopDBBrowser(tk.Tk):
         
         # Populate the listbox with possibly sorted data
         for perf_data in self.filtered_performances_data:
-            # Format the display string
-            disp_date = perf_data.get("performance_date", "N/A")[:12]
-            disp_artists = perf_data.get("artists_str", "N/A")
-            disp_perf_title = perf_data.get("db_title", "N/A") 
-            # For MVs, show resolution; for performances, show show_type and resolution
-            if perf_data.get("entry_type") == "mv":
-                disp_show_type = ""
-                disp_res = perf_data.get("resolution", "")[:8]
-            else:
-                disp_show_type = perf_data.get("show_type", "N/A")
-                disp_res = perf_data.get("resolution", "N/A")[:8]
-            disp_score = str(perf_data.get("score")) if perf_data.get("score") is not None else ""
-            
-            source_text = "N/A"
-            if perf_data.get("playable_path"):
-                if perf_data.get("is_youtube"): source_text = "YouTube"
-                elif perf_data.get("file_url"): source_text = "Web URL"
-                else: source_text = "Local File"
-            
-            display_string = (f"{disp_date:<12} | {disp_artists:<30.30} | {disp_perf_title:<85.85} | "
-                            f"{disp_show_type:<20.20} | {disp_res:<8.8} | {disp_score:<5} | {source_text}")
-            
-            # Insert the entry and color music videos bright blue
+            display_string, color = self._format_row(perf_data)
             idx = self.listbox.size()
             self.listbox.insert(tk.END, display_string)
-            # Color music videos bright blue
-            if perf_data.get("entry_type") == "mv":
-                self.listbox.itemconfig(idx, fg="#8be9fd")
+            if color:
+                self.listbox.itemconfig(idx, fg=color)
             
         self.status_var.set(f"{len(self.filtered_performances_data)} records match your filters.")
 
+    def _format_row(self, perf_data):
+        """Returns (display string, foreground color or None) for one listbox row."""
+        disp_date = perf_data.get("performance_date", "N/A")[:12]
+        disp_artists = perf_data.get("artists_str", "N/A")
+        disp_perf_title = perf_data.get("db_title", "N/A") 
+        # For MVs, show resolution; for performances, show show_type and resolution
+        if perf_data.get("entry_type") == "mv":
+            disp_show_type = ""
+            disp_res = perf_data.get("resolution", "")[:8]
+        else:
+            disp_show_type = perf_data.get("show_type", "N/A")
+            disp_res = perf_data.get("resolution", "N/A")[:8]
+        disp_score = str(perf_data.get("score")) if perf_data.get("score") is not None else ""
+        disp_plays = str(perf_data.get("play_count") or "")
+        disp_last_played = (perf_data.get("last_played") or "")[:10]
+        
+        color = "#8be9fd" if perf_data.get("entry_type") == "mv" else None  # Music videos in bright blue
+        source_text = "N/A"
+        if perf_data.get("playable_path"):
+            if perf_data.get("is_youtube"): source_text = "YouTube"
+            elif perf_data.get("file_url"): source_text = "Web URL"
+            else:
+                source_text = "Local File"
+                local_path = self._get_local_path(perf_data)
+                mount_status = self.drive_mounts.status_for_path(local_path) if local_path else None
+                if mount_status == drive_mounts.STATUS_PENDING:
+                    source_text, color = "Local File (pending mount)", "#6272a4"
+                elif mount_status in (drive_mounts.STATUS_FAILED, drive_mounts.STATUS_UNMOUNTED):
+                    source_text, color = "Local File (drive not mounted)", "#6272a4"
+                elif perf_data.get("path_available") is False:
+                    source_text, color = "Local File (missing)", "#6272a4"
+        
+        display_string = (f"{disp_date:<12} | {disp_artists:<30.30} | {disp_perf_title:<85.85} | "
+                        f"{disp_show_type:<20.20} | {disp_res:<8.8} | {disp_score:<5} | {disp_plays:<5} | "
+                        f"{disp_last_played:<11} | {source_text}")
+        return display_string, color
+
     def play_selected(self):
         if self.play_button and self.play_button.cget('state') == tk.DISABLED:
+            if self.mpv_controller.is_playing() and self._active_playback_details is not None:
+                self.enqueue_selected(); return
             self.status_var.set("Playback operation already in progress..."); self.update_idletasks(); return
         
         selected_indices = self.listbox.curselection()
@@ -803,6 +992,10 @@ class KpopDBBrowser(tk.Tk):
                         youtube_urls_to_open.append(path_or_url)
                         all_perf_details_for_callbacks.append(perf_dict)
                     elif path_or_url: # Item is path-based (local file), as file_url was false/None
+                        if self.drive_mounts.status_for_path(path_or_url) == drive_mounts.STATUS_PENDING:
+                            skipped_items_info.append(f"Drive not mounted yet: {perf_dict.get('artists_str', 'N/A')} ({perf_dict.get('db_title', 'N/A')})"); continue
+                        if perf_dict.get("path_available") is False:
+                            skipped_items_info.append(f"File not found: {path_or_url}"); continue
                         local_files_to_play.append(path_or_url)
                         all_perf_details_for_callbacks.append(perf_dict)
                     # The message "Non-YouTube URL playback not directly supported" is removed
@@ -821,6 +1014,10 @@ class KpopDBBrowser(tk.Tk):
                  messagebox.showinfo("No Playable Items", "No valid local files or YouTube URLs selected for playback.", parent=self)
             return
         
+        if self.group_by_drive_var.get():
+            all_perf_details_for_callbacks = playlist_engine.order_by_drive(all_perf_details_for_callbacks, group_directories=True)
+            local_files_to_play = [d["playable_path"] for d in all_perf_details_for_callbacks if not d.get("file_url")]
+
         self.disable_play_buttons()
         
         status_parts = []
@@ -835,6 +1032,54 @@ class KpopDBBrowser(tk.Tk):
             daemon=True
         ).start()
 
+    def enqueue_selected(self):
+        """Appends the selected local files to the queue of the running mpv instance."""
+        paths, details = [], []
+        for index_str in self.listbox.curselection():
+            idx = int(index_str)
+            if 0 <= idx < len(self.filtered_performances_data):
+                perf_dict = self.filtered_performances_data[idx]
+                path = self._get_local_path(perf_dict)
+                if path and not perf_dict.get("file_url"):
+                    paths.append(path); details.append(perf_dict)
+        if not paths:
+            self.status_var.set("Only local files can be added to the running queue."); return
+        try:
+            self.mpv_controller.append(paths)
+        except OSError as e:
+            self.status_var.set(f"Could not add to queue: {e}"); return
+        self._active_playback_details.extend(details)
+        self._queued_items_by_path.update((d.get("playable_path"), d) for d in details)
+        self.playback_prefetcher.set_queue(self.mpv_controller.playlist)
+        if self.mpv_controller.current_index is not None:
+            self.playback_prefetcher.set_current(self.mpv_controller.current_index)
+        self.status_var.set(f"Queued {len(paths)} more file(s) ({len(self.mpv_controller.playlist)} in queue).")
+
+    def _on_mpv_item_start(self, index, path):
+        self.playback_prefetcher.set_current(index)
+        # Spin up the drive of the next item ahead of time (a no-op read if it's the same drive)
+        playlist = self.mpv_controller.playlist
+        if index + 1 < len(playlist):
+            self.drive_keep_warm.wake_for_paths([playlist[index + 1]])
+        if path and self.winfo_exists():
+            total = len(self.mpv_controller.playlist)
+            self.status_var.set(f"Playing local: {os.path.basename(path)} ({index + 1} of {total})")
+
+    def _on_mpv_item_end(self, path, reason, watched_seconds, duration):
+        if path:
+            self.drive_keep_warm.note_access([path])
+        perf_dict = self._queued_items_by_path.get(path)
+        if perf_dict:
+            self._note_play(perf_dict, watched_seconds, duration, reason)
+
+    def _note_play(self, perf_dict, watched_seconds, duration, end_reason):
+        """Logs a play event (written in the background) and updates the in-memory play stats."""
+        self.play_event_writer.record(perf_dict, watched_seconds, duration, end_reason, self._queue_source)
+        if play_history.is_counted_play(end_reason, watched_seconds):
+            perf_dict["play_count"] = (perf_dict.get("play_count") or 0) + 1
+            perf_dict["last_played"] = datetime.datetime.now().isoformat(timespec="seconds")
+            playlist_engine.set_item_weight(perf_dict)
+
     def play_random_videos(self):
         if self.play_random_button and self.play_random_button.cget('state') == tk.DISABLED:
             self.status_var.set("Playback operation already in progress..."); self.update_idletasks(); return
@@ -848,7 +1093,8 @@ class KpopDBBrowser(tk.Tk):
         if num_to_sample <= 0: messagebox.showinfo("Invalid Count", "Number of videos must be > 0.", parent=self); return
 
         actual_num_to_sample = min(num_to_sample, len(self.filtered_performances_data))
-        chosen_perf_dicts = random.sample(self.filtered_performances_data, k=actual_num_to_sample)
+        # Weighted by score and last play (see playlist_engine), spreading artists out
+        chosen_perf_dicts = playlist_engine.weighted_sample(self.filtered_performances_data, actual_num_to_sample)
         
         local_files_to_play, youtube_urls_to_open = [], []
         all_perf_details_for_callbacks = []
@@ -875,6 +1121,11 @@ class KpopDBBrowser(tk.Tk):
             messagebox.showinfo("No Playable Items", "No valid local video files or YouTube URLs found among random selection.", parent=self)
             self.status_var.set("Ready. No valid random items to play."); return
         
+        if self.group_by_drive_var.get():
+            # Keeps the shuffled order within each drive
+            all_perf_details_for_callbacks = playlist_engine.order_by_drive(all_perf_details_for_callbacks)
+            local_files_to_play = [d["playable_path"] for d in all_perf_details_for_callbacks if not d.get("file_url")]
+
         self.disable_play_buttons()
         self.status_var.set(f"Preparing {len(all_perf_details_for_callbacks)} random item(s)..."); self.update_idletasks()
 
@@ -901,18 +1152,27 @@ class KpopDBBrowser(tk.Tk):
         if local_file_paths_list:
             first_local_file, num_local = local_file_paths_list[0], len(local_file_paths_list)
             first_basename = os.path.basename(first_local_file)
-            mpv_proc = None
             try:
                 msg = f"Accessing local: {first_basename} (1 of {num_local}). Waking drive..."
                 if app_instance.winfo_exists(): app_instance.after(0, lambda: app_instance.status_var.set(msg))
                 with open(first_local_file, "rb") as f: f.read(1)
-                mpv_proc = subprocess.Popen([config.MPV_PLAYER_PATH, '--fs'] + local_file_paths_list)
-                mpv_played_count = num_local
+                app_instance.drive_keep_warm.note_access(local_file_paths_list)
+                # Warm the next items while the first one starts; mpv also prefetches each next entry itself
+                app_instance.playback_prefetcher.set_queue(local_file_paths_list)
+                app_instance.playback_prefetcher.set_current(0)
+                # Hand the queue to the persistent mpv and wait until it runs out (or the player is closed)
+                app_instance._local_playback_finished.clear()
+                app_instance._active_playback_details = all_processed_perf_details_dicts
+                app_instance._queued_items_by_path = {d.get("playable_path"): d for d in all_processed_perf_details_dicts}
+                app_instance._queue_source = "random" if is_random_source else "selected"
+                app_instance.mpv_controller.play(local_file_paths_list)
                 if app_instance.winfo_exists():
                     status = f"Playing local: {first_basename}" if num_local == 1 else \
-                             f"Playing {num_local} local files (starting with: {first_basename}). Waiting for player..."
+                             f"Playing {num_local} local files (starting with: {first_basename}). Double-click more rows to queue them."
                     app_instance.after(0, lambda: app_instance.status_var.set(status))
-                mpv_proc.wait()
+                app_instance._local_playback_finished.wait()
+                num_local = len(app_instance.mpv_controller.playlist)
+                mpv_played_count = num_local
                 if app_instance.winfo_exists(): app_instance.after(0, lambda: app_instance.status_var.set(f"Finished playing {num_local} local file(s)."))
             except FileNotFoundError:
                  if app_instance.winfo_exists():
@@ -925,9 +1185,7 @@ class KpopDBBrowser(tk.Tk):
                     app_instance.after(0, lambda: messagebox.showerror("Playback Error", err_msg, parent=app_instance))
                     app_instance.after(0, lambda: app_instance.status_var.set(f"Error playing local: {e}")); mpv_played_count = 0
             finally:
-                if mpv_proc and mpv_proc.poll() is None:
-                    try: mpv_proc.terminate()
-                    except: pass
+                app_instance._active_playback_details = None
         
         yt_played_count = 0
         if youtube_url_list:
@@ -938,6 +1196,7 @@ class KpopDBBrowser(tk.Tk):
                 mpv_proc = subprocess.Popen([config.MPV_PLAYER_PATH, '--fs'] + youtube_url_list)
                 mpv_proc.wait()
                 yt_played_count = num_yt
+                KpopDBBrowser._log_external_plays(app_instance, youtube_url_list, all_processed_perf_details_dicts, is_random_source)
                 if app_instance.winfo_exists():
                     app_instance.after(0, lambda: app_instance.status_var.set(f"Finished playing {yt_played_count} YouTube video(s)."))
 
@@ -948,6 +1207,7 @@ class KpopDBBrowser(tk.Tk):
                 for url in youtube_url_list:
                     webbrowser.open_new_tab(url)
                     yt_played_count += 1
+                KpopDBBrowser._log_external_plays(app_instance, youtube_url_list, all_processed_perf_details_dicts, is_random_source)
                 if app_instance.winfo_exists():
                     app_instance.after(0, lambda: app_instance.status_var.set(f"{yt_played_count} YouTube URLs opened in browser."))
 
@@ -1075,8 +1335,8 @@ class KpopDBBrowser(tk.Tk):
             return
         
         def get_sort_key(item):
-            if self.sort_column == "score":
-                # Score requires special handling as it might be None or numeric
+            if self.sort_column in ("score", "play_count"):
+                # Score/play count require special handling as they might be None or numeric
                 val = item.get(self.sort_column)
                 if val is None:
                     return -1 if self.sort_ascending else float('inf')
@@ -1106,60 +1366,98 @@ class KpopDBBrowser(tk.Tk):
             key=get_sort_key,
             reverse=not self.sort_ascending
         )
+        playlist_engine.invalidate_sample_cache()  # Its tree is indexed by position in this list
     
+    @staticmethod
+    def _log_external_plays(app_instance, urls, perf_dicts, is_random_source):
+        """Logs URL items (no per-item progress is available for them) from the playback thread."""
+        url_set = set(urls)
+        played = [d for d in perf_dicts if d.get("playable_path") in url_set]
+        def log():
+            app_instance._queue_source = "random" if is_random_source else "selected"
+            for perf_dict in played:
+                app_instance._note_play(perf_dict, None, None, "external")
+        if app_instance.winfo_exists(): app_instance.after(0, log)
+
     def pre_wake_external_drives(self):
+        """Registers every known local path with the keep-warm scheduler and wakes all drives in parallel."""
         if not self.all_performances_data: return
-        
-        local_paths_for_wake = []
-        for perf_data in self.all_performances_data:
-            playable_path = perf_data.get("playable_path")
-            is_url = perf_data.get("file_url") and playable_path == perf_data.get("file_url")
-            # Only add if playable_path is a string (not int/None)
-            if playable_path and not is_url and isinstance(playable_path, str):
-                local_paths_for_wake.append(playable_path)
+        local_paths_for_wake = [p for p in (self._get_local_path(d) for d in self.all_performances_data) if p]
         if not local_paths_for_wake: return
 
-        unique_dirs = sorted(list(set(os.path.dirname(p) for p in local_paths_for_wake if isinstance(p, str) and os.path.dirname(p))))
-        if not unique_dirs: return
-
-        dirs_to_ping = []
-        if unique_dirs:
-            dirs_to_ping.append(unique_dirs[0])
-            if len(unique_dirs) > 2: 
-                mid_idx = len(unique_dirs) // 2
-                if unique_dirs[mid_idx] != dirs_to_ping[0] and not unique_dirs[mid_idx].startswith(dirs_to_ping[0] + os.sep):
-                    dirs_to_ping.append(unique_dirs[mid_idx])
-            if len(unique_dirs) > 1: 
-                last_dir = unique_dirs[-1]
-                if not any(last_dir == ed or last_dir.startswith(ed + os.sep) for ed in dirs_to_ping):
-                    dirs_to_ping.append(last_dir)
-        
-        dirs_to_ping = sorted(list(set(dirs_to_ping)))[:3]
-        if not dirs_to_ping: return
-            
-        disp_dirs = ", ".join([os.path.basename(p) if os.path.basename(p) else p for p in dirs_to_ping])
+        self.drive_keep_warm.set_paths(local_paths_for_wake)
         current_status = self.status_var.get()
         if not any(s in current_status for s in ["Loading", "Playing", "Accessing"]):
-             self.status_var.set(f"Pre-waking drives (e.g., {disp_dirs})..."); self.update_idletasks()
-        
-        threading.Thread(target=KpopDBBrowser._execute_pre_wake, args=(dirs_to_ping, self), daemon=True).start()
+            self.status_var.set(f"Pre-waking {len(self.drive_keep_warm.samples)} drive(s)..."); self.update_idletasks()
+        self.drive_keep_warm.start()
+
+    def pre_wake_selected_drives(self):
+        """Wakes the drive(s) holding the selected rows so playback doesn't wait for spin-up."""
+        paths = []
+        for index_str in self.listbox.curselection():
+            idx = int(index_str)
+            if 0 <= idx < len(self.filtered_performances_data):
+                path = self._get_local_path(self.filtered_performances_data[idx])
+                if path: paths.append(path)
+        if paths:
+            self.drive_keep_warm.wake_for_paths(paths)
+            self.path_resolver.probe_async(paths)  # Re-checks the selected files if their cached state has expired
+
+    def show_selected_preview(self):
+        """Shows cached preview frames for a single selected local row, or queues their extraction."""
+        selection = self.listbox.curselection()
+        path = None
+        if len(selection) == 1 and 0 <= int(selection[0]) < len(self.filtered_performances_data):
+            path = self._get_local_path(self.filtered_performances_data[int(selection[0])])
+        self._preview_path = path
+        if not path:
+            self._set_preview_frames(None)
+            return
+        frames = self.thumbnail_service.cached_frames(path, db_operations.get_db_connection())
+        if frames:
+            self._set_preview_frames(frames)
+        else:
+            self._set_preview_frames(None, "Loading preview...")
+            self.thumbnail_service.request(path)
+
+    def _on_thumbnails_ready(self, path, frames):
+        if not self.winfo_exists() or path != self._preview_path: return  # Selection moved on
+        self._set_preview_frames(frames, None if frames else "No preview available.")
+
+    def _set_preview_frames(self, frames, message=None):
+        self._preview_images = []
+        for i, label in enumerate(self.preview_labels):
+            image = None
+            if frames and i < len(frames):
+                try:
+                    image = tk.PhotoImage(file=frames[i]).subsample(2)
+                except tk.TclError:
+                    image = None  # Truncated or evicted while loading
+            if image is not None:
+                self._preview_images.append(image)
+                label.configure(image=image, text="")
+            else:
+                label.configure(image="", text=message if (i == 0 and message) else "")
 
     @staticmethod
-    def _execute_pre_wake(dir_paths, app_instance): 
-        if not app_instance.winfo_exists(): return
-        woken, errors = 0, 0
-        for d_path in dir_paths:
-            try:
-                if os.path.isdir(d_path): os.listdir(d_path); woken += 1
-            except Exception: errors += 1
-        
-        if app_instance.winfo_exists():
-            current_status = app_instance.status_var.get()
-            if not any(s in current_status for s in ["Loading", "Playing", "Accessing"]):
-                msg = f"Pre-wake: {woken} paths accessed."
-                if errors > 0: msg += f" ({errors} issues)."
-                else: msg += " Ready."
-                app_instance.after(0, lambda: app_instance.status_var.set(msg))
+    def _get_local_path(perf_data):
+        playable_path = perf_data.get("playable_path")
+        is_url = perf_data.get("file_url") and playable_path == perf_data.get("file_url")
+        # Only local string paths (not int/None or URLs)
+        if playable_path and not is_url and isinstance(playable_path, str):
+            return playable_path
+        return None
+
+    def _on_drive_woken(self, mount_point, latency, ok):
+        if not self.winfo_exists(): return
+        current_status = self.status_var.get()
+        if any(s in current_status for s in ["Loading", "Playing", "Accessing"]): return
+        drive_name = os.path.basename(mount_point) or mount_point
+        if ok and latency < 0.5: return  # Already spinning; don't flood the status bar with keep-warm reads
+        if ok:
+            self.status_var.set(f"Drive {drive_name} awake (spin-up {latency:.1f}s). Ready.")
+        else:
+            self.status_var.set(f"Drive {drive_name} not reachable ({latency:.1f}s).")
 
     def update_artists_from_spotify(self):
         base_dir = os.path.dirname(__file__)
@@ -1168,7 +1466,8 @@ class KpopDBBrowser(tk.Tk):
         try:
             subprocess.run([sys.executable, album_importer], check=True)
             subprocess.run([sys.executable, artist_info_importer], check=True)
-            self.load_initial_data()
+            artist_search.invalidate_artist_index()  # The importers add and update artists
+            self.load_artists()
             messagebox.showinfo("Artists Updated", "Artists have been updated and enriched from Spotify.", parent=self)
         except subprocess.CalledProcessError as e:
             messagebox.showerror("Error", f"Failed to update artists from Spotify.\n\nScript exited with code {e.returncode}. See terminal for details.", parent=self)
@@ -1189,21 +1488,17 @@ class KpopDBBrowser(tk.Tk):
     
     
     def on_closing(self): 
-        # Unmount drives at exit
-        unmount_script = os.path.expanduser("./unmount_kpop_drives.sh")
-        try:
-            unmount_res = subprocess.run(['sudo', unmount_script], capture_output=True, text=True)
-            # If exit code is zero or stdout indicates success, show info; otherwise warn or error
-            stdout = unmount_res.stdout or ''
-            stderr = unmount_res.stderr or ''
-            if unmount_res.returncode == 0 or "All mounted K-Pop drives unmounted successfully" in stdout:
-                messagebox.showinfo("Unmount Drives", "K-Pop drives unmounted successfully.")
-            elif stderr:
-                messagebox.showerror("Unmount Drives Error", f"Unmount script reported errors:\n{stderr}")
-            else:
-                messagebox.showwarning("Unmount Drives", "Unmount script exited with non-zero status but provided no error details.")
-        except Exception as unmount_exc:
-            messagebox.showerror("Unmount Drives Exception", f"Error running unmount script: {unmount_exc}")
+        self._closing = True
+        # Stop watching and keeping the drives warm before they are unmounted
+        self.library_watcher.stop()
+        self.drive_keep_warm.stop()
+        self.playback_prefetcher.stop()
+        self.mpv_controller.shutdown()
+        self._local_playback_finished.set()
+        self.play_event_writer.close()
+        self.media_probe_service.stop()
+        self.thumbnail_service.stop()
+        self.path_resolver.stop()
         if self.score_editor_window and self.score_editor_window.winfo_exists():
             self.score_editor_window.cancel() 
             if self.score_editor_window and self.score_editor_window.winfo_exists():
@@ -1215,7 +1510,16 @@ class KpopDBBrowser(tk.Tk):
             self.data_entry_window_instance = None
 
         db_operations.close_db_connection()
-        
+
+        # Unmount drives in the background; the window goes away now and is destroyed once that finishes
+        self.withdraw()
+        self.drive_mounts.unmount_async(on_done=lambda ok, message: self.after(0, lambda: self._finish_closing(ok, message)))
+
+    def _finish_closing(self, unmount_ok, unmount_message):
+        if unmount_ok:
+            print("K-Pop drives unmounted successfully.")
+        else:
+            messagebox.showerror("Unmount Drives Error", f"Unmount script reported errors:\n{unmount_message or 'no details'}")
         try:
             super().destroy() 
         except tk.TclError as e:
@@ -1225,16 +1529,6 @@ class KpopDBBrowser(tk.Tk):
 
 if __name__ == "__main__":
     try:
-        # Mount drives at startup
-        mount_script = os.path.expanduser("./mount_kpop_drives.sh")
-        try:
-            mount_res = subprocess.run(['sudo', mount_script], capture_output=True, text=True)
-            if mount_res.returncode == 0:
-                messagebox.showinfo("Mount Drives", "K-Pop drives mounted successfully.")
-            else:
-                messagebox.showerror("Mount Drives Error", f"Mount script failed:\n{mount_res.stderr}")
-        except Exception as mount_exc:
-            messagebox.showerror("Mount Drives Exception", f"Error running mount script: {mount_exc}")
         app = KpopDBBrowser() 
         app.protocol("WM_DELETE_WINDOW", app.on_closing)
         app.mainloop()
@@ -0,0 +1,187 @@
+# media_fingerprints.py
+# Content fingerprints for the files in media_files (see library_watcher.py).
+# A fingerprint is the file size plus a hash of its first and last FINGERPRINT_CHUNK_BYTES,
+# which is cheap to compute on slow USB drives and survives renames and cross-drive copies.
+# Fingerprints are stored per file and per record, so a record whose file disappeared can be
+# re-pointed to the same content elsewhere, and identical files across drives are flagged.
+import os
+import hashlib
+import threading
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import library_watcher
+
+FINGERPRINT_CHUNK_BYTES = 1024 * 1024
+MAX_HASH_WORKERS = 6
+MAX_READS_PER_DEVICE = 2  # Concurrent reads per physical drive; more just makes spinning disks seek
+HASH_BATCH_SIZE = 200
+
+_device_semaphores = {}
+_device_semaphores_lock = threading.Lock()
+
+
+def ensure_fingerprint_tables(conn):
+    """Adds the fingerprint columns to media_files and creates the per-record fingerprint table."""
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(media_files)").fetchall()}
+    for column, col_type in (("fingerprint", "TEXT"), ("fingerprint_size", "INTEGER"),
+                             ("fingerprint_mtime", "REAL"), ("duplicate", "INTEGER NOT NULL DEFAULT 0")):
+        if column not in existing:
+            conn.execute(f"ALTER TABLE media_files ADD COLUMN {column} {col_type}")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_media_files_fingerprint ON media_files(fingerprint)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS record_fingerprints (
+            entry_type TEXT NOT NULL, -- 'performance' or 'mv'
+            record_id INTEGER NOT NULL,
+            fingerprint TEXT NOT NULL,
+            PRIMARY KEY (entry_type, record_id)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_record_fingerprints_fingerprint ON record_fingerprints(fingerprint)")
+    conn.commit()
+
+
+def _get_device_semaphore(device):
+    with _device_semaphores_lock:
+        if device not in _device_semaphores:
+            _device_semaphores[device] = threading.Semaphore(MAX_READS_PER_DEVICE)
+        return _device_semaphores[device]
+
+
+def compute_fingerprint(path, size, device=None):
+    """Returns '<size>:<blake2b of head+tail>' for path, or None if it cannot be read."""
+    with _get_device_semaphore(device):
+        try:
+            digest = hashlib.blake2b(digest_size=16)
+            with open(path, "rb") as f:
+                digest.update(f.read(FINGERPRINT_CHUNK_BYTES))
+                if size > FINGERPRINT_CHUNK_BYTES:
+                    f.seek(max(FINGERPRINT_CHUNK_BYTES, size - FINGERPRINT_CHUNK_BYTES))
+                    digest.update(f.read(FINGERPRINT_CHUNK_BYTES))
+        except OSError as e:
+            print(f"Fingerprint: cannot read {path}: {e}")
+            return None
+    return f"{size}:{digest.hexdigest()}"
+
+
+def update_fingerprints(conn, stop_event=None):
+    """
+    Hashes files that are new or whose size/mtime changed since they were last fingerprinted.
+    Hashing runs in a thread pool; results are written from the calling thread in batches.
+    Returns the number of files hashed.
+    """
+    pending = conn.execute("""
+        SELECT path, size, mtime, device FROM media_files
+        WHERE missing = 0 AND (fingerprint IS NULL OR fingerprint_size IS NOT size OR fingerprint_mtime IS NOT mtime)
+    """).fetchall()
+    if not pending:
+        return 0
+    print(f"Fingerprint: hashing {len(pending)} new or changed file(s)...")
+    hashed = 0
+    with ThreadPoolExecutor(max_workers=MAX_HASH_WORKERS) as executor:
+        for start in range(0, len(pending), HASH_BATCH_SIZE):
+            if stop_event is not None and stop_event.is_set():
+                break
+            batch = pending[start:start + HASH_BATCH_SIZE]
+            fingerprints = executor.map(lambda row: compute_fingerprint(row[0], row[1], row[3]), batch)
+            updates = [(fp, size, mtime, path) for (path, size, mtime, _), fp in zip(batch, fingerprints) if fp]
+            conn.executemany(
+                "UPDATE media_files SET fingerprint = ?, fingerprint_size = ?, fingerprint_mtime = ? WHERE path = ?",
+                updates)
+            conn.commit()
+            hashed += len(updates)
+    return hashed
+
+
+def store_record_fingerprints(conn):
+    """Copies the fingerprints of linked, present files onto their records."""
+    conn.execute("""
+        INSERT OR REPLACE INTO record_fingerprints (entry_type, record_id, fingerprint)
+        SELECT 'performance', performance_id, fingerprint FROM media_files
+        WHERE missing = 0 AND performance_id IS NOT NULL AND fingerprint IS NOT NULL
+    """)
+    conn.execute("""
+        INSERT OR REPLACE INTO record_fingerprints (entry_type, record_id, fingerprint)
+        SELECT 'mv', mv_id, fingerprint FROM media_files
+        WHERE missing = 0 AND mv_id IS NOT NULL AND fingerprint IS NOT NULL
+    """)
+    conn.commit()
+
+
+def repair_moved_records(conn, roots=None):
+    """
+    Re-points records whose file is missing to an unlinked file with the same fingerprint.
+    Returns a list of (old_path, new_path).
+    """
+    moves = []
+    for entry_type, record_id, old_path in library_watcher.get_orphaned_records(conn, roots):
+        candidates = [row[0] for row in conn.execute("""
+            SELECT m.path FROM record_fingerprints r
+            JOIN media_files m ON m.fingerprint = r.fingerprint
+            WHERE r.entry_type = ? AND r.record_id = ?
+              AND m.missing = 0 AND m.performance_id IS NULL AND m.mv_id IS NULL
+            ORDER BY m.last_seen_at DESC
+        """, (entry_type, record_id)).fetchall()]
+        if not candidates:
+            continue
+        # Prefer a copy that kept its file name (a plain move), otherwise the most recently seen one
+        same_name = [p for p in candidates if os.path.basename(p) == os.path.basename(old_path)]
+        new_path = (same_name or candidates)[0]
+        if entry_type == "performance":
+            library_watcher.repoint_records(conn, old_path, new_path, record_id, None)
+            conn.execute("UPDATE media_files SET performance_id = ? WHERE path = ?", (record_id, new_path))
+        else:
+            library_watcher.repoint_records(conn, old_path, new_path, None, record_id)
+            conn.execute("UPDATE media_files SET mv_id = ? WHERE path = ?", (record_id, new_path))
+        print(f"Fingerprint: re-pointed {entry_type} {record_id}: {old_path} -> {new_path}")
+        moves.append((old_path, new_path))
+    conn.commit()
+    return moves
+
+
+def flag_duplicates(conn):
+    """Sets media_files.duplicate for present files whose fingerprint occurs more than once. Returns the count."""
+    conn.execute("UPDATE media_files SET duplicate = 0 WHERE duplicate = 1")
+    cursor = conn.execute("""
+        UPDATE media_files SET duplicate = 1
+        WHERE missing = 0 AND fingerprint IN (
+            SELECT fingerprint FROM media_files
+            WHERE missing = 0 AND fingerprint IS NOT NULL
+            GROUP BY fingerprint HAVING COUNT(*) > 1
+        )
+    """)
+    conn.commit()
+    return cursor.rowcount
+
+
+def get_duplicate_groups(conn):
+    """Returns {fingerprint: [path, ...]} for the flagged duplicates."""
+    groups = {}
+    for fingerprint, path in conn.execute(
+            "SELECT fingerprint, path FROM media_files WHERE duplicate = 1 ORDER BY fingerprint, path").fetchall():
+        groups.setdefault(fingerprint, []).append(path)
+    return groups
+
+
+def run_fingerprint_job(conn, stop_event=None, roots=None):
+    """Incremental fingerprint pass: hash new/changed files, repair moved records, flag duplicates. Returns the moves."""
+    ensure_fingerprint_tables(conn)
+    update_fingerprints(conn, stop_event)
+    store_record_fingerprints(conn)
+    moves = repair_moved_records(conn, roots)
+    store_record_fingerprints(conn)
+    flag_duplicates(conn)
+    return moves
+
+
+if __name__ == "__main__":
+    import sys
+    import config
+    conn = sqlite3.connect(sys.argv[1] if len(sys.argv) > 1 else config.DATABASE_FILE)
+    library_watcher.ensure_media_files_table(conn)
+    run_fingerprint_job(conn)
+    for fingerprint, paths in get_duplicate_groups(conn).items():
+        print(f"Duplicate content ({fingerprint.split(':')[0]} bytes):")
+        for path in paths:
+            print(f"    {path}")
+    conn.close()
@@ -0,0 +1,352 @@
+# media_probe.py
+# Technical metadata (pixel size, duration, video codec) for local media files, cached in the
+# media_probe table keyed by path and validated against the file's size and mtime.
+# Files are probed with ffprobe when it is installed, otherwise with a small MP4/MOV and
+# Matroska/WebM header parser; bulk probing runs in a process pool.
+import os
+import json
+import sqlite3
+import struct
+import subprocess
+import threading
+import datetime
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import config
+
+FFPROBE_PATH = "ffprobe"
+FFPROBE_TIMEOUT_SECONDS = 30
+MAX_PROBE_WORKERS = 2  # Probing is I/O bound on the USB drives; more workers only add seeks
+HIGH_QUALITY_MIN_HEIGHT = 2160
+
+
+def ensure_media_probe_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS media_probe (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime REAL NOT NULL,
+            width INTEGER,
+            height INTEGER,
+            duration REAL,
+            video_codec TEXT,
+            container TEXT,
+            probed_at TEXT
+        )
+    """)
+    conn.commit()
+
+
+def resolution_label(height):
+    """Returns the label used in the resolution field for a pixel height (e.g. 2160 -> '4K')."""
+    if not height:
+        return ""
+    if height >= 2160: return "4K"
+    if height >= 1440: return "1440p"
+    if height >= 1080: return "1080p"
+    if height >= 720: return "720p"
+    return f"{height}p"
+
+
+# --- Probing (runs in worker processes) ---
+
+def _probe_with_ffprobe(path):
+    try:
+        result = subprocess.run(
+            [FFPROBE_PATH, "-v", "error", "-select_streams", "v:0",
+             "-show_entries", "stream=width,height,codec_name:format=duration,format_name",
+             "-of", "json", path],
+            capture_output=True, text=True, timeout=FFPROBE_TIMEOUT_SECONDS)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0:
+        return None
+    try:
+        data = json.loads(result.stdout)
+    except ValueError:
+        return None
+    stream = (data.get("streams") or [{}])[0]
+    fmt = data.get("format") or {}
+    try:
+        duration = float(fmt["duration"]) if fmt.get("duration") else None
+    except ValueError:
+        duration = None
+    return {"width": stream.get("width"), "height": stream.get("height"), "duration": duration,
+            "video_codec": stream.get("codec_name"), "container": fmt.get("format_name")}
+
+
+def _iter_mp4_boxes(f, start, end):
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack(">I4s", header)
+        header_len = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header_len = 16
+        elif size == 0:
+            size = end - pos
+        if size < header_len:
+            return
+        yield box_type, pos + header_len, pos + size
+        pos += size
+
+
+def _probe_mp4(f, file_size):
+    info = {"container": "mp4"}
+    for box_type, body, box_end in _iter_mp4_boxes(f, 0, file_size):
+        if box_type != b"moov":
+            continue
+        for sub_type, sub_body, sub_end in _iter_mp4_boxes(f, body, box_end):
+            if sub_type == b"mvhd":
+                f.seek(sub_body)
+                version = f.read(1)[0]
+                f.seek(sub_body + (20 if version == 1 else 12))
+                if version == 1:
+                    timescale, duration = struct.unpack(">IQ", f.read(12))
+                else:
+                    timescale, duration = struct.unpack(">II", f.read(8))
+                if timescale:
+                    info["duration"] = duration / timescale
+            elif sub_type == b"trak":
+                width = height = None
+                handler = codec = None
+                for trak_type, trak_body, trak_end in _iter_mp4_boxes(f, sub_body, sub_end):
+                    if trak_type == b"tkhd":
+                        # Width/height are the last 8 bytes of tkhd, as 16.16 fixed point
+                        f.seek(trak_end - 8)
+                        width, height = (v >> 16 for v in struct.unpack(">II", f.read(8)))
+                    elif trak_type == b"mdia":
+                        for mdia_type, mdia_body, mdia_end in _iter_mp4_boxes(f, trak_body, trak_end):
+                            if mdia_type == b"hdlr":
+                                f.seek(mdia_body + 8)
+                                handler = f.read(4)
+                            elif mdia_type == b"minf":
+                                codec = _find_mp4_sample_entry(f, mdia_body, mdia_end)
+                if handler == b"vide" and height:
+                    info.update(width=width, height=height, video_codec=codec)
+        break
+    return info if "height" in info or "duration" in info else None
+
+
+def _find_mp4_sample_entry(f, start, end):
+    """minf -> stbl -> stsd: returns the first sample entry's fourcc (e.g. 'avc1', 'hev1')."""
+    for box_type, body, box_end in _iter_mp4_boxes(f, start, end):
+        if box_type == b"stbl":
+            for stbl_type, stbl_body, _ in _iter_mp4_boxes(f, body, box_end):
+                if stbl_type == b"stsd":
+                    f.seek(stbl_body + 8 + 4)  # version/flags + entry count, then the entry's size
+                    return f.read(4).decode("latin-1")
+    return None
+
+
+def _read_ebml_vint(f, keep_marker):
+    first = f.read(1)
+    if not first:
+        raise EOFError
+    byte = first[0]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not (byte & mask):
+        mask >>= 1
+        length += 1
+    value = byte if keep_marker else byte & (mask - 1)
+    for b in f.read(length - 1):
+        value = (value << 8) | b
+    return value, length
+
+
+def _iter_ebml(f, start, end):
+    pos = start
+    while pos < end:
+        f.seek(pos)
+        try:
+            element_id, id_len = _read_ebml_vint(f, True)
+            size, size_len = _read_ebml_vint(f, False)
+        except EOFError:
+            return
+        body = pos + id_len + size_len
+        if size == (1 << (7 * size_len)) - 1:  # Unknown size (live-written segment)
+            size = end - body
+        yield element_id, body, size
+        pos = body + size
+
+
+def _read_ebml_uint(f, body, size):
+    f.seek(body)
+    return int.from_bytes(f.read(size), "big")
+
+
+def _probe_matroska(f, file_size):
+    info = {"container": "matroska"}
+    timecode_scale, raw_duration = 1000000, None
+    for element_id, body, size in _iter_ebml(f, 0, file_size):
+        if element_id != 0x18538067:  # Segment
+            continue
+        for seg_id, seg_body, seg_size in _iter_ebml(f, body, body + size):
+            if seg_id == 0x1549A966:  # Info
+                for info_id, info_body, info_size in _iter_ebml(f, seg_body, seg_body + seg_size):
+                    if info_id == 0x2AD7B1:  # TimecodeScale
+                        timecode_scale = _read_ebml_uint(f, info_body, info_size)
+                    elif info_id == 0x4489:  # Duration (float)
+                        f.seek(info_body)
+                        raw_duration = struct.unpack(">f" if info_size == 4 else ">d", f.read(info_size))[0]
+            elif seg_id == 0x1654AE6B:  # Tracks
+                for track_id, track_body, track_size in _iter_ebml(f, seg_body, seg_body + seg_size):
+                    if track_id != 0xAE:  # TrackEntry
+                        continue
+                    codec = None
+                    for entry_id, entry_body, entry_size in _iter_ebml(f, track_body, track_body + track_size):
+                        if entry_id == 0x86:  # CodecID
+                            f.seek(entry_body)
+                            codec = f.read(entry_size).decode("latin-1").rstrip("\x00")
+                        elif entry_id == 0xE0 and "height" not in info:  # Video
+                            for v_id, v_body, v_size in _iter_ebml(f, entry_body, entry_body + entry_size):
+                                if v_id == 0xB0: info["width"] = _read_ebml_uint(f, v_body, v_size)
+                                elif v_id == 0xBA: info["height"] = _read_ebml_uint(f, v_body, v_size)
+                            info["video_codec"] = codec
+            elif seg_id == 0x1F43B675:  # Cluster: the headers are done
+                break
+        break
+    if raw_duration is not None:
+        info["duration"] = raw_duration * timecode_scale / 1e9
+    return info if "height" in info or "duration" in info else None
+
+
+def _probe_headers(path):
+    try:
+        file_size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            magic = f.read(12)
+            if magic[:4] == b"\x1a\x45\xdf\xa3":
+                return _probe_matroska(f, file_size)
+            if magic[4:8] in (b"ftyp", b"moov", b"mdat", b"free", b"wide"):
+                return _probe_mp4(f, file_size)
+    except (OSError, struct.error, IndexError, ValueError, EOFError) as e:
+        print(f"Probe: could not parse headers of {path}: {e}")
+    return None
+
+
+def probe_file(path):
+    """Returns (path, info) where info is a dict of width/height/duration/video_codec/container, or None."""
+    info = _probe_with_ffprobe(path)
+    if info is None or not info.get("height"):
+        info = _probe_headers(path) or info
+    return path, info
+
+
+# --- Cache ---
+
+def get_cached_probe(conn, path):
+    """Returns the cached info for path if its size and mtime still match, otherwise None."""
+    try:
+        st = os.stat(path)
+        row = conn.execute(
+            "SELECT width, height, duration, video_codec, container FROM media_probe WHERE path = ? AND size = ? AND mtime = ?",
+            (path, st.st_size, st.st_mtime)).fetchone()
+    except (OSError, sqlite3.Error):
+        return None
+    if not row:
+        return None
+    return dict(zip(("width", "height", "duration", "video_codec", "container"), row))
+
+
+def store_probe(conn, path, info):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return
+    info = info or {}
+    conn.execute(
+        "INSERT OR REPLACE INTO media_probe (path, size, mtime, width, height, duration, video_codec, container, probed_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (path, st.st_size, st.st_mtime, info.get("width"), info.get("height"), info.get("duration"),
+         info.get("video_codec"), info.get("container"), datetime.datetime.now().isoformat(timespec="seconds")))
+
+
+class ProbeService:
+    """
+    Probes files that are missing from (or stale in) the cache in a process pool, from a
+    background thread with its own connection. on_probed(results) receives {path: info}
+    for each finished batch; UI callers must marshal it to the Tk thread.
+    """
+    def __init__(self, db_file=None, on_probed=None):
+        self.db_file = db_file or config.DATABASE_FILE
+        self.on_probed = on_probed
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._running = False
+        self._pending = {}  # Paths queued while a run was going, in order (dict used as an ordered set)
+
+    def probe_missing_async(self, paths):
+        """Starts a background probe of paths; while a run is going they are queued for the next one."""
+        paths = list(paths)
+        if not paths:
+            return
+        with self._lock:
+            if self._running:
+                self._pending.update(dict.fromkeys(paths))
+                return
+            self._running = True
+        threading.Thread(target=self._run_queue, args=(paths,), name="MediaProbe", daemon=True).start()
+
+    def _run_queue(self, paths):
+        """Runs paths, then whatever was queued meanwhile, until nothing is left."""
+        while paths:
+            try:
+                self._run(paths)
+            except Exception as e:
+                print(f"Probe: run failed: {e}")
+            with self._lock:
+                paths = [] if self._stop_event.is_set() else list(self._pending)
+                self._pending.clear()
+                if not paths:
+                    self._running = False
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _run(self, paths):
+        try:
+            conn = sqlite3.connect(self.db_file, timeout=30)
+            ensure_media_probe_table(conn)
+            cached = {}
+            for path, size, mtime in conn.execute("SELECT path, size, mtime FROM media_probe"):
+                cached[path] = (size, mtime)
+        except sqlite3.Error as e:
+            print(f"Probe: database error: {e}")
+            return
+        to_probe = []
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue  # Drive not mounted or file gone; try again next time
+            if cached.get(path) != (st.st_size, st.st_mtime):
+                to_probe.append(path)
+        if to_probe:
+            print(f"Probe: probing {len(to_probe)} new or changed file(s)...")
+            results = {}
+            try:
+                # spawn, not fork: this runs next to Tk and other threads in the browser process
+                with ProcessPoolExecutor(max_workers=MAX_PROBE_WORKERS, mp_context=multiprocessing.get_context("spawn")) as executor:
+                    for path, info in executor.map(probe_file, to_probe, chunksize=8):
+                        store_probe(conn, path, info)
+                        results[path] = info
+                        if len(results) >= 50 or self._stop_event.is_set():
+                            conn.commit()
+                            if self.on_probed: self.on_probed(results)
+                            results = {}
+                            if self._stop_event.is_set():
+                                executor.shutdown(wait=False, cancel_futures=True)
+                                break
+            except (OSError, sqlite3.Error) as e:
+                print(f"Probe: stopped early: {e}")
+            conn.commit()
+            if results and self.on_probed:
+                self.on_probed(results)
+        conn.close()
@@ -8,6 +8,7 @@ import os
 
 import db_operations
 import utils
+import artist_search
 import config
 
 # UI theme constants
@@ -48,17 +49,8 @@ class ModifyEntryWindow(tk.Toplevel):
         self.date_var = tk.StringVar(value=self.record.get("performance_date", ""))
         ttk.Entry(form_frame, textvariable=self.date_var, width=20, font=FONT_MAIN).grid(row=1, column=1, sticky="w", pady=2)
 
-        # Load choices for show type and resolution from DB
-        try:
-            conn = db_operations.get_db_connection()
-            cur = conn.cursor()
-            cur.execute("SELECT DISTINCT show_type FROM performances WHERE show_type IS NOT NULL AND TRIM(show_type)!='' ORDER BY show_type;")
-            self.show_type_choices = [row[0] for row in cur.fetchall() if row[0]]
-            cur.execute("SELECT DISTINCT resolution FROM performances WHERE resolution IS NOT NULL AND TRIM(resolution)!='' ORDER BY resolution;")
-            self.resolution_choices = [row[0] for row in cur.fetchall() if row[0]]
-        except Exception:
-            self.show_type_choices = []
-            self.resolution_choices = []
+        # Choices for show type and resolution from the shared reference cache (no table scans)
+        self.show_type_choices, self.resolution_choices = db_operations.get_reference_choices()
         # Show Type
         ttk.Label(form_frame, text="Show Type:", background=DARK_BG, foreground=BRIGHT_FG, font=FONT_MAIN).grid(row=2, column=0, sticky="w", pady=2)
         self.show_type_var = tk.StringVar(value=self.record.get("show_type", ""))
@@ -116,7 +108,6 @@ class ModifyEntryWindow(tk.Toplevel):
         ttk.Spinbox(form_frame, from_=0, to=5, textvariable=self.score_var, width=5).grid(row=7, column=1, sticky="w", pady=2)
 
         # Primary Artist
-        artists_list = [a['name'] for a in db_operations.get_all_artists()]
         primary, *rest = [s.strip() for s in self.record.get("artists_str", "").split(',')]
         secondary = rest[0] if rest else ""
         ttk.Label(form_frame, text="Primary Artist:", background=DARK_BG, foreground=BRIGHT_FG, font=FONT_MAIN).grid(row=8, column=0, sticky="w", pady=2)
@@ -144,25 +135,6 @@ class ModifyEntryWindow(tk.Toplevel):
         ttk.Button(btn_frame, text="Delete", command=self.delete_entry, style="TButton").pack(side=tk.RIGHT, padx=5)
         ttk.Button(btn_frame, text="Cancel", command=self.cancel, style="TButton").pack(side=tk.RIGHT, padx=5)
 
-        # Load show type and resolution choices from DB
-        try:
-            conn = db_operations.get_db_connection()
-            cur = conn.cursor()
-            cur.execute("SELECT DISTINCT show_type FROM performances WHERE show_type IS NOT NULL AND TRIM(show_type)!='' ORDER BY show_type;")
-            self.show_type_choices = [row[0] for row in cur.fetchall() if row[0]]
-            
-            # Load resolution choices from both performances and music_videos tables
-            resolution_set = set()
-            cur.execute("SELECT DISTINCT resolution FROM performances WHERE resolution IS NOT NULL AND TRIM(resolution)!='' ORDER BY resolution;")
-            resolution_set.update(row[0] for row in cur.fetchall() if row[0])
-            cur.execute("SELECT DISTINCT resolution FROM music_videos WHERE resolution IS NOT NULL AND TRIM(resolution)!='' ORDER BY resolution;")
-            resolution_set.update(row[0] for row in cur.fetchall() if row[0])
-            
-            self.resolution_choices = sorted(list(resolution_set), key=lambda s: s.lower())
-        except Exception:
-            self.show_type_choices = []
-            self.resolution_choices = []
-
         # Disable Show Type for music video entries (but enable Resolution)
         entry_type = self.record.get('entry_type', 'performance')
         if entry_type != 'performance':
@@ -407,7 +379,7 @@ class ArtistSelectPopup(tk.Toplevel):
         self.title(title)
         self.parent = parent
         self.callback = callback
-        self.artist_list = db_operations.get_all_artists()
+        self.artist_index = artist_search.get_artist_index()
         self.selected_artist = selected_artist
 
         # Search variable
@@ -438,25 +410,24 @@ class ArtistSelectPopup(tk.Toplevel):
         # Initialize artist list
         self.update_artist_list()
 
-    def update_artist_list(self, filtered_artists=None):
-        """Update the listbox with the artist names."""
+    def update_artist_list(self, names=None):
+        """Update the listbox with the artist names (all artists, A-Z, if names is None)."""
+        names = self.artist_index.names if names is None else names
         self.artist_listbox.delete(0, tk.END)
-        for artist in (filtered_artists or self.artist_list):
-            self.artist_listbox.insert(tk.END, artist['name'])
-        # Select the current artist
-        if self.selected_artist:
-            try:
-                index = next(i for i, artist in enumerate(self.artist_list) if artist['name'] == self.selected_artist)
-                self.artist_listbox.select_set(index)
-                self.artist_listbox.see(index)
-            except StopIteration:
-                pass  # Current artist not in list, do not select any
+        self.artist_listbox.insert(tk.END, *names)
+        # Select the current artist if it is shown
+        if self.selected_artist in names:
+            index = names.index(self.selected_artist)
+            self.artist_listbox.select_set(index)
+            self.artist_listbox.see(index)
 
     def filter_artist_list(self, *args):
-        """Filter the artist list based on the search query."""
-        query = self.search_var.get().strip().lower()
-        filtered_artists = [artist for artist in self.artist_list if query in artist['name'].lower()]
-        self.update_artist_list(filtered_artists)
+        """Show the artists matching the search query, best matches first."""
+        query = self.search_var.get().strip()
+        if not query:
+            self.update_artist_list()
+            return
+        self.update_artist_list([artist['name'] for artist in self.artist_index.search(query, limit=None)])
 
     def on_artist_select(self, event=None):
         """Handle artist selection from the list."""
@@ -0,0 +1,239 @@
+# mpv_controller.py
+# A long-lived mpv instance driven over its JSON IPC socket (--input-ipc-server).
+# Keeping one player process avoids paying process start-up and decoder init for every
+# selection, and lets the browser append to the queue, skip, and observe per-item events.
+import os
+import json
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+
+import config
+
+IPC_CONNECT_TIMEOUT_SECONDS = 10
+OBSERVE_DURATION = 1
+OBSERVE_IDLE = 2
+
+
+class MpvController:
+    """
+    Wraps one mpv process started with --idle so it survives between queues.
+    Callbacks are invoked from the reader thread (UI callers must marshal them to the Tk thread):
+      on_item_start(index, path)
+      on_item_end(path, reason, watched_seconds, duration)  # reason as reported by mpv: eof, stop, quit, error...
+      on_queue_finished()  # playlist ran out, or the player was closed
+    """
+    def __init__(self, mpv_path=None, extra_args=None, socket_path=None,
+                 on_item_start=None, on_item_end=None, on_queue_finished=None):
+        self.mpv_path = mpv_path or config.MPV_PLAYER_PATH
+        self.extra_args = list(extra_args) if extra_args is not None else ['--fs', '--prefetch-playlist=yes']
+        self.socket_path = socket_path or os.path.join(tempfile.gettempdir(), f"kpopdb-mpv-{os.getpid()}.sock")
+        self.on_item_start = on_item_start
+        self.on_item_end = on_item_end
+        self.on_queue_finished = on_queue_finished
+        self.playlist = []  # Paths in mpv's playlist, in order
+        self.current_index = None
+        self._current_started_at = None
+        self._current_duration = None
+        self._process = None
+        self._sock = None
+        self._lock = threading.RLock()  # Guards the socket, playlist and entry bookkeeping
+        self._request_id = 0
+        self._load_requests = {}  # {request_id of a loadfile: (queue generation, playlist index)}
+        self._entry_indexes = {}  # {mpv playlist_entry_id: playlist index}, from the loadfile replies
+        self._current_entry_id = None
+        self._queue_generation = 0  # Bumped by play(), so replies about the replaced queue are ignored
+        self._queue_started = False  # mpv left idle for the current queue, so idle-active=true means it ended
+        self._playing = False
+
+    # --- Process / connection ---
+
+    def is_running(self):
+        if self._sock is None:
+            return False
+        return self._process is None or self._process.poll() is None
+
+    def is_playing(self):
+        return self._playing and self.is_running()
+
+    def ensure_started(self):
+        """Starts mpv (idle, no window until something plays) and connects to its IPC socket."""
+        if self.is_running():
+            return
+        self._close_socket()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        # Raises FileNotFoundError if mpv is not installed, like the previous direct Popen
+        self._process = subprocess.Popen(
+            [self.mpv_path, '--idle=yes', f'--input-ipc-server={self.socket_path}'] + self.extra_args,
+            stdin=subprocess.DEVNULL)
+        self._connect()
+
+    def _connect(self):
+        deadline = time.monotonic() + IPC_CONNECT_TIMEOUT_SECONDS
+        while True:
+            try:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.connect(self.socket_path)
+                break
+            except OSError:
+                sock.close()
+                if time.monotonic() > deadline or (self._process and self._process.poll() is not None):
+                    raise RuntimeError(f"Could not connect to mpv IPC socket {self.socket_path}")
+                time.sleep(0.05)
+        self._sock = sock
+        threading.Thread(target=self._reader, args=(sock,), name="MpvIpcReader", daemon=True).start()
+        self.command("observe_property", OBSERVE_DURATION, "duration")
+        self.command("observe_property", OBSERVE_IDLE, "idle-active")
+
+    def _close_socket(self):
+        if self._sock is not None:
+            try: self._sock.close()
+            except OSError: pass
+            self._sock = None
+
+    def shutdown(self):
+        """Quits the player and removes the socket."""
+        if self.is_running():
+            try: self.command("quit")
+            except OSError: pass
+        self._close_socket()
+        if self._process and self._process.poll() is None:
+            try: self._process.wait(timeout=3)
+            except subprocess.TimeoutExpired: self._process.terminate()
+        self._process = None
+        if os.path.exists(self.socket_path):
+            try: os.remove(self.socket_path)
+            except OSError: pass
+
+    # --- Commands ---
+
+    def command(self, *args):
+        """Sends one IPC command without waiting for the reply. Returns its request_id."""
+        with self._lock:
+            if self._sock is None:
+                raise OSError("mpv IPC socket is not connected")
+            self._request_id += 1
+            request_id = self._request_id
+            payload = json.dumps({"command": list(args), "request_id": request_id}) + "\n"
+            self._sock.sendall(payload.encode("utf-8"))
+        return request_id
+
+    def play(self, paths):
+        """Replaces the queue with paths and starts playing the first one."""
+        self.ensure_started()
+        self._finish_current("stop")  # The item being replaced, if any
+        with self._lock:
+            self.playlist = []
+            self.current_index = None
+            self._current_entry_id = None
+            self._queue_generation += 1
+            self._queue_started = False
+            self._load_requests.clear()
+            self._entry_indexes.clear()
+        self._playing = True
+        for i, path in enumerate(paths):
+            self._loadfile(path, "replace" if i == 0 else "append")
+
+    def append(self, paths):
+        """Adds paths to the end of the queue (starts playback if the player was idle)."""
+        if not self.is_playing():
+            self.play(paths)
+            return
+        for path in paths:
+            self._loadfile(path, "append-play")
+
+    def _loadfile(self, path, mode):
+        """Sends loadfile and remembers which playlist index its reply's playlist_entry_id (mpv 0.33+) belongs to."""
+        with self._lock:  # Held across the send, so the reader cannot handle the reply before it is registered
+            request_id = self.command("loadfile", path, mode)
+            self._load_requests[request_id] = (self._queue_generation, len(self.playlist))
+            self.playlist.append(path)
+
+    def skip(self):
+        self.command("playlist-next", "force")
+
+    def stop(self):
+        self.command("stop")
+
+    # --- Events ---
+
+    def _reader(self, sock):
+        buffer = b""
+        try:
+            while True:
+                data = sock.recv(65536)
+                if not data:
+                    break
+                buffer += data
+                while b"\n" in buffer:
+                    line, buffer = buffer.split(b"\n", 1)
+                    if line.strip():
+                        try:
+                            self._handle_message(json.loads(line))
+                        except ValueError:
+                            print(f"mpv IPC: unparsable message {line[:200]!r}")
+        except OSError:
+            pass
+        # Player closed (e.g. 'q' in mpv): finish the current item and the queue
+        if self._sock is sock:
+            self._sock = None
+            self._finish_current("quit")
+            if self._playing:
+                self._playing = False
+                if self.on_queue_finished: self.on_queue_finished()
+
+    def _handle_message(self, msg):
+        event = msg.get("event")
+        if event is None:  # A command reply; only those to loadfile are of interest
+            data = msg.get("data")
+            with self._lock:  # Checked under the lock: _loadfile registers the request while holding it
+                generation, index = self._load_requests.pop(msg.get("request_id"), (None, None))
+                if generation == self._queue_generation and isinstance(data, dict) and "playlist_entry_id" in data:
+                    self._entry_indexes[data["playlist_entry_id"]] = index
+        elif event == "start-file":
+            entry_id = msg.get("playlist_entry_id")
+            with self._lock:
+                self._queue_started = True  # Even if the entry can't be matched, the queue is now underway
+                index = self._entry_indexes.get(entry_id)
+            if index is None:
+                return  # An entry of a queue play() has replaced since
+            self._finish_current("eof")
+            with self._lock:
+                if self._entry_indexes.get(entry_id) != index:
+                    return
+                self.current_index = index
+                self._current_entry_id = entry_id
+                self._current_started_at = time.monotonic()
+                path = self.playlist[index] if index < len(self.playlist) else None
+            if self.on_item_start: self.on_item_start(index, path)
+        elif event == "property-change" and msg.get("id") == OBSERVE_DURATION:
+            if msg.get("data") is not None:
+                self._current_duration = msg.get("data")
+        elif event == "end-file":
+            if msg.get("playlist_entry_id") in (None, self._current_entry_id):
+                self._finish_current(msg.get("reason", "eof"))
+        elif event == "property-change" and msg.get("id") == OBSERVE_IDLE:
+            # Only counts once mpv has started on the current queue, even if its items failed at once
+            # (the initial idle-active=true is ignored)
+            if msg.get("data") is False and self._playing:
+                self._queue_started = True
+            if msg.get("data") is not True or not self._queue_started:
+                return
+            self._finish_current("eof")
+            if self._playing:
+                self._playing = False
+                if self.on_queue_finished: self.on_queue_finished()
+
+    def _finish_current(self, reason):
+        """Reports the end of the current item once (end-file, the next start-file and going idle all lead here)."""
+        if self.current_index is None or self._current_started_at is None:
+            return
+        index, started_at = self.current_index, self._current_started_at
+        self._current_started_at = None
+        path = self.playlist[index] if index < len(self.playlist) else None
+        duration, self._current_duration = self._current_duration, None  # The next file reports its own
+        if self.on_item_end:
+            self.on_item_end(path, reason, time.monotonic() - started_at, duration)
@@ -0,0 +1,115 @@
+# path_resolver.py
+# Cached availability of local media paths, used to pick the playable path of a record
+# (file_path1, file_path2, then file_url) without stat calls on the Tk thread.
+# Paths are probed in the background, one worker per mount point so a sleeping drive does
+# not hold up the others, by listing each directory once (through directory_index, which
+# re-reads a directory only when its mtime changed) instead of stat'ing every file.
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import directory_index
+import drive_keep_warm
+import utils
+
+AVAILABILITY_TTL_SECONDS = 300
+
+
+class PathResolver:
+    """
+    Caches {path: (exists, checked_at)}. on_update(paths) is called from a worker thread with
+    the paths whose availability changed; UI callers must marshal it to the Tk thread.
+    """
+    def __init__(self, ttl=AVAILABILITY_TTL_SECONDS, on_update=None):
+        self.ttl = ttl
+        self.on_update = on_update
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._in_flight = set()  # Mount points with a probe running
+        self._pending = {}  # {mount point: set of paths queued while its probe was running}
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="PathResolver")
+
+    def lookup(self, path):
+        """Returns True/False from the cache, or None if path was never probed. Never touches the filesystem."""
+        with self._lock:
+            cached = self._cache.get(path)
+        return cached[0] if cached else None
+
+    def is_stale(self, path):
+        with self._lock:
+            cached = self._cache.get(path)
+        return cached is None or time.monotonic() - cached[1] > self.ttl
+
+    def resolve(self, perf_data_dict):
+        """
+        Returns (path_or_url, is_youtube, available) from cached state. A local path known to exist
+        wins; otherwise the first path not known to be missing (available None); otherwise the URL;
+        otherwise the first path, with available False.
+        """
+        paths = [p for p in (perf_data_dict.get("file_path1"), perf_data_dict.get("file_path2")) if p]
+        states = [self.lookup(p) for p in paths]
+        for path, state in zip(paths, states):
+            if state:
+                return path, False, True
+        for path, state in zip(paths, states):
+            if state is None:
+                return path, False, None
+        file_url = perf_data_dict.get("file_url")
+        if file_url:
+            return file_url, utils.is_youtube_url(file_url), True
+        if paths:
+            return paths[0], False, False
+        return None, False, None
+
+    def invalidate_mount(self, mount_point):
+        """Forgets cached state below mount_point (e.g. after it was mounted or unmounted)."""
+        prefix = mount_point.rstrip("/") + "/"
+        with self._lock:
+            for path in [p for p in self._cache if p.startswith(prefix)]:
+                del self._cache[path]
+
+    def probe_async(self, paths, force=False):
+        """
+        Queues a background probe of paths (only stale ones unless force), one worker per mount point.
+        Paths are grouped by library root with string matching only, so this never stats on the caller's thread.
+        """
+        paths = [p for p in paths if p and (force or self.is_stale(p))]
+        for mount_point, mount_paths in drive_keep_warm.group_paths_by_mount(paths).items():
+            with self._lock:
+                if mount_point in self._in_flight:
+                    self._pending.setdefault(mount_point, set()).update(mount_paths)
+                    continue
+                self._in_flight.add(mount_point)
+            try:
+                self._executor.submit(self._probe_mount, mount_point, mount_paths)
+            except RuntimeError:  # Shut down
+                with self._lock:
+                    self._in_flight.discard(mount_point)
+
+    def _probe_mount(self, mount_point, paths):
+        while paths:
+            by_directory = {}
+            for path in paths:
+                by_directory.setdefault(os.path.dirname(path), []).append(path)
+            changed = []
+            for directory, dir_paths in by_directory.items():
+                entries, _ = directory_index.scan_directory(directory)
+                files = {name for name, is_dir in entries if not is_dir}
+                now = time.monotonic()
+                with self._lock:
+                    for path in dir_paths:
+                        exists = os.path.basename(path) in files
+                        previous = self._cache.get(path)
+                        self._cache[path] = (exists, now)
+                        if previous is None or previous[0] != exists:
+                            changed.append(path)
+            if changed and self.on_update:
+                self.on_update(changed)
+            with self._lock:
+                paths = list(self._pending.pop(mount_point, ()))
+                if not paths:
+                    self._in_flight.discard(mount_point)
+
+    def stop(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
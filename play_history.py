@@ -0,0 +1,114 @@
+# play_history.py
+# Playback history: one play_events row per played item, plus a play_stats table with the
+# per-record play count and last-played time, kept current as events are written so the
+# browser can read the aggregates with a single small query.
+# Events are queued by the playback code and written in batches by a background thread.
+import datetime
+import queue
+import sqlite3
+import threading
+
+import config
+
+FLUSH_INTERVAL_SECONDS = 2
+MAX_BATCH_SIZE = 100
+PLAY_COUNT_MIN_SECONDS = 30  # Shorter views that did not reach the end (skips) are logged but not counted
+
+
+def ensure_play_history_tables(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS play_events (
+            event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            entry_type TEXT NOT NULL, -- 'performance' or 'mv'
+            record_id INTEGER NOT NULL,
+            played_at TEXT NOT NULL,
+            watched_seconds REAL,
+            duration REAL,
+            end_reason TEXT, -- mpv end-file reason; 'external' for URLs handed to another player
+            source TEXT -- 'selected' or 'random'
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_play_events_record ON play_events(entry_type, record_id)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS play_stats (
+            entry_type TEXT NOT NULL,
+            record_id INTEGER NOT NULL,
+            play_count INTEGER NOT NULL DEFAULT 0,
+            last_played_at TEXT,
+            PRIMARY KEY (entry_type, record_id)
+        )
+    """)
+    conn.commit()
+
+
+def record_key(perf_dict):
+    """Returns (entry_type, record_id) for a browser record dict (music videos use 'mv_<id>')."""
+    entry_type = perf_dict.get("entry_type", "performance")
+    record_id = perf_dict.get("performance_id")
+    if entry_type == "mv" and isinstance(record_id, str) and record_id.startswith("mv_"):
+        record_id = record_id[3:]
+    return entry_type, int(record_id)
+
+
+def is_counted_play(end_reason, watched_seconds):
+    return end_reason in ("eof", "external") or (watched_seconds or 0) >= PLAY_COUNT_MIN_SECONDS
+
+
+class PlayEventWriter:
+    """Queues play events and writes them from a background thread with its own connection."""
+    def __init__(self, db_file=None):
+        self.db_file = db_file or config.DATABASE_FILE
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="PlayEventWriter", daemon=True)
+        self._thread.start()
+
+    def record(self, perf_dict, watched_seconds=None, duration=None, end_reason=None, source=None):
+        """Queues one event; returns immediately. The timestamp is taken now, not at write time."""
+        entry_type, record_id = record_key(perf_dict)
+        played_at = datetime.datetime.now().isoformat(timespec="seconds")
+        self._queue.put((entry_type, record_id, played_at, watched_seconds, duration, end_reason, source))
+
+    def close(self, timeout=5):
+        """Flushes pending events and stops the writer thread."""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self):
+        try:
+            conn = sqlite3.connect(self.db_file, timeout=30)
+            ensure_play_history_tables(conn)
+        except sqlite3.Error as e:
+            print(f"Play history: database error, events will not be saved: {e}")
+            return
+        stopping = False
+        while not stopping:
+            batch = []
+            try:
+                item = self._queue.get()
+                while item is not None:
+                    batch.append(item)
+                    if len(batch) >= MAX_BATCH_SIZE:
+                        break
+                    item = self._queue.get(timeout=FLUSH_INTERVAL_SECONDS)
+                else:
+                    stopping = True
+            except queue.Empty:
+                pass
+            if batch:
+                self._write_batch(conn, batch)
+        conn.close()
+
+    def _write_batch(self, conn, batch):
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO play_events (entry_type, record_id, played_at, watched_seconds, duration, end_reason, source) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+                conn.executemany("""
+                    INSERT INTO play_stats (entry_type, record_id, play_count, last_played_at) VALUES (?, ?, 1, ?)
+                    ON CONFLICT(entry_type, record_id) DO UPDATE SET
+                        play_count = play_count + 1,
+                        last_played_at = MAX(COALESCE(last_played_at, ''), excluded.last_played_at)
+                """, [(e[0], e[1], e[2]) for e in batch if is_counted_play(e[5], e[3])])
+        except sqlite3.Error as e:
+            print(f"Play history: could not write {len(batch)} event(s): {e}")
@@ -0,0 +1,79 @@
+# playback_prefetch.py
+# Reads ahead the beginning of the next files in a playback queue so that mpv does not
+# pay the cold-read latency of a slow USB/SMB drive at every transition.
+# posix_fadvise(WILLNEED) is issued where available; because FUSE (ntfs-3g) and network
+# filesystems may ignore the hint, the bytes are also read by a single background thread.
+import os
+import threading
+
+PREFETCH_BYTES = 32 * 1024 * 1024  # First N MB of each upcoming file
+PREFETCH_AHEAD = 2  # Number of upcoming items to prefetch
+READ_CHUNK_BYTES = 1024 * 1024
+
+
+class PlaybackPrefetcher:
+    """
+    Bounded read-ahead for a playback queue. Call set_queue() with the ordered local paths,
+    then set_current(index) whenever an item starts; the next PREFETCH_AHEAD items are warmed.
+    """
+    def __init__(self, prefetch_bytes=PREFETCH_BYTES, ahead=PREFETCH_AHEAD):
+        self.prefetch_bytes = prefetch_bytes
+        self.ahead = ahead
+        self._queue = []
+        self._done = set()  # Paths already prefetched for the current queue
+        self._pending = []
+        self._condition = threading.Condition()
+        self._generation = 0  # Bumped on every set_queue so stale work is abandoned
+        self._stopped = False
+        self._thread = threading.Thread(target=self._worker, name="PlaybackPrefetch", daemon=True)
+        self._thread.start()
+
+    def set_queue(self, paths):
+        with self._condition:
+            self._queue = [p for p in paths if isinstance(p, str)]
+            self._done = set()
+            self._pending = []
+            self._generation += 1
+
+    def set_current(self, index):
+        """Schedules the items after index for prefetch (the current one is already being read by mpv)."""
+        with self._condition:
+            upcoming = self._queue[index + 1:index + 1 + self.ahead]
+            self._pending = [p for p in upcoming if p not in self._done]
+            self._condition.notify()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._pending = []
+            self._condition.notify()
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                path = self._pending.pop(0)
+                generation = self._generation
+            self._prefetch_file(path, generation)
+            with self._condition:
+                if generation == self._generation:
+                    self._done.add(path)
+
+    def _prefetch_file(self, path, generation):
+        try:
+            with open(path, "rb") as f:
+                if hasattr(os, "posix_fadvise"):
+                    os.posix_fadvise(f.fileno(), 0, self.prefetch_bytes, os.POSIX_FADV_WILLNEED)
+                remaining = self.prefetch_bytes
+                while remaining > 0:
+                    if self._generation != generation or self._stopped:
+                        return  # Queue replaced; don't keep the drive busy for stale items
+                    chunk = f.read(min(READ_CHUNK_BYTES, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+        except OSError as e:
+            print(f"Prefetch: cannot read {path}: {e}")
@@ -0,0 +1,156 @@
+# playlist_engine.py
+# Weighted random playlists for KpopDBBrowser.play_random_videos.
+# Each item is weighted by its score and by how long ago it was last played (so items from
+# recent sessions are unlikely to come up again); artist diversity is enforced while drawing.
+# Each record's weight is computed once (set_item_weight, when records are built or played) and
+# kept on the record. The weights live in a Fenwick (binary indexed) tree over indices into the
+# caller's list, built once per list and reused: drawing k items without replacement costs
+# O(k log n), and the drawn weights are put back afterwards.
+# order_by_drive reorders a batch so each drive's files play back to back.
+import datetime
+import math
+import os
+import random
+
+import drive_keep_warm
+
+# Score 0/None means "not rated yet"; it ranks with the middle scores so new items still come up
+SCORE_WEIGHTS = {0: 1.5, 1: 0.5, 2: 1.0, 3: 1.5, 4: 2.5, 5: 4.0}
+RECENCY_DAYS = 7.0  # An item played d days ago keeps 1 - exp(-d / RECENCY_DAYS) of its weight
+MIN_RECENCY_FACTOR = 0.02
+ARTIST_WINDOW = 3  # An artist drawn in the last ARTIST_WINDOW picks is only accepted with...
+ARTIST_REPEAT_ACCEPT = 0.15  # ...this probability
+MAX_REDRAWS = 8
+
+_weights_version = 0  # Bumped whenever a stored weight or a list's order changes
+_sample_cache = {"items": None, "length": 0, "version": -1, "weights": None, "tree": None, "positive": 0}
+
+
+def item_weight(item, now=None):
+    try:
+        score = int(item.get("score") or 0)
+    except (ValueError, TypeError):
+        score = 0
+    weight = SCORE_WEIGHTS.get(score, SCORE_WEIGHTS[0])
+    last_played = item.get("last_played")
+    if last_played:
+        try:
+            now = now or datetime.datetime.now()
+            days = (now - datetime.datetime.fromisoformat(last_played)).total_seconds() / 86400.0
+            weight *= max(MIN_RECENCY_FACTOR, 1.0 - math.exp(-max(days, 0.0) / RECENCY_DAYS))
+        except ValueError:
+            pass
+    return weight
+
+
+def set_item_weight(item, now=None):
+    """Stores item_weight(item) on the record as "weight"; call it whenever the score or last play changes."""
+    global _weights_version
+    item["weight"] = item_weight(item, now)
+    _weights_version += 1
+
+
+def invalidate_sample_cache():
+    """Call after reordering a list in place: weighted_sample's cached tree is indexed by position."""
+    global _weights_version
+    _weights_version += 1
+
+
+def _prepared_tree(items, now):
+    """Returns (weights, tree, positive count) for items, reusing the last ones if items is unchanged."""
+    cache = _sample_cache
+    if cache["items"] is not items or cache["length"] != len(items) or cache["version"] != _weights_version:
+        weights = [item["weight"] if "weight" in item else item_weight(item, now) for item in items]
+        cache.update(items=items, length=len(items), version=_weights_version, weights=weights,
+                     tree=_FenwickTree(weights), positive=sum(1 for w in weights if w > 0))
+    return cache["weights"], cache["tree"], cache["positive"]
+
+
+class _FenwickTree:
+    """Prefix sums over float weights with O(log n) update and O(log n) weighted search."""
+    def __init__(self, weights):
+        n = len(weights)
+        self.n = n
+        self.tree = [0.0] * (n + 1)
+        for i, w in enumerate(weights, 1):  # O(n) build
+            self.tree[i] += w
+            parent = i + (i & -i)
+            if parent <= n:
+                self.tree[parent] += self.tree[i]
+        self.total = sum(weights)
+        self.top_bit = 1 << (n.bit_length() - 1) if n else 0
+
+    def add(self, index, delta):
+        self.total += delta
+        i = index + 1
+        while i <= self.n:
+            self.tree[i] += delta
+            i += i & -i
+
+    def find(self, target):
+        """Returns the smallest index whose prefix sum exceeds target."""
+        pos, bit = 0, self.top_bit
+        while bit:
+            nxt = pos + bit
+            if nxt <= self.n and self.tree[nxt] <= target:
+                pos = nxt
+                target -= self.tree[nxt]
+            bit >>= 1
+        return min(pos, self.n - 1)
+
+
+def weighted_sample(items, k, rng=None, now=None):
+    """
+    Draws up to k distinct items from items (a list of browser record dicts), favouring higher
+    scores and items not played recently, and avoiding the same artist back to back. Uses the
+    weights stored by set_item_weight (records without one are weighted on the fly).
+    Returns the chosen dicts in play order.
+    """
+    rng = rng or random
+    weights, tree, remaining = _prepared_tree(items, now)
+    chosen, recent_artists, drawn = [], [], []
+    try:
+        while len(chosen) < k and remaining:
+            for attempt in range(MAX_REDRAWS):
+                index = tree.find(rng.random() * tree.total)
+                if weights[index] <= 0:  # Float drift at the edges of the tree; resample
+                    continue
+                artist = items[index].get("artists_str")
+                if artist not in recent_artists or attempt == MAX_REDRAWS - 1 or rng.random() < ARTIST_REPEAT_ACCEPT:
+                    break
+            else:
+                # Every draw hit a zeroed slot: fall back to a linear scan for any remaining item
+                index = next(i for i, w in enumerate(weights) if w > 0)
+            drawn.append((index, weights[index]))
+            tree.add(index, -weights[index])
+            weights[index] = 0.0
+            remaining -= 1
+            chosen.append(items[index])
+            recent_artists.append(items[index].get("artists_str"))
+            if len(recent_artists) > ARTIST_WINDOW:
+                recent_artists.pop(0)
+    finally:
+        # Put the drawn weights back, so the cached tree serves the next call as is
+        for index, weight in drawn:
+            tree.add(index, weight)
+            weights[index] = weight
+    return chosen
+
+
+def order_by_drive(items, group_directories=False):
+    """
+    Reorders items so that local files on the same drive play back to back, with drives in
+    the order they first appear. Within a drive the original relative order is kept (so a
+    shuffled batch stays shuffled), unless group_directories is set, in which case files are
+    also grouped by directory. URL items keep their place at the end of the local ones.
+    """
+    groups = {}  # Insertion-ordered: {library root ("" outside the roots, None for URLs): {directory: [items]}}
+    for item in items:
+        path = item.get("playable_path")
+        is_local = isinstance(path, str) and not item.get("file_url")
+        mount = (drive_keep_warm.get_drive_root(path) or "") if is_local else None
+        directory = os.path.dirname(path) if (is_local and group_directories) else None
+        groups.setdefault(mount, {}).setdefault(directory, []).append(item)
+    url_items = groups.pop(None, {})
+    ordered = [item for dirs in groups.values() for dir_items in dirs.values() for item in dir_items]
+    return ordered + [item for dir_items in url_items.values() for item in dir_items]
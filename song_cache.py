@@ -0,0 +1,96 @@
+# song_cache.py
+# Per-artist song lists for the entry dialogs, kept in memory so the song popup and the
+# filename-based song detection don't query SQLite on the Tk thread. The entry form preloads
+# an artist's songs in the background as soon as the artist is chosen; the least recently
+# used artists are evicted once MAX_CACHED_ARTISTS is reached.
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import config
+import db_operations
+
+MAX_CACHED_ARTISTS = 64
+
+
+class SongCache:
+    """
+    LRU cache {artist_id: [(song_id, song_title), ...]}. Safe to use from worker threads;
+    on_loaded(artist_ids) passed to preload_async is called from the worker thread.
+    """
+    def __init__(self, max_artists=MAX_CACHED_ARTISTS, db_file=None):
+        self.max_artists = max_artists
+        self.db_file = db_file or config.DATABASE_FILE
+        self._songs = OrderedDict()
+        self._lock = threading.Lock()
+        self._in_flight = set()
+
+    def _store(self, artist_id, songs):
+        with self._lock:
+            self._songs[artist_id] = songs
+            self._songs.move_to_end(artist_id)
+            while len(self._songs) > self.max_artists:
+                self._songs.popitem(last=False)
+
+    def cached(self, artist_id):
+        """Returns the cached songs of artist_id (marking it recently used), or None."""
+        with self._lock:
+            songs = self._songs.get(artist_id)
+            if songs is not None:
+                self._songs.move_to_end(artist_id)
+            return songs
+
+    def preload_async(self, artist_ids, on_loaded=None):
+        """Loads the songs of the artists that aren't cached (or already loading) in a background thread."""
+        with self._lock:
+            missing = [a for a in dict.fromkeys(artist_ids) if a is not None and a not in self._songs and a not in self._in_flight]
+            self._in_flight.update(missing)
+        if not missing:
+            return
+        def run():
+            try:
+                conn = sqlite3.connect(self.db_file, timeout=30)
+                try:
+                    for artist_id in missing:
+                        self._store(artist_id, db_operations.get_songs_for_artists([artist_id], conn=conn))
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                print(f"Song cache: could not preload songs: {e}")
+            finally:
+                with self._lock:
+                    self._in_flight.difference_update(missing)
+            if on_loaded: on_loaded(missing)
+        threading.Thread(target=run, name="SongPreload", daemon=True).start()
+
+    def get_songs(self, artist_ids, conn=None):
+        """
+        Returns the songs of all the given artists as [(song_id, song_title), ...] sorted by title,
+        like one query over them would. Artists that aren't cached yet are loaded right away
+        (through conn, or the shared connection on the Tk thread).
+        """
+        by_id = {}
+        for artist_id in dict.fromkeys(artist_ids):
+            songs = self.cached(artist_id)
+            if songs is None:
+                songs = db_operations.get_songs_for_artists([artist_id], conn=conn)
+                self._store(artist_id, songs)
+            by_id.update(songs)
+        return sorted(by_id.items(), key=lambda song: song[1].lower())
+
+    def invalidate(self, artist_ids=None):
+        """Forgets the given artists (or everything), e.g. after songs were imported."""
+        with self._lock:
+            if artist_ids is None:
+                self._songs.clear()
+            else:
+                for artist_id in artist_ids:
+                    self._songs.pop(artist_id, None)
+
+
+_cache = SongCache()
+
+
+def get_song_cache():
+    """Returns the process-wide cache shared by the entry windows."""
+    return _cache
@@ -2,9 +2,11 @@ import spotipy
 from spotipy.oauth2 import SpotifyOAuth
 import sqlite3
 import os
-import json
+import sys
 import time
-from datetime import datetime
+from datetime import datetime, timedelta
+
+import sync_jobs
 
 # --- Configuration ---
 DB_FILE = "kpop_database.db"
@@ -12,9 +14,13 @@ DB_FILE = "kpop_database.db"
 # Line 1: SPOTIPY_CLIENT_ID
 # Line 2: SPOTIPY_CLIENT_SECRET
 CREDENTIALS_FILE_PATH = os.path.expanduser("~/.spotify_credentials")
-STATE_FILE_PATH = "spotify_album_sync_state.json" # Stores the last offset for current run
+LEGACY_STATE_FILE_PATH = "spotify_album_sync_state.json" # Old JSON state, moved into sync_jobs on first run
+SYNC_JOB = "spotify_album_sync"  # sync_jobs job name: cursor = listing position, items = albums to store
 SPOTIPY_REDIRECT_URI = "http://127.0.0.1:8888/callback"
 API_SCOPE = "user-library-read"
+SAVED_ALBUMS_PAGE_LIMIT = 50   # Max allowed by Spotify for saved albums
+FULL_DIFF_INTERVAL_DAYS = 7    # How often a sync also lists the whole library to find removed albums
+SQL_VARIABLE_CHUNK = 500       # Ids per "IN (...)" lookup, below SQLite's bound-parameter limit
 
 # --- API Call Delays (seconds) ---
 DELAY_PER_PAGE = 10            # Delay after fetching a page of saved albums
@@ -98,7 +104,7 @@ def get_spotify_client(client_id, client_secret):
 
 def db_connect():
     """Connects to the SQLite database."""
-    return sqlite3.connect(DB_FILE)
+    return sqlite3.connect(DB_FILE, timeout=30)  # Other workers may hold the write lock briefly
 
 def setup_database(conn):
     """Creates database tables if they don't already exist. Safe for existing DBs."""
@@ -168,25 +174,33 @@ def setup_database(conn):
         FOREIGN KEY ("song_id") REFERENCES "songs"("song_id") ON DELETE CASCADE,
         FOREIGN KEY ("album_id") REFERENCES "albums"("album_id") ON DELETE CASCADE
     )''')
+    # Set when an album is no longer in the Spotify library (see full_library_diff); albums are never deleted
+    album_columns = {row[1] for row in cursor.execute("PRAGMA table_info(albums)")}
+    if "spotify_removed_at" not in album_columns:
+        cursor.execute('ALTER TABLE albums ADD COLUMN "spotify_removed_at" TEXT')
     conn.commit()
 
-def load_sync_state():
-    if os.path.exists(STATE_FILE_PATH):
-        try:
-            with open(STATE_FILE_PATH, 'r') as f:
-                state = json.load(f)
-                return state.get("offset", 0)
-        except json.JSONDecodeError:
-            print(f"Warning: State file {STATE_FILE_PATH} is corrupted. Starting from offset 0.")
-            return 0
-    return 0
-
-def save_sync_state(offset):
-    try:
-        with open(STATE_FILE_PATH, 'w') as f:
-            json.dump({"offset": offset}, f)
-    except IOError as e:
-        print(f"Warning: Could not save sync state to {STATE_FILE_PATH}: {e}")
+def load_sync_state(conn):
+    """
+    Returns the job's cursor: offset (next page of an interrupted pass), watermark (the newest
+    spotify_added_at stored when that pass started) and last_full_diff_at.
+    """
+    state = {"offset": 0, "watermark": None, "last_full_diff_at": None}
+    state.update(sync_jobs.get_cursor(conn, SYNC_JOB, legacy_state_file=LEGACY_STATE_FILE_PATH))
+    return state
+
+def save_sync_state(conn, state):
+    """Stores the cursor in the current transaction (the caller commits it with its data)."""
+    sync_jobs.set_cursor(conn, SYNC_JOB, state)
+
+def album_job_payload(item):
+    """The part of a saved-album item that storing it needs (the API item also embeds tracks and markets)."""
+    album = item['album']
+    payload_album = {key: album.get(key) for key in ("id", "name", "album_type", "total_tracks", "release_date",
+                                                     "release_date_precision", "label", "popularity", "uri")}
+    payload_album['images'] = album.get('images', [])[:1]
+    payload_album['artists'] = [{"id": a.get('id'), "name": a.get('name')} for a in album.get('artists', [])]
+    return {"added_at": item['added_at'], "album": payload_album}
 
 def get_last_known_added_at(conn):
     cursor = conn.cursor()
@@ -194,131 +208,347 @@ def get_last_known_added_at(conn):
     result = cursor.fetchone()
     return result[0] if result and result[0] else None
 
-def get_album_db_id_by_spotify_id(conn, spotify_album_id):
-    cursor = conn.cursor()
-    cursor.execute("SELECT album_id FROM albums WHERE spotify_album_id = ?", (spotify_album_id,))
-    result = cursor.fetchone()
-    return result[0] if result else None
-
-def get_artist_db_id(conn, spotify_artist_id=None, artist_name=None):
-    cursor = conn.cursor()
-    if spotify_artist_id:
-        cursor.execute("SELECT artist_id FROM artists WHERE spotify_artist_id = ?", (spotify_artist_id,))
-    elif artist_name:
-        cursor.execute("SELECT artist_id FROM artists WHERE artist_name = ?", (artist_name,))
-    else:
-        return None
-    result = cursor.fetchone()
-    return result[0] if result else None
-
-def get_song_db_id(conn, spotify_song_id):
-    cursor = conn.cursor()
-    cursor.execute("SELECT song_id FROM songs WHERE spotify_song_id = ?", (spotify_song_id,))
-    result = cursor.fetchone()
-    return result[0] if result else None
+def get_known_album_ids(conn):
+    """Returns the set of spotify_album_id values already stored (one query instead of one per album)."""
+    return {row[0] for row in conn.execute("SELECT spotify_album_id FROM albums")}
 
-def insert_or_update_artist(conn, artist_data, current_time_iso):
-    cursor = conn.cursor()
-    db_artist_id = get_artist_db_id(conn, spotify_artist_id=artist_data.get('id'))
-
-    artist_name = artist_data.get('name')
-    spotify_artist_id = artist_data.get('id')
-    image_url = artist_data['images'][0]['url'] if artist_data.get('images') else None
-    popularity = artist_data.get('popularity')
-    followers = artist_data['followers']['total'] if artist_data.get('followers') else None
-    uri = artist_data.get('uri')
-
-    if db_artist_id:
-        cursor.execute("""
-            UPDATE artists
-            SET artist_name = ?, artist_image_url = ?, popularity = ?,
-                followers_total = ?, spotify_artist_uri = ?, last_checked_at = ?
-            WHERE artist_id = ?
-        """, (
-            artist_name, image_url, popularity,
-            followers, uri, current_time_iso,
-            db_artist_id
-        ))
-    else:
-        cursor.execute("""
-            INSERT INTO artists (artist_name, spotify_artist_id, artist_image_url,
-                                 popularity, followers_total, spotify_artist_uri, last_checked_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
-            artist_name, spotify_artist_id, image_url,
-            popularity, followers, uri, current_time_iso
-        ))
-        db_artist_id = cursor.lastrowid
-        print(f"Inserted new artist: {artist_name} (Spotify ID: {spotify_artist_id})")
-    return db_artist_id
-
-def insert_album(conn, album_item, current_time_iso):
+def is_full_diff_due(state):
+    last = state.get("last_full_diff_at")
+    if not last:
+        return True
+    try:
+        return datetime.utcnow() - datetime.fromisoformat(last.rstrip("Z")) > timedelta(days=FULL_DIFF_INTERVAL_DAYS)
+    except ValueError:
+        return True
+
+def load_db_id_maps(conn):
+    """Preloads {spotify_id: db_id} for albums, artists and songs, plus {artist_name: artist_id}."""
+    return {
+        "albums": dict(conn.execute("SELECT spotify_album_id, album_id FROM albums")),
+        "artists": dict(conn.execute("SELECT spotify_artist_id, artist_id FROM artists WHERE spotify_artist_id IS NOT NULL")),
+        "artist_names": dict(conn.execute("SELECT artist_name, artist_id FROM artists")),
+        "songs": dict(conn.execute("SELECT spotify_song_id, song_id FROM songs")),
+    }
+
+def select_ids(conn, table, spotify_column, id_column, spotify_ids):
+    """Returns {spotify_id: db_id} for the given ids (chunked to stay under SQLite's variable limit)."""
+    spotify_ids = list(spotify_ids)
+    found = {}
+    for i in range(0, len(spotify_ids), SQL_VARIABLE_CHUNK):
+        chunk = spotify_ids[i:i + SQL_VARIABLE_CHUNK]
+        found.update(conn.execute(f"SELECT {spotify_column}, {id_column} FROM {table} WHERE {spotify_column} IN ({','.join('?' * len(chunk))})", chunk))
+    return found
+
+def album_row(album_item, current_time_iso):
     album_data = album_item['album']
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO albums (album_title, spotify_album_id, album_type, total_tracks,
-                            release_date, release_date_precision, label, popularity,
-                            cover_image_url, spotify_album_uri, spotify_added_at, last_checked_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
+    return (
         album_data['name'], album_data['id'], album_data['album_type'],
         album_data['total_tracks'], album_data['release_date'],
         album_data['release_date_precision'], album_data.get('label', ''),
         album_data.get('popularity'),
         album_data['images'][0]['url'] if album_data.get('images') else None,
         album_data['uri'], album_item['added_at'], current_time_iso
-    ))
-    print(f"Inserted album: {album_data['name']} (Spotify ID: {album_data['id']})")
-    return cursor.lastrowid
+    )
 
-def insert_song(conn, track_data, current_time_iso):
-    cursor = conn.cursor()
-    db_song_id = get_song_db_id(conn, track_data['id'])
-    
-    song_title = track_data['name']
-    spotify_song_id = track_data['id']
-    duration_ms = track_data['duration_ms']
-    uri = track_data['uri']
-
-    if db_song_id:
-        cursor.execute("UPDATE songs SET last_checked_at = ? WHERE song_id = ?", (current_time_iso, db_song_id))
-    else:
-        cursor.execute("""
-            INSERT INTO songs (song_title, spotify_song_id, duration_ms,
-                               spotify_track_uri, last_checked_at)
-            VALUES (?, ?, ?, ?, ?)
-        """, ( 
-            song_title, spotify_song_id, duration_ms,
-            uri, current_time_iso
-        ))
-        db_song_id = cursor.lastrowid
-        print(f"  Inserted song: {song_title} (Spotify ID: {spotify_song_id})")
-    return db_song_id
-
-def link_album_artist(conn, album_db_id, artist_db_id, order):
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT OR IGNORE INTO album_artist_link_simplified (album_id, artist_id, artist_order)
-        VALUES (?, ?, ?)
-    """, (album_db_id, artist_db_id, order))
+def artist_row(artist_data, current_time_iso):
+    return (
+        artist_data.get('name'), artist_data.get('id'),
+        artist_data['images'][0]['url'] if artist_data.get('images') else None,
+        artist_data.get('popularity'),
+        artist_data['followers']['total'] if artist_data.get('followers') else None,
+        artist_data.get('uri'), current_time_iso
+    )
 
-def link_song_artist(conn, song_db_id, artist_db_id, order):
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT OR IGNORE INTO song_artist_link (song_id, artist_id, artist_order)
-        VALUES (?, ?, ?)
-    """, (song_db_id, artist_db_id, order))
+def song_row(track_data, current_time_iso):
+    return (track_data['name'], track_data['id'], track_data['duration_ms'], track_data['uri'], current_time_iso)
 
-def link_song_album(conn, song_db_id, album_db_id, track_number, disc_number):
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT OR IGNORE INTO song_album_link (song_id, album_id, track_number, disc_number)
-        VALUES (?, ?, ?, ?)
-    """, (song_db_id, album_db_id, track_number, disc_number))
+class SyncWriteBuffer:
+    """
+    Collects new albums with their tracks and writes a whole page of them in one transaction:
+    one upsert per table and one executemany per link table. Ids come from the maps preloaded
+    by load_db_id_maps; only the rows inserted by a flush are looked up again afterwards.
+    """
+    def __init__(self, conn, on_stored=None):
+        self.conn = conn
+        self.ids = load_db_id_maps(conn)
+        self.pending = []  # [(saved album item, [tracks])]
+        self.on_stored = on_stored  # on_stored(spotify_album_ids), called inside the write transaction
+
+    def add_album(self, item, tracks):
+        self.pending.append((item, tracks))
+
+    def flush(self, artist_map, current_time_iso):
+        """
+        Writes the pending albums and returns the Spotify ids of those stored. If the page
+        can't be written as a whole, each album is retried on its own so one bad row only
+        loses its album.
+        """
+        pending, self.pending = self.pending, []
+        if not pending:
+            return []
+        try:
+            self._write(pending, artist_map, current_time_iso)
+            return [item['album']['id'] for item, _ in pending]
+        except sqlite3.Error as e:
+            print(f"  Could not write the page in one go ({e}). Retrying album by album...")
+        stored = []
+        for item, tracks in pending:
+            try:
+                self._write([(item, tracks)], artist_map, current_time_iso)
+                stored.append(item['album']['id'])
+            except sqlite3.Error as e:
+                print(f"  MAJOR ERROR processing album '{item['album'].get('name', 'Unknown Album')}': {e}. Rolled back changes for this album.")
+        return stored
+
+    def _write(self, pending, artist_map, current_time_iso):
+        new_ids = {"albums": {}, "artists": {}, "songs": {}}
+        artists = {}
+        for item, tracks in pending:
+            for summary in item['album'].get('artists', []) + [a for t in tracks for a in t.get('artists', [])]:
+                if summary.get('id') in artist_map:
+                    artists[summary['id']] = artist_map[summary['id']]
+        songs = {t['id']: t for _, tracks in pending for t in tracks}
+        try:
+            cursor = self.conn.cursor()
+            cursor.executemany("""
+                INSERT INTO albums (album_title, spotify_album_id, album_type, total_tracks,
+                                    release_date, release_date_precision, label, popularity,
+                                    cover_image_url, spotify_album_uri, spotify_added_at, last_checked_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(spotify_album_id) DO UPDATE SET
+                    album_title = excluded.album_title, total_tracks = excluded.total_tracks,
+                    cover_image_url = excluded.cover_image_url, last_checked_at = excluded.last_checked_at
+            """, [album_row(item, current_time_iso) for item, _ in pending])
+            cursor.executemany("""
+                INSERT INTO artists (artist_name, spotify_artist_id, artist_image_url,
+                                     popularity, followers_total, spotify_artist_uri, last_checked_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(spotify_artist_id) DO UPDATE SET
+                    artist_name = excluded.artist_name, artist_image_url = excluded.artist_image_url,
+                    popularity = excluded.popularity, followers_total = excluded.followers_total,
+                    spotify_artist_uri = excluded.spotify_artist_uri, last_checked_at = excluded.last_checked_at
+            """, [artist_row(a, current_time_iso) for a in artists.values()])
+            cursor.executemany("""
+                INSERT INTO songs (song_title, spotify_song_id, duration_ms, spotify_track_uri, last_checked_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(spotify_song_id) DO UPDATE SET last_checked_at = excluded.last_checked_at
+            """, [song_row(t, current_time_iso) for t in songs.values()])
+
+            new_ids["albums"] = select_ids(self.conn, "albums", "spotify_album_id", "album_id",
+                                           [item['album']['id'] for item, _ in pending if item['album']['id'] not in self.ids["albums"]])
+            new_ids["artists"] = select_ids(self.conn, "artists", "spotify_artist_id", "artist_id",
+                                            [a for a in artists if a not in self.ids["artists"]])
+            new_ids["songs"] = select_ids(self.conn, "songs", "spotify_song_id", "song_id",
+                                          [s for s in songs if s not in self.ids["songs"]])
+            lookup = lambda kind, key: self.ids[kind].get(key) or new_ids[kind].get(key)
+
+            def artist_db_id(summary):
+                if summary.get('id') in artists:
+                    return lookup("artists", summary['id'])
+                db_id = self.ids["artist_names"].get(summary.get('name'))
+                if not db_id and summary.get('name'):
+                    print(f"  Could not resolve artist '{summary.get('name')}' for link (no Spotify ID and not in DB by name).")
+                return db_id
+
+            album_artist_links, song_album_links, song_artist_links = [], [], []
+            for item, tracks in pending:
+                album_db_id = lookup("albums", item['album']['id'])
+                album_artist_links.extend((album_db_id, db_id, order + 1)
+                                          for order, db_id in enumerate(map(artist_db_id, item['album'].get('artists', []))) if db_id)
+                for track in tracks:
+                    song_db_id = lookup("songs", track['id'])
+                    song_album_links.append((song_db_id, album_db_id, track['track_number'], track.get('disc_number', 1)))
+                    song_artist_links.extend((song_db_id, db_id, order + 1)
+                                             for order, db_id in enumerate(map(artist_db_id, track.get('artists', []))) if db_id)
+            cursor.executemany("INSERT OR IGNORE INTO album_artist_link_simplified (album_id, artist_id, artist_order) VALUES (?, ?, ?)", album_artist_links)
+            cursor.executemany("INSERT OR IGNORE INTO song_album_link (song_id, album_id, track_number, disc_number) VALUES (?, ?, ?, ?)", song_album_links)
+            cursor.executemany("INSERT OR IGNORE INTO song_artist_link (song_id, artist_id, artist_order) VALUES (?, ?, ?)", song_artist_links)
+            if self.on_stored:
+                self.on_stored([item['album']['id'] for item, _ in pending])
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        # Only ids that were committed make it into the maps
+        for kind in new_ids:
+            self.ids[kind].update(new_ids[kind])
+        self.ids["artist_names"].update((a.get('name'), lookup("artists", a['id'])) for a in artists.values())
+        for item, tracks in pending:
+            print(f"Inserted album: {item['album']['name']} (Spotify ID: {item['album']['id']}) with {len(tracks)} tracks")
+        print(f"  Wrote {len(pending)} albums, {len(artists)} artists, {len(songs)} songs "
+              f"({len(new_ids['artists'])} new artists, {len(new_ids['songs'])} new songs).")
 
 # --- Main Sync Logic ---
+def fetch_artist_details(sp, spotify_artist_ids, artist_map):
+    """Fetches full artist objects for the ids not in artist_map yet (50 per call) and adds them to it."""
+    ids_to_fetch = [a for a in dict.fromkeys(spotify_artist_ids) if a and a not in artist_map]
+    for i in range(0, len(ids_to_fetch), 50):
+        batch_ids = ids_to_fetch[i:i+50]
+        print(f"    Fetching details for {len(batch_ids)} artists (batch {i//50 + 1})...")
+        artist_details_results = fetch_with_retries(sp.artists, artists=batch_ids)
+        if artist_details_results and artist_details_results['artists']:
+            for artist_data in artist_details_results['artists']:
+                if artist_data:
+                    artist_map[artist_data['id']] = artist_data
+
+def fetch_album_tracks(sp, album_data_api):
+    """Returns the album's tracks (all pages, without local/unavailable ones), or None if the fetch failed."""
+    print(f"  Fetching tracks for album: '{album_data_api['name']}'...")
+    album_tracks_paginator = fetch_with_retries(sp.album_tracks, album_data_api['id'], limit=50)
+    if album_tracks_paginator is None:
+        print(f"  Error fetching initial tracks for album '{album_data_api['name']}'. Skipping album.")
+        return None
+    temp_tracks = list(album_tracks_paginator['items'])
+    while album_tracks_paginator and album_tracks_paginator['next']:
+        print(f"    Fetching next page of tracks for '{album_data_api['name']}'...")
+        album_tracks_paginator = fetch_with_retries(sp.next, album_tracks_paginator)
+        if album_tracks_paginator:
+            temp_tracks.extend(album_tracks_paginator['items'])
+        else:
+            break
+    tracks = []
+    for track_item_api in temp_tracks:
+        if not track_item_api or not track_item_api.get('id'):
+            print(f"    Skipping track without ID or data (e.g., local file): {track_item_api.get('name') if track_item_api else 'N/A'}")
+            continue
+        tracks.append(track_item_api)
+    return tracks
+
+def process_album_items(conn, sp, items, artist_map, write_buffer):
+    """
+    Stores the given saved-album items: tracks and artist details are fetched first (artists in
+    bulk), then they are written through write_buffer in one transaction. Albums that couldn't be
+    fetched or written are counted as failed attempts in sync_jobs. Returns how many were stored.
+    """
+    failed = {}
+    for item in items:
+        print(f"\nProcessing new album: '{item['album']['name']}' (Added: {item['added_at']})")
+        tracks = fetch_album_tracks(sp, item['album'])
+        if tracks is None:
+            failed[item['album']['id']] = "could not fetch tracks"
+        else:
+            write_buffer.add_album(item, tracks)
+    artist_ids = [a.get('id') for item, tracks in write_buffer.pending
+                  for a in item['album'].get('artists', []) + [a for t in tracks for a in t.get('artists', [])]]
+    fetch_artist_details(sp, artist_ids, artist_map)
+    for artist_spotify_id in dict.fromkeys(artist_ids):
+        if artist_spotify_id and artist_spotify_id not in artist_map:
+            print(f"  Warning: Artist (ID: {artist_spotify_id}) details not pre-fetched. Fetching individually.")
+            artist_data_full = fetch_with_retries(sp.artist, artist_spotify_id)
+            if artist_data_full:
+                artist_map[artist_spotify_id] = artist_data_full
+    pending_ids = [item['album']['id'] for item, _ in write_buffer.pending]
+    stored = write_buffer.flush(artist_map, datetime.utcnow().isoformat() + "Z")
+    failed.update((album_id, "could not write to the database") for album_id in pending_ids if album_id not in stored)
+    for album_id, error in failed.items():
+        sync_jobs.mark_failed(conn, SYNC_JOB, album_id, error)
+    return len(stored)
+
+def process_pending_albums(conn, sp, known_album_ids, artist_map, write_buffer, worker):
+    """
+    Claims queued albums a page at a time and stores them, until the queue is empty. Several
+    processes can run this at once; each album is fetched by one of them. Returns how many were stored.
+    """
+    stored = 0
+    while True:
+        claimed = sync_jobs.claim(conn, SYNC_JOB, worker, SAVED_ALBUMS_PAGE_LIMIT)
+        if not claimed:
+            break
+        already_stored = [album_id for album_id, _ in claimed if album_id in write_buffer.ids["albums"]]
+        sync_jobs.mark_done(conn, SYNC_JOB, already_stored)
+        conn.commit()
+        items = [item for album_id, item in claimed if album_id not in write_buffer.ids["albums"]]
+        print(f"\nClaimed {len(claimed)} queued albums ({len(items)} to store).")
+        stored += process_album_items(conn, sp, items, artist_map, write_buffer)
+        known_album_ids.update(item['album']['id'] for item in items if item['album']['id'] in write_buffer.ids["albums"])
+    return stored
+
+def queue_new_albums(conn, items, known_album_ids):
+    """Adds the items whose album isn't in the DB to the job's queue (no commit). Returns how many were new to the queue."""
+    return sync_jobs.enqueue(conn, SYNC_JOB, [(item['album']['id'], album_job_payload(item))
+                                              for item in items if item['album']['id'] not in known_album_ids])
+
+def delta_sync(conn, sp, state, known_album_ids):
+    """
+    Pages through the saved albums (newest first) until the first one added before the
+    watermark, queueing the new ones. A routine run costs one page. The watermark is fixed for
+    the whole pass, and each page's queue entries are committed together with the next offset,
+    so resuming an interrupted pass neither skips nor repeats albums. Returns the number queued.
+    """
+    if not state.get("offset"):
+        state["watermark"] = get_last_known_added_at(conn)
+    watermark = state.get("watermark")
+    print(f"Last known album added_at in DB: {watermark if watermark else 'None (first sync?)'}")
+    offset = state.get("offset", 0)
+    queued = 0
+    while True:
+        print(f"\nFetching page of saved albums from Spotify. Offset: {offset}, Limit: {SAVED_ALBUMS_PAGE_LIMIT}")
+        results = fetch_with_retries(sp.current_user_saved_albums, limit=SAVED_ALBUMS_PAGE_LIMIT, offset=offset)
+        if results is None:
+            print("Failed to fetch saved albums after retries. Will resume from this offset next time.")
+            return queued
+        if not results['items']:
+            print("No more albums found in Spotify library.")
+            break
+        page_items = results['items']
+        reached_watermark = False
+        if watermark:
+            # Items come newest first: everything from the first older album on is already stored
+            for i, item in enumerate(page_items):
+                if item['added_at'] < watermark:
+                    print(f"  Album '{item['album']['name']}' (added {item['added_at']}) is older than the last sync ({watermark}). Stopping.")
+                    page_items, reached_watermark = page_items[:i], True
+                    break
+        queued += queue_new_albums(conn, page_items, known_album_ids)
+        if reached_watermark or not results['next']:
+            break
+        offset += len(results['items'])
+        state["offset"] = offset
+        save_sync_state(conn, state)
+        conn.commit()
+    state["offset"], state["watermark"] = 0, None
+    save_sync_state(conn, state)
+    conn.commit()
+    return queued
+
+def full_library_diff(conn, sp, state, known_album_ids):
+    """
+    Lists the whole library (album pages only, no track calls) and compares its ids with the
+    DB: albums missing from the DB are queued, albums gone from the library are marked with
+    spotify_removed_at (and unmarked if they come back). Returns False if the listing failed.
+    """
+    print("\nChecking the full library for removed or missed albums...")
+    library_items, offset = [], 0
+    while True:
+        results = fetch_with_retries(sp.current_user_saved_albums, limit=SAVED_ALBUMS_PAGE_LIMIT, offset=offset)
+        if results is None:
+            print("Failed to list the library; removals will be checked next time.")
+            return False
+        library_items.extend(results['items'])
+        if not results['next'] or not results['items']:
+            break
+        offset += len(results['items'])
+    library_ids = {item['album']['id'] for item in library_items}
+    queued = queue_new_albums(conn, library_items, known_album_ids)
+    now_iso = datetime.utcnow().isoformat() + "Z"
+    removed = [(now_iso, album_id) for album_id in known_album_ids - library_ids]
+    cursor = conn.cursor()
+    cursor.executemany("UPDATE albums SET spotify_removed_at = ? WHERE spotify_album_id = ? AND spotify_removed_at IS NULL", removed)
+    newly_removed = cursor.rowcount
+    cursor.executemany("UPDATE albums SET spotify_removed_at = NULL WHERE spotify_album_id = ? AND spotify_removed_at IS NOT NULL",
+                       [(album_id,) for album_id in library_ids])
+    restored = cursor.rowcount
+    state["last_full_diff_at"] = now_iso
+    save_sync_state(conn, state)
+    conn.commit()
+    print(f"Library check: {len(library_ids)} albums in library, {queued} missed album(s) queued, "
+          f"{newly_removed} newly removed, {restored} back in the library.")
+    return True
+
 def main():
     print("Starting Spotify album sync process...")
+    force_full_diff = "--full" in sys.argv[1:]
+    worker_only = "--worker" in sys.argv[1:]  # Only help store already queued albums (for extra parallel workers)
     client_id, client_secret = load_credentials()
     if not client_id or not client_secret:
         print("Exiting due to missing credentials.")
@@ -335,165 +565,20 @@ def main():
         setup_database(conn) 
         print(f"Database '{DB_FILE}' connected and schema ensured.")
 
-        last_db_added_at = get_last_known_added_at(conn)
-        print(f"Last known album added_at in DB: {last_db_added_at if last_db_added_at else 'None (first sync?)'}")
-
-        offset = load_sync_state()
-        limit = 20
-        new_albums_processed_count = 0
-        
-        fetched_artist_details_map_this_run = {} 
-
-        while True:
-            current_time_iso = datetime.utcnow().isoformat() + "Z"
-            print(f"\nFetching page of saved albums from Spotify. Offset: {offset}, Limit: {limit}")
-            results = fetch_with_retries(sp.current_user_saved_albums, limit=limit, offset=offset)
-            if results is None:
-                print("Failed to fetch saved albums after retries. Exiting.")
-                break
-
-            if not results or not results['items']:
-                print("No more albums found in Spotify library for this page or at all.")
-                break
-
-            stop_processing_older_albums = False
-            albums_on_this_page = results['items']
-            albums_to_process_fully = []
-            artist_spotify_ids_to_fetch_on_this_page = set()
-
-            for item in albums_on_this_page:
-                album_spotify_id = item['album']['id']
-                album_added_at = item['added_at']
-
-                if last_db_added_at and album_added_at <= last_db_added_at:
-                    print(f"  Album '{item['album']['name']}' (added {album_added_at}) is older or same as last sync ({last_db_added_at}). Will stop after this page.")
-                    stop_processing_older_albums = True
-                
-                if get_album_db_id_by_spotify_id(conn, album_spotify_id):
-                    print(f"  Album '{item['album']['name']}' (ID: {album_spotify_id}) already in DB. Skipping this specific album.")
-                    continue 
-                
-                albums_to_process_fully.append(item)
-                for artist_summary in item['album'].get('artists', []):
-                    artist_id = artist_summary.get('id')
-                    if artist_id and artist_id not in fetched_artist_details_map_this_run:
-                        artist_spotify_ids_to_fetch_on_this_page.add(artist_id)
-
-            if artist_spotify_ids_to_fetch_on_this_page:
-                artist_ids_list = list(artist_spotify_ids_to_fetch_on_this_page)
-                for i in range(0, len(artist_ids_list), 50): 
-                    batch_ids = artist_ids_list[i:i+50]
-                    print(f"Fetching details for {len(batch_ids)} album artists (batch {i//50 + 1})...")
-                    artist_details_results = fetch_with_retries(sp.artists, artists=batch_ids)
-                    if artist_details_results and artist_details_results['artists']:
-                        for artist_data in artist_details_results['artists']:
-                            if artist_data: 
-                                fetched_artist_details_map_this_run[artist_data['id']] = artist_data
-
-            for item in albums_to_process_fully:
-                album_data_api = item['album']
-                print(f"\nProcessing new album: '{album_data_api['name']}' (Added: {item['added_at']})")
-                try:
-                    conn.execute("BEGIN TRANSACTION")
-                    album_db_id = insert_album(conn, item, current_time_iso)
-                    new_albums_processed_count += 1
-                    for i, artist_summary in enumerate(album_data_api.get('artists', [])):
-                        artist_spotify_id = artist_summary.get('id')
-                        artist_data_full = fetched_artist_details_map_this_run.get(artist_spotify_id)
-                        if not artist_data_full and artist_spotify_id: 
-                            print(f"  Warning: Album artist '{artist_summary.get('name')}' (ID: {artist_spotify_id}) details not in pre-fetch. Fetching individually.")
-                            artist_data_full = fetch_with_retries(sp.artist, artist_spotify_id)
-                            if artist_data_full:
-                                fetched_artist_details_map_this_run[artist_spotify_id] = artist_data_full 
-                        if artist_data_full:
-                            artist_db_id = insert_or_update_artist(conn, artist_data_full, current_time_iso)
-                            if artist_db_id:
-                               link_album_artist(conn, album_db_id, artist_db_id, i + 1)
-                        elif artist_summary.get('name'): 
-                            artist_db_id_by_name = get_artist_db_id(conn, artist_name=artist_summary.get('name'))
-                            if artist_db_id_by_name:
-                                 link_album_artist(conn, album_db_id, artist_db_id_by_name, i + 1)
-                            else:
-                                print(f"  Could not resolve album artist '{artist_summary.get('name')}' for link (no Spotify ID and not in DB by name).")
-
-                    print(f"  Fetching tracks for album: '{album_data_api['name']}'...")
-                    album_tracks_paginator = fetch_with_retries(sp.album_tracks, album_data_api['id'], limit=50)
-                    if album_tracks_paginator is None:
-                        print(f"  Error fetching initial tracks for album '{album_data_api['name']}'. Skipping album.")
-                        conn.rollback() 
-                        continue 
-
-                    album_tracks_data_for_processing = []
-                    song_artist_spotify_ids_for_this_album_to_fetch = set()
-                    temp_tracks = []
-                    if album_tracks_paginator:
-                        temp_tracks.extend(album_tracks_paginator['items'])
-                        while album_tracks_paginator and album_tracks_paginator['next']:
-                            print(f"    Fetching next page of tracks for '{album_data_api['name']}'...")
-                            album_tracks_paginator = fetch_with_retries(sp.next, album_tracks_paginator)
-                            if album_tracks_paginator:
-                                temp_tracks.extend(album_tracks_paginator['items'])
-                            else:
-                                break
-                    for track_item_api in temp_tracks:
-                        if not track_item_api or not track_item_api.get('id'): 
-                            print(f"    Skipping track without ID or data (e.g., local file): {track_item_api.get('name') if track_item_api else 'N/A'}")
-                            continue
-                        album_tracks_data_for_processing.append(track_item_api)
-                        for artist_summary in track_item_api.get('artists', []):
-                            artist_id = artist_summary.get('id')
-                            if artist_id and artist_id not in fetched_artist_details_map_this_run: 
-                                song_artist_spotify_ids_for_this_album_to_fetch.add(artist_id)
-                    if song_artist_spotify_ids_for_this_album_to_fetch:
-                        song_artist_ids_list = list(song_artist_spotify_ids_for_this_album_to_fetch)
-                        for i in range(0, len(song_artist_ids_list), 50):
-                            batch_ids = song_artist_ids_list[i:i+50]
-                            print(f"    Fetching details for {len(batch_ids)} song artists (batch {i//50 + 1})...")
-                            artist_details_results = fetch_with_retries(sp.artists, artists=batch_ids)
-                            if artist_details_results and artist_details_results['artists']:
-                                for artist_data in artist_details_results['artists']:
-                                    if artist_data:
-                                        fetched_artist_details_map_this_run[artist_data['id']] = artist_data
-                    for track_item_api in album_tracks_data_for_processing:
-                        song_db_id = insert_song(conn, track_item_api, current_time_iso) 
-                        if song_db_id:
-                            link_song_album(conn, song_db_id, album_db_id,
-                                            track_item_api['track_number'], track_item_api.get('disc_number', 1))
-                            for j, song_artist_summary in enumerate(track_item_api.get('artists', [])):
-                                artist_spotify_id = song_artist_summary.get('id')
-                                artist_data_full = fetched_artist_details_map_this_run.get(artist_spotify_id)
-
-                                if not artist_data_full and artist_spotify_id: 
-                                    print(f"    Warning: Song artist '{song_artist_summary.get('name')}' (ID: {artist_spotify_id}) details not pre-fetched. Fetching individually.")
-                                    artist_data_full = fetch_with_retries(sp.artist, artist_spotify_id)
-                                    if artist_data_full:
-                                        fetched_artist_details_map_this_run[artist_spotify_id] = artist_data_full
-                                
-                                if artist_data_full:
-                                    artist_db_id = insert_or_update_artist(conn, artist_data_full, current_time_iso)
-                                    if artist_db_id:
-                                        link_song_artist(conn, song_db_id, artist_db_id, j + 1)
-                                elif song_artist_summary.get('name'):
-                                    artist_db_id_by_name = get_artist_db_id(conn, artist_name=song_artist_summary.get('name'))
-                                    if artist_db_id_by_name:
-                                        link_song_artist(conn, song_db_id, artist_db_id_by_name, j + 1)
-                                    else:
-                                        print(f"    Could not resolve song artist '{song_artist_summary.get('name')}' for link.")
-                    conn.commit()
-                    print(f"  Successfully processed and committed album: '{album_data_api['name']}'")
-                except Exception as e_album_proc:
-                    if conn: conn.rollback() 
-                    print(f"  MAJOR ERROR processing album '{album_data_api.get('name', 'Unknown Album')}': {e_album_proc}. Rolled back changes for this album.")
-            if stop_processing_older_albums:
-                print("Stopping sync as older albums (based on added_at) have been reached on this page.")
-                break
-            offset += len(albums_on_this_page)
-            save_sync_state(offset) 
-            if not results['next']: 
-                print("Reached end of Spotify library pages.")
-                break
-        save_sync_state(0) 
-        print(f"\nSync finished. Processed {new_albums_processed_count} new albums in this session.")
+        sync_jobs.ensure_sync_jobs_table(conn)
+        known_album_ids = get_known_album_ids(conn)
+        if not worker_only:
+            state = load_sync_state(conn)
+            queued = delta_sync(conn, sp, state, known_album_ids)
+            if force_full_diff or is_full_diff_due(state):
+                full_library_diff(conn, sp, state, known_album_ids)
+            print(f"\nQueued {queued} new albums.")
+        write_buffer = SyncWriteBuffer(conn, on_stored=lambda album_ids: sync_jobs.mark_done(conn, SYNC_JOB, album_ids))
+        fetched_artist_details_map_this_run = {}
+        new_albums_processed_count = process_pending_albums(conn, sp, known_album_ids, fetched_artist_details_map_this_run,
+                                                            write_buffer, sync_jobs.worker_id())
+        print(f"\nSync finished. Processed {new_albums_processed_count} new albums in this session. "
+              f"Queue: {sync_jobs.count_by_status(conn, SYNC_JOB)}")
 
     except sqlite3.Error as e_db:
         print(f"Database error: {e_db}")
@@ -507,4 +592,4 @@ def main():
             print("Database connection closed.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
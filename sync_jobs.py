@@ -0,0 +1,171 @@
+# sync_jobs.py
+# Checkpoint journal for the Spotify sync scripts, kept in the sync_jobs table of the database
+# being synced instead of JSON files next to the scripts. Each job has a cursor row (item_key '')
+# holding its resume position as JSON, and one row per work item (an album to fetch tracks for)
+# with its status. Callers write cursor and status changes without committing, so they land in
+# the same transaction as the data they describe: a crash can neither redo nor skip work.
+# Items are claimed with a lease, so several workers can share a job without repeating API calls;
+# a claim whose worker died is taken over once its lease expires.
+import json
+import os
+import socket
+import sqlite3
+from datetime import datetime, timedelta
+
+CLAIM_LEASE_MINUTES = 30
+RETRY_BACKOFF_MINUTES = 10  # Per failed attempt; a failed item isn't claimed again before that
+MAX_ATTEMPTS = 3  # Items that fail this often are left as 'failed' until a listing queues them again
+
+STATUS_PENDING = "pending"
+STATUS_CLAIMED = "claimed"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+def ensure_sync_jobs_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sync_jobs (
+            job TEXT NOT NULL,
+            item_key TEXT NOT NULL, -- '' for the job's cursor row
+            status TEXT NOT NULL DEFAULT 'pending', -- pending, claimed, done or failed
+            payload TEXT, -- JSON: the cursor, or what a worker needs to process the item
+            claimed_by TEXT,
+            claimed_until TEXT, -- end of the claim's lease, or of a failed item's retry backoff
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            updated_at TEXT,
+            PRIMARY KEY (job, item_key)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sync_jobs_status ON sync_jobs(job, status)")
+    conn.commit()
+
+
+def _timestamp(dt):
+    """
+    UTC time as e.g. 2024-05-01T12:00:00.000Z, the format of SQLite's strftime('%Y-%m-%dT%H:%M:%fZ'),
+    so timestamps written here and in SQL (mark_failed) compare correctly as strings.
+    """
+    return dt.isoformat(timespec="milliseconds") + "Z"
+
+
+def _now():
+    return _timestamp(datetime.utcnow())
+
+
+def worker_id():
+    """Identifies this process in claimed_by."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def get_cursor(conn, job, legacy_state_file=None):
+    """
+    Returns the job's cursor dict ({} if it has none). If there is no cursor yet and
+    legacy_state_file (the old JSON state) exists, its contents are taken over once and the
+    file is renamed to <name>.migrated.
+    """
+    row = conn.execute("SELECT payload FROM sync_jobs WHERE job = ? AND item_key = ''", (job,)).fetchone()
+    if row:
+        return json.loads(row[0] or "{}")
+    if legacy_state_file and os.path.exists(legacy_state_file):
+        try:
+            with open(legacy_state_file, 'r') as f:
+                state = json.load(f)
+        except (IOError, json.JSONDecodeError) as e:
+            print(f"Warning: Could not read old state file {legacy_state_file}: {e}")
+            return {}
+        set_cursor(conn, job, state)
+        conn.commit()
+        os.replace(legacy_state_file, legacy_state_file + ".migrated")
+        print(f"Moved sync state from {legacy_state_file} into the sync_jobs table.")
+        return state
+    return {}
+
+
+def set_cursor(conn, job, state):
+    """Stores the job's cursor. Does not commit: commit it together with the data it covers."""
+    conn.execute("""
+        INSERT INTO sync_jobs (job, item_key, status, payload, updated_at) VALUES (?, '', 'done', ?, ?)
+        ON CONFLICT(job, item_key) DO UPDATE SET payload = excluded.payload, updated_at = excluded.updated_at
+    """, (job, json.dumps(state), _now()))
+
+
+def enqueue(conn, job, items):
+    """
+    Adds (item_key, payload) work items as pending. Items the job already has keep their status,
+    except failed ones, which get a fresh set of attempts. Does not commit. Returns how many were (re)queued.
+    """
+    cursor = conn.executemany("""
+        INSERT INTO sync_jobs (job, item_key, status, payload, updated_at) VALUES (?, ?, 'pending', ?, ?)
+        ON CONFLICT(job, item_key) DO UPDATE SET
+            status = 'pending', attempts = 0, claimed_until = NULL, payload = excluded.payload, updated_at = excluded.updated_at
+        WHERE status = 'failed'
+    """, [(job, str(key), json.dumps(payload) if payload is not None else None, _now()) for key, payload in items])
+    return cursor.rowcount
+
+
+def claim(conn, job, worker, limit):
+    """
+    Claims up to limit pending items (or items whose claim has expired) for worker, oldest first,
+    skipping failed items that are still in their retry backoff,
+    and commits the claim (with anything already pending on conn). Returns [(item_key, payload), ...].
+    """
+    now = _now()
+    until = _timestamp(datetime.utcnow() + timedelta(minutes=CLAIM_LEASE_MINUTES))
+    try:
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")  # No other worker can claim between our SELECT and UPDATE
+        rows = conn.execute("""
+            SELECT item_key, payload FROM sync_jobs
+            WHERE job = ? AND item_key != '' AND status IN ('pending', 'claimed') AND (claimed_until IS NULL OR claimed_until < ?)
+            ORDER BY updated_at, rowid LIMIT ?
+        """, (job, now, limit)).fetchall()
+        conn.executemany("""
+            UPDATE sync_jobs SET status = 'claimed', claimed_by = ?, claimed_until = ?, updated_at = ?
+            WHERE job = ? AND item_key = ?
+        """, [(worker, until, now, job, row[0]) for row in rows])
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return [(row[0], json.loads(row[1]) if row[1] else None) for row in rows]
+
+
+def mark_done(conn, job, item_keys):
+    """Marks items done. Does not commit: call it in the transaction that stores their data."""
+    now = _now()
+    conn.executemany("""
+        UPDATE sync_jobs SET status = 'done', claimed_by = NULL, claimed_until = NULL, last_error = NULL, updated_at = ?
+        WHERE job = ? AND item_key = ?
+    """, [(now, job, str(key)) for key in item_keys])
+
+
+def mark_failed(conn, job, item_key, error):
+    """
+    Counts a failed attempt and puts the item back in the queue after a backoff (or leaves it
+    failed after MAX_ATTEMPTS). Commits.
+    """
+    conn.execute("""
+        UPDATE sync_jobs SET attempts = attempts + 1, last_error = ?, claimed_by = NULL, updated_at = ?,
+            claimed_until = strftime('%Y-%m-%dT%H:%M:%fZ', 'now', '+' || ((attempts + 1) * ?) || ' minutes'),
+            status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END
+        WHERE job = ? AND item_key = ?
+    """, (str(error), _now(), RETRY_BACKOFF_MINUTES, MAX_ATTEMPTS, job, str(item_key)))
+    conn.commit()
+
+
+def release(conn, job, item_keys):
+    """
+    Hands claimed items back to the queue without counting an attempt (e.g. when a request covering
+    the whole batch failed, which says nothing about the items themselves). Commits.
+    """
+    now = _now()
+    conn.executemany("""
+        UPDATE sync_jobs SET status = 'pending', claimed_by = NULL, claimed_until = NULL, updated_at = ?
+        WHERE job = ? AND item_key = ? AND status = 'claimed'
+    """, [(now, job, str(key)) for key in item_keys])
+    conn.commit()
+
+
+def count_by_status(conn, job):
+    return dict(conn.execute("SELECT status, COUNT(*) FROM sync_jobs WHERE job = ? AND item_key != '' GROUP BY status", (job,)))
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Tests MpvController against a stub of mpv's JSON IPC server (no mpv needed).
+Run with: python test_mpv_controller.py  (or python -m pytest test_mpv_controller.py)
+"""
+
+import json
+import os
+import queue
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import mpv_controller
+
+WAIT_SECONDS = 5
+
+
+class StubMpv:
+    """
+    Listens on the --input-ipc-server socket and records the commands it receives. Like mpv 0.33+,
+    it answers each loadfile with a new playlist_entry_id (in self.entry_ids) before recording it.
+    """
+    def __init__(self, socket_path):
+        self.commands = queue.Queue()
+        self.entry_ids = []
+        self.conn = None
+        self._connected = threading.Event()
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(socket_path)
+        self._server.listen(1)
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        self.conn, _ = self._server.accept()
+        self._connected.set()
+        buffer = b""
+        while True:
+            try:
+                data = self.conn.recv(65536)
+            except OSError:
+                break
+            if not data:
+                break
+            buffer += data
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                msg = json.loads(line)
+                if msg["command"][0] == "loadfile":
+                    self.entry_ids.append(len(self.entry_ids) + 1)
+                    self.send({"request_id": msg["request_id"], "error": "success",
+                               "data": {"playlist_entry_id": self.entry_ids[-1]}})
+                self.commands.put(msg)
+
+    def send(self, msg):
+        self._connected.wait(WAIT_SECONDS)
+        self.conn.sendall((json.dumps(msg) + "\n").encode("utf-8"))
+
+    def next_command(self, name):
+        """Returns the next received command named name, skipping others."""
+        deadline = time.monotonic() + WAIT_SECONDS
+        while True:
+            msg = self.commands.get(timeout=max(0.01, deadline - time.monotonic()))
+            if msg["command"][0] == name:
+                return msg
+
+    def drop(self):
+        """Closes the connection, like mpv does when the user quits it."""
+        self._connected.wait(WAIT_SECONDS)
+        self.conn.shutdown(socket.SHUT_RDWR)
+        self.conn.close()
+        self._server.close()
+
+
+class FakeProcess:
+    def poll(self):
+        return None
+
+    def wait(self, timeout=None):
+        return 0
+
+    def terminate(self):
+        pass
+
+
+class MpvControllerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.stubs = []
+        self.started = queue.Queue()
+        self.ended = queue.Queue()
+        self.finished = threading.Event()
+
+        def fake_popen(args, **kwargs):
+            socket_arg = next(a for a in args if a.startswith("--input-ipc-server="))
+            self.stubs.append(StubMpv(socket_arg.split("=", 1)[1]))
+            return FakeProcess()
+
+        patcher = mock.patch.object(mpv_controller.subprocess, "Popen", side_effect=fake_popen)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.controller = mpv_controller.MpvController(
+            socket_path=os.path.join(self.tmpdir, "mpv.sock"),
+            on_item_start=lambda index, path: self.started.put((index, path)),
+            on_item_end=lambda path, reason, watched, duration: self.ended.put((path, reason)),
+            on_queue_finished=self.finished.set)
+
+    def tearDown(self):
+        self.controller.shutdown()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_play_sends_loadfile_sequence_and_reports_items(self):
+        self.controller.play(["/media/a.mp4", "/media/b.mp4"])
+        stub = self.stubs[0]
+        self.assertEqual(stub.next_command("loadfile")["command"], ["loadfile", "/media/a.mp4", "replace"])
+        self.assertEqual(stub.next_command("loadfile")["command"], ["loadfile", "/media/b.mp4", "append"])
+        stub.send({"event": "property-change", "id": mpv_controller.OBSERVE_IDLE, "data": True})  # Initial value
+
+        stub.send({"event": "start-file", "playlist_entry_id": 1})
+        self.assertEqual(self.started.get(timeout=WAIT_SECONDS), (0, "/media/a.mp4"))
+        stub.send({"event": "end-file", "reason": "eof", "playlist_entry_id": 1})
+        self.assertEqual(self.ended.get(timeout=WAIT_SECONDS), ("/media/a.mp4", "eof"))
+        stub.send({"event": "start-file", "playlist_entry_id": 2})
+        self.assertEqual(self.started.get(timeout=WAIT_SECONDS), (1, "/media/b.mp4"))
+        self.assertFalse(self.finished.is_set())
+
+        self.controller.append(["/media/c.mp4"])
+        self.assertEqual(stub.next_command("loadfile")["command"], ["loadfile", "/media/c.mp4", "append-play"])
+        stub.send({"event": "start-file", "playlist_entry_id": 3})
+        self.assertEqual(self.ended.get(timeout=WAIT_SECONDS), ("/media/b.mp4", "eof"))
+        self.assertEqual(self.started.get(timeout=WAIT_SECONDS), (2, "/media/c.mp4"))
+
+    def test_reconnects_after_dropped_socket(self):
+        self.controller.play(["/media/a.mp4"])
+        self.stubs[0].next_command("loadfile")
+        self.stubs[0].send({"event": "start-file", "playlist_entry_id": 1})
+        self.started.get(timeout=WAIT_SECONDS)
+
+        self.stubs[0].drop()
+        self.assertTrue(self.finished.wait(WAIT_SECONDS))
+        self.assertEqual(self.ended.get(timeout=WAIT_SECONDS), ("/media/a.mp4", "quit"))
+        self.assertFalse(self.controller.is_running())
+
+        self.controller.play(["/media/b.mp4"])
+        self.assertEqual(len(self.stubs), 2)
+        self.assertEqual(self.stubs[1].next_command("loadfile")["command"], ["loadfile", "/media/b.mp4", "replace"])
+        self.stubs[1].send({"event": "start-file", "playlist_entry_id": 1})
+        self.assertEqual(self.started.get(timeout=WAIT_SECONDS), (0, "/media/b.mp4"))
+
+    def test_ignores_start_file_of_replaced_queue(self):
+        self.controller.play(["/media/a.mp4", "/media/b.mp4"])
+        stub = self.stubs[0]
+        stub.next_command("loadfile")
+        stub.next_command("loadfile")
+
+        self.controller.play(["/media/x.mp4", "/media/y.mp4"])
+        stub.next_command("loadfile")
+        stub.next_command("loadfile")
+        stub.send({"event": "start-file", "playlist_entry_id": 2})  # Sent by mpv before it saw the new queue
+        stub.send({"event": "start-file", "playlist_entry_id": 3})
+
+        self.assertEqual(self.started.get(timeout=WAIT_SECONDS), (0, "/media/x.mp4"))
+        self.assertTrue(self.started.empty())
+        self.assertTrue(self.ended.empty())
+
+    def test_item_failing_at_once_finishes_the_queue(self):
+        self.controller.play(["/media/corrupt.mp4"])
+        stub = self.stubs[0]
+        stub.next_command("loadfile")
+        stub.send({"event": "start-file", "playlist_entry_id": 1})
+        stub.send({"event": "end-file", "reason": "error", "playlist_entry_id": 1})
+        stub.send({"event": "property-change", "id": mpv_controller.OBSERVE_IDLE, "data": True})
+        stub.send({"request_id": 999, "error": "success", "data": -1})  # Late playlist-pos style reply
+
+        self.assertTrue(self.finished.wait(WAIT_SECONDS))
+        self.assertEqual(self.started.get(timeout=WAIT_SECONDS), (0, "/media/corrupt.mp4"))
+        self.assertEqual(self.ended.get(timeout=WAIT_SECONDS), ("/media/corrupt.mp4", "error"))
+        self.assertFalse(self.controller.is_playing())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Tests the claim / lease / retry state machine in sync_jobs.py on an in-memory database.
+Run with: python test_sync_jobs.py  (or python -m pytest test_sync_jobs.py)
+"""
+
+import os
+import re
+import sqlite3
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import sync_jobs
+
+JOB = "test_job"
+PAST = "2000-01-01T00:00:00.000Z"
+
+
+class SyncJobsTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        sync_jobs.ensure_sync_jobs_table(self.conn)
+        sync_jobs.enqueue(self.conn, JOB, [("a", {"n": 1}), ("b", None)])
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.close()
+
+    def row(self, key):
+        return self.conn.execute("SELECT status, attempts, claimed_until FROM sync_jobs WHERE job = ? AND item_key = ?",
+                                 (JOB, key)).fetchone()
+
+    def expire(self, key):
+        """Moves the item's lease or backoff into the past."""
+        self.conn.execute("UPDATE sync_jobs SET claimed_until = ? WHERE job = ? AND item_key = ?", (PAST, JOB, key))
+        self.conn.commit()
+
+    def test_claimed_items_are_not_claimed_again(self):
+        self.assertEqual(sync_jobs.claim(self.conn, JOB, "w1", 10), [("a", {"n": 1}), ("b", None)])
+        self.assertEqual(sync_jobs.claim(self.conn, JOB, "w2", 10), [])
+        self.assertEqual(sync_jobs.count_by_status(self.conn, JOB), {"claimed": 2})
+
+    def test_expired_lease_is_reclaimed(self):
+        sync_jobs.claim(self.conn, JOB, "w1", 10)
+        self.expire("a")
+        self.assertEqual(sync_jobs.claim(self.conn, JOB, "w2", 10), [("a", {"n": 1})])
+
+    def test_failures_back_off_then_stay_failed(self):
+        for attempt in range(1, sync_jobs.MAX_ATTEMPTS + 1):
+            self.assertEqual([key for key, _ in sync_jobs.claim(self.conn, JOB, "w1", 1)], ["a"])
+            sync_jobs.mark_failed(self.conn, JOB, "a", "boom")
+            status, attempts, _ = self.row("a")
+            self.assertEqual(attempts, attempt)
+            if attempt < sync_jobs.MAX_ATTEMPTS:
+                self.assertEqual(status, "pending")
+                self.assertEqual([key for key, _ in sync_jobs.claim(self.conn, JOB, "w1", 10)], ["b"])  # "a" is backing off
+                sync_jobs.release(self.conn, JOB, ["b"])
+                self.expire("a")
+        self.assertEqual(self.row("a")[0], "failed")
+        self.expire("a")
+        self.assertEqual([key for key, _ in sync_jobs.claim(self.conn, JOB, "w1", 10)], ["b"])
+
+    def test_enqueue_resets_failed_items_only(self):
+        sync_jobs.claim(self.conn, JOB, "w1", 10)
+        for _ in range(sync_jobs.MAX_ATTEMPTS):
+            sync_jobs.mark_failed(self.conn, JOB, "a", "boom")
+        sync_jobs.mark_done(self.conn, JOB, ["b"])
+        self.assertEqual(sync_jobs.enqueue(self.conn, JOB, [("a", {"n": 2}), ("b", None)]), 1)
+        self.conn.commit()
+        self.assertEqual(self.row("a")[:2], ("pending", 0))
+        self.assertEqual(self.row("b")[0], "done")
+        self.assertEqual(sync_jobs.claim(self.conn, JOB, "w1", 10), [("a", {"n": 2})])
+
+    def test_release_does_not_count_an_attempt(self):
+        sync_jobs.claim(self.conn, JOB, "w1", 10)
+        sync_jobs.release(self.conn, JOB, ["a", "b"])
+        self.assertEqual(self.row("a")[:2], ("pending", 0))
+        self.assertEqual(len(sync_jobs.claim(self.conn, JOB, "w2", 10)), 2)
+
+    def test_timestamps_share_one_format(self):
+        sync_jobs.claim(self.conn, JOB, "w1", 10)
+        sync_jobs.mark_failed(self.conn, JOB, "a", "boom")
+        stamp = re.compile(r"^\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{3}Z$")
+        for claimed_until, updated_at in self.conn.execute("SELECT claimed_until, updated_at FROM sync_jobs WHERE item_key != ''"):
+            self.assertRegex(claimed_until, stamp)
+            self.assertRegex(updated_at, stamp)
+
+
+if __name__ == "__main__":
+    unittest.main()
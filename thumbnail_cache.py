@@ -0,0 +1,200 @@
+# thumbnail_cache.py
+# Preview frames for local files, so a row can be previewed without opening mpv.
+# A few frames per file are extracted (ffmpeg if installed, otherwise mpv's encoding mode)
+# by a small worker pool and stored as PNGs in a content-addressed cache directory:
+#   THUMBNAIL_CACHE_DIR/<key[:2]>/<key>/<n>.png
+# The key is the file's content fingerprint (media_fingerprints.py) when the library index has
+# one, so lookups don't need the drive. The cache is kept under MAX_CACHE_BYTES by evicting the
+# least recently used entries (directory mtimes are bumped on every hit).
+import os
+import shutil
+import sqlite3
+import hashlib
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+import media_probe
+
+THUMBNAIL_CACHE_DIR = os.path.expanduser("~/.cache/kpopdb/thumbnails")
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+FRAMES_PER_FILE = 4
+THUMBNAIL_WIDTH = 320
+MAX_THUMBNAIL_WORKERS = 2  # Frame extraction seeks all over the file; keep the drives' queues short
+EXTRACT_TIMEOUT_SECONDS = 60
+FFMPEG_PATH = "ffmpeg"
+
+_evict_lock = threading.Lock()
+
+
+def get_fingerprint_key(conn, path):
+    """Returns the content key from the library index (no access to the drive), or None if it isn't indexed."""
+    try:
+        row = conn.execute("SELECT fingerprint FROM media_files WHERE path = ? AND missing = 0", (path,)).fetchone()
+    except sqlite3.Error:
+        return None  # Library index not built yet
+    if row and row[0]:
+        return hashlib.blake2b(row[0].encode("utf-8"), digest_size=16).hexdigest()
+    return None
+
+
+def get_cache_key(conn, path):
+    """Returns the content key for path: the library fingerprint if there is one, otherwise a hash of path, size and mtime."""
+    key = get_fingerprint_key(conn, path)
+    if key:
+        return key
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return hashlib.blake2b(f"{path}\0{st.st_size}\0{st.st_mtime}".encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _entry_dir(key):
+    return os.path.join(THUMBNAIL_CACHE_DIR, key[:2], key)
+
+
+def get_cached_frames(key):
+    """Returns the sorted frame paths for key if they are cached (and marks the entry as recently used), else None."""
+    if not key:
+        return None
+    entry = _entry_dir(key)
+    try:
+        frames = sorted(os.path.join(entry, name) for name in os.listdir(entry) if name.endswith(".png"))
+    except OSError:
+        return None
+    if not frames:
+        return None
+    try:
+        os.utime(entry)  # LRU bookkeeping
+    except OSError:
+        pass
+    return frames
+
+
+def _extract_frame(path, seconds, out_path):
+    """Writes one scaled frame at seconds to out_path. Returns True on success, None if the extractor can't run."""
+    if shutil.which(FFMPEG_PATH):
+        cmd = [FFMPEG_PATH, "-v", "error", "-y", "-ss", f"{seconds:.2f}", "-i", path,
+               "-frames:v", "1", "-vf", f"scale={THUMBNAIL_WIDTH}:-2", out_path]
+    else:
+        cmd = [config.MPV_PLAYER_PATH, "--no-config", "--really-quiet", "--no-audio", f"--start={seconds:.2f}",
+               "--frames=1", f"--vf=scale={THUMBNAIL_WIDTH}:-2", "--ovc=png", f"--o={out_path}", path]
+    try:
+        result = subprocess.run(cmd, capture_output=True, timeout=EXTRACT_TIMEOUT_SECONDS)
+    except OSError as e:
+        print(f"Thumbnails: could not run the frame extractor: {e}")
+        return None
+    except subprocess.TimeoutExpired:
+        print(f"Thumbnails: frame extraction timed out for {path}")
+        return False
+    return result.returncode == 0 and os.path.exists(out_path) and os.path.getsize(out_path) > 0
+
+
+def generate_frames(path, key, duration=None):
+    """Extracts FRAMES_PER_FILE frames spread over the file into the cache. Returns the frame paths (or None)."""
+    entry = _entry_dir(key)
+    tmp_entry = entry + f".tmp{threading.get_ident()}"
+    os.makedirs(tmp_entry, exist_ok=True)
+    # Without a known duration, take frames from the first minutes (intros are usually short)
+    times = ([duration * (i + 1) / (FRAMES_PER_FILE + 1) for i in range(FRAMES_PER_FILE)] if duration
+             else [15 + 30 * i for i in range(FRAMES_PER_FILE)])
+    for i, seconds in enumerate(times):
+        if _extract_frame(path, seconds, os.path.join(tmp_entry, f"{i}.png")) is None:
+            break
+    if not any(name.endswith(".png") for name in os.listdir(tmp_entry)):
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+        return None
+    # Publish atomically so readers never see a half-written entry
+    shutil.rmtree(entry, ignore_errors=True)
+    os.rename(tmp_entry, entry)
+    return get_cached_frames(key)
+
+
+def evict_lru(max_bytes=MAX_CACHE_BYTES):
+    """Deletes the least recently used entries until the cache fits in max_bytes."""
+    with _evict_lock:
+        entries, total = [], 0
+        try:
+            shards = os.listdir(THUMBNAIL_CACHE_DIR)
+        except OSError:
+            return
+        for shard in shards:
+            shard_dir = os.path.join(THUMBNAIL_CACHE_DIR, shard)
+            try:
+                for entry in os.scandir(shard_dir):
+                    if not entry.is_dir():
+                        continue
+                    size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+                    entries.append((entry.stat().st_mtime, size, entry.path))
+                    total += size
+            except OSError:
+                continue
+        if total <= max_bytes:
+            return
+        for _, size, entry_path in sorted(entries):
+            shutil.rmtree(entry_path, ignore_errors=True)
+            total -= size
+            if total <= max_bytes:
+                break
+
+
+class ThumbnailService:
+    """
+    Resolves cache keys and generates missing previews in a bounded thread pool, with a connection
+    per task (the main connection belongs to the Tk thread). on_ready(path, frames) is called from
+    a worker thread when a request finishes (frames is None on failure); UI callers must marshal it.
+    """
+    def __init__(self, db_file=None, on_ready=None):
+        self.db_file = db_file or config.DATABASE_FILE
+        self.on_ready = on_ready
+        self._executor = ThreadPoolExecutor(max_workers=MAX_THUMBNAIL_WORKERS, thread_name_prefix="Thumbnails")
+        self._keys = {}  # path -> key, for paths resolved this session
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+    def cached_frames(self, path, conn=None):
+        """Returns cached frames for path without touching its drive (via a resolved key or the library index), else None."""
+        key = self._keys.get(path)
+        if key is None and conn is not None:
+            key = get_fingerprint_key(conn, path)
+        return get_cached_frames(key)
+
+    def request(self, path):
+        """Queues preview generation for path (or just key resolution, if it turns out to be cached); duplicates are ignored."""
+        with self._lock:
+            if path in self._in_flight:
+                return
+            self._in_flight.add(path)
+        try:
+            self._executor.submit(self._generate, path)
+        except RuntimeError:  # Shut down
+            with self._lock:
+                self._in_flight.discard(path)
+
+    def _generate(self, path):
+        frames = None
+        try:
+            conn = sqlite3.connect(self.db_file, timeout=30)
+            try:
+                key = get_cache_key(conn, path)
+                info = media_probe.get_cached_probe(conn, path) if key else None
+            finally:
+                conn.close()
+            if key:
+                self._keys[path] = key
+                frames = get_cached_frames(key)
+                if frames is None:
+                    frames = generate_frames(path, key, (info or {}).get("duration"))
+                    evict_lru()
+        except (OSError, sqlite3.Error) as e:
+            print(f"Thumbnails: could not build previews for {path}: {e}")
+        finally:
+            with self._lock:
+                self._in_flight.discard(path)
+        if self.on_ready:
+            self.on_ready(path, frames)
+
+    def stop(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
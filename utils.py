@@ -398,6 +398,52 @@ def find_song_in_filename(filepath, song_list, detailed=False):
         # Return just the highest scoring song
         return (matches[0][0], matches[0][1])
 
+def detect_artist_in_filename(filepath, artist_list):
+    """
+    Returns the name of the artist a filename most likely refers to, or None.
+    Uses find_artist_in_filename when it is confident (score >= 60), otherwise the first
+    plain string match from find_string_in_filename.
+    """
+    result = find_artist_in_filename(filepath, artist_list, detailed=True)
+    if not result:
+        return None
+    best_artist_match, score, match_type = result
+    if score >= 60:  # High confidence match
+        return best_artist_match['name']
+    found_artists = find_string_in_filename(filepath, [artist['name'] for artist in artist_list])
+    if len(found_artists) > 1:
+        print(f"Multiple artists matched: Selected {found_artists[0]}. Other potential matches: {', '.join(found_artists[1:3])}")
+    return found_artists[0] if found_artists else None
+
+def match_linker_decisions(filepath, decisions, song_list):
+    """
+    Returns [(song_id, song_title, 100, "linker"), ...] for the stored song-linker mentions
+    ({normalized_mention: [song_id, ...]}) found in the filename, limited to song_list.
+    """
+    if not decisions:
+        return []
+    titles_by_id = dict(song_list)
+    normalized_filename = " " + " ".join(re.sub(r'[_\-.]', ' ', os.path.basename(filepath).lower()).split()) + " "
+    matches = []
+    for mention, song_ids in decisions.items():
+        if f" {mention} " in normalized_filename:
+            matches.extend((sid, titles_by_id[sid], 100, "linker") for sid in song_ids if sid in titles_by_id)
+    return matches
+
+def select_detected_songs(song_matches):
+    """
+    Picks the songs to pre-select from detailed song matches: up to 3 with score >= 70,
+    or if there are none, up to 2 with score 50-69. Returns [(song_id, song_title), ...].
+    """
+    high_confidence = [m for m in song_matches if m[2] >= 70][:3]
+    candidates = high_confidence or [m for m in song_matches if 50 <= m[2] < 70][:2]
+    selected, seen_titles = [], set()
+    for song_id, song_title, score, match_type in candidates:
+        if song_title not in seen_titles:  # Avoid duplicates
+            selected.append((song_id, song_title))
+            seen_titles.add(song_title)
+    return selected
+
 def show_file_browser(parent, initialdir=None, filetypes=None):
     # New dark-themed file browser implementation
     import tkinter as tk
@@ -453,41 +499,63 @@ def show_file_browser(parent, initialdir=None, filetypes=None):
     hbar.pack(side='bottom', fill='x')
     lb.pack(side='left', fill='both', expand=True)
 
-    # --- DB: Get all used file_path1 values from performances and music_videos ---
+    # --- DB: used file_path1 values (kept in memory and updated incrementally by db_operations) ---
     import db_operations
-    used_file_paths = set()
+    import directory_index
+    import library_watcher
     try:
-        conn = db_operations.get_db_connection()
-        if conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT file_path1 FROM performances WHERE file_path1 IS NOT NULL")
-            used_file_paths.update(row[0] for row in cursor.fetchall() if row[0])
-            cursor.execute("SELECT file_path1 FROM music_videos WHERE file_path1 IS NOT NULL")
-            used_file_paths.update(row[0] for row in cursor.fetchall() if row[0])
+        used_file_paths = db_operations.get_used_file_paths()
     except Exception as e:
         print(f"Error fetching used file paths: {e}")
+        used_file_paths = set()
 
     show_only_new = tk.BooleanVar(value=True)  # Changed to True for default on
 
-    # Populate function
-    def populate():
+    def render(d, entries):
         lb.delete(0, tk.END)
-        d = dir_var.get()
-        try:
-            entries = os.listdir(d)
-        except Exception:
-            entries = []
-        entries.sort(key=str.lower)
         lb.insert(tk.END, '.. (Up Directory)')
-        for e in entries:
-            path = os.path.join(d, e)
-            if os.path.isdir(path) or any(e.lower().endswith(ext) for ext in exts):
+        for e, is_dir in entries:
+            if is_dir or any(e.lower().endswith(ext) for ext in exts):
                 if show_only_new.get():
                     # Only show files not in DB, always show directories
-                    if os.path.isdir(path) or path not in used_file_paths:
-                        lb.insert(tk.END, e + ('/' if os.path.isdir(path) else ''))
+                    if is_dir or os.path.join(d, e) not in used_file_paths:
+                        lb.insert(tk.END, e + ('/' if is_dir else ''))
                 else:
-                    lb.insert(tk.END, e + ('/' if os.path.isdir(path) else ''))
+                    lb.insert(tk.END, e + ('/' if is_dir else ''))
+
+    def render_indexed(new_files):
+        # New files straight from the media_files index, while the directory itself is still being read
+        lb.delete(0, tk.END)
+        lb.insert(tk.END, '.. (Up Directory)')
+        for name in sorted((os.path.basename(p) for p in new_files), key=str.lower):
+            if any(name.lower().endswith(ext) for ext in exts):
+                lb.insert(tk.END, name)
+
+    def on_refreshed(d, entries, changed):
+        # Called from the index's worker thread; only repaint if still showing that directory
+        def apply():
+            if dlg.winfo_exists() and dir_var.get() == d and (changed or not lb.size()):
+                render(d, entries)
+        try:
+            dlg.after(0, apply)
+        except (RuntimeError, tk.TclError):
+            pass  # Dialog already closed
+
+    # Populate function: render the cached listing immediately, then re-validate in the background
+    def populate():
+        d = dir_var.get()
+        cached = directory_index.get_cached_listing(d)
+        indexed_new = None
+        if cached is None and show_only_new.get():
+            conn = db_operations.get_db_connection()
+            indexed_new = library_watcher.get_unlinked_media_files(conn, d) if conn else None
+        if cached is not None:
+            render(d, cached)
+        elif indexed_new is not None:
+            render_indexed(indexed_new)
+        else:
+            lb.delete(0, tk.END)
+        directory_index.refresh_async(d, on_refreshed)
 
     dir_var.trace_add('write', lambda *a: populate())
     populate()
@@ -544,6 +612,7 @@ def show_file_browser(parent, initialdir=None, filetypes=None):
                     if confirm:
                         try:
                             os.remove(path)
+                            directory_index.invalidate(dir_var.get())
                             populate()
                         except Exception as e:
                             tk.messagebox.showerror(